@@ -14,6 +14,57 @@ class Settings(BaseSettings):
     # 微信数据路径
     wechat_documents_path: Optional[str] = None
     
+    # 数据库连接池配置
+    db_pool_max_idle: int = 4  # 每个数据库文件最多保留的空闲连接数
+    db_pool_idle_timeout: float = 300.0  # 空闲连接回收时间（秒）
+    db_immutable: bool = False  # 以 immutable=1 打开（仅适用于不会再更新的备份）
+    
+    # 聊天列表扫描线程数（message_1~4 并行扫描，1 为顺序扫描）
+    chat_scan_workers: int = 4
+    
+    # 各类请求的线程池大小（同步的数据库查询 / 分词和词云 / 大模型调用，避免阻塞事件循环）
+    db_threads: int = 8
+    cpu_threads: int = 2
+    llm_threads: int = 4
+    
+    # 词频、活跃度和词云请求的进程数（0 为在 cpu 线程池中执行）及单个请求的超时秒数（0 为不限制）
+    analysis_workers: int = 2
+    analysis_timeout: float = 300.0
+    # 后台索引（统计预聚合、预分词、全文搜索索引）的进程数（0 为在 cpu 线程池中执行）
+    index_workers: int = 1
+    
+    # 批量读取消息时每次 fetchmany 的行数
+    message_chunk_size: int = 2000
+    
+    # 统计引擎：aggregate（预聚合 sidecar）/ sql（SQLite 分组统计）/ python（逐条统计）/ numpy（列式向量化统计）
+    statistics_engine: str = "aggregate"
+    
+    # numpy 引擎和时间分布使用的时区（IANA 名称，如 Asia/Shanghai；默认为系统时区，与 SQLite localtime 一致）
+    analytics_timezone: Optional[str] = None
+    
+    # 词频引擎：index（预分词 sidecar，按天合并词频）/ stream（每次请求重新分词）
+    word_frequency_engine: str = "index"
+    
+    # jieba 分词进程数（0 为 CPU 核数，1 为单进程分词）
+    segment_workers: int = 0
+    
+    # jieba 词典缓存目录（默认 cache_dir）及是否在启动时后台预加载
+    jieba_cache_dir: Optional[str] = None
+    jieba_warmup: bool = True
+    
+    # 本地缓存目录（聊天列表、统计数据、分词索引等 sidecar 文件）
+    cache_dir: str = ".cache"
+    
+    # 后台增量索引：监视 wechat_documents_path，数据库文件变化后更新的索引（逗号分隔：chats,aggregate,tokens,search）
+    indexer_enabled: bool = True
+    indexer_indexes: str = "chats,aggregate,tokens,search"
+    indexer_poll_interval: float = 30.0  # 没有 watchfiles 或监视失败时的轮询间隔（秒）
+    indexer_debounce: float = 2.0  # 文件停止变化多久后开始索引（秒）
+    indexer_retry_interval: float = 30.0  # 索引失败后首次重试的等待秒数（之后每次加倍，最长 1 小时）
+    
+    # 群聊发送者显示名称的内存缓存条数
+    sender_cache_size: int = 10000
+    
     # OpenAI 配置
     openai_api_key: Optional[str] = None
     openai_base_url: str = "https://api.openai.com/v1"
@@ -22,6 +73,11 @@ class Settings(BaseSettings):
     wordcloud_font_path: str = "/System/Library/Fonts/Supplemental/Arial Unicode.ttf"
     wordcloud_width: int = 800
     wordcloud_height: int = 600
+    wordcloud_cache_size: int = 32  # 内存中缓存的词云图片数
+    wordcloud_disk_cache_size: int = 500  # 每个账号磁盘缓存的词云图片数
+    wordcloud_render_scales: str = "1,2"  # 渲染时一次布局同时生成的倍率（逗号分隔）
+    wordcloud_batch_workers: int = 0  # 批量词云任务的进程数（0 为 CPU 核数）
+    wordcloud_batch_max_jobs: int = 1  # 同时进行的批量词云任务数
     
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -1,10 +1,42 @@
 """FastAPI 应用入口"""
+import threading
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime
 
 from app.config import settings
-from app.routers import users, chats, analytics, ai
+from app.routers import users, chats, analytics, ai, search, indexer
+from app.services.analysis_pool import analysis_pool, index_pool
+from app.services.db_pool import connection_pool
+from app.services.executors import executors
+from app.services.indexer import background_indexer
+from app.services.segment_pool import segment_pool
+from app.services.sender_resolver import sender_resolver
+from app.services.wordcloud_cache import wordcloud_cache
+from app.services.wordcloud_jobs import wordcloud_jobs
+from app.utils.jieba_loader import is_jieba_ready, warmup_jieba
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时后台预加载 jieba 词典、预热分析进程池并启动后台索引（及其索引进程池），关闭时释放数据库连接池、线程池、进程池并取消批量任务"""
+    if settings.jieba_warmup:
+        # 后台线程加载，不阻塞启动，健康检查立即可用
+        threading.Thread(target=warmup_jieba, name='jieba-warmup', daemon=True).start()
+    # 启动分析进程池并预热，首个词频、词云请求不用等待进程启动和加载词典
+    analysis_pool.warmup()
+    if background_indexer.start():
+        index_pool.warmup()
+    yield
+    background_indexer.stop()
+    executors.shutdown()
+    connection_pool.close_all()
+    segment_pool.shutdown()
+    analysis_pool.shutdown()
+    index_pool.shutdown()
+    wordcloud_jobs.shutdown()
+
 
 # 创建 FastAPI 应用
 app = FastAPI(
@@ -12,7 +44,8 @@ app = FastAPI(
     description="微信聊天记录导出工具 - Python 后端",
     version="2.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # CORS 中间件
@@ -22,6 +55,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 
@@ -39,6 +73,8 @@ app.include_router(users.router, prefix="/api/users", tags=["用户"])
 app.include_router(chats.router, prefix="/api/chats", tags=["聊天记录"])
 app.include_router(analytics.router, prefix="/api/analytics", tags=["数据分析"])
 app.include_router(ai.router, prefix="/api/ai", tags=["AI 功能"])
+app.include_router(search.router, prefix="/api/search", tags=["搜索"])
+app.include_router(indexer.router, prefix="/api/indexer", tags=["后台索引"])
 
 
 # 健康检查
@@ -47,7 +83,18 @@ async def health_check():
     """健康检查接口"""
     return {
         "status": "ok",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": datetime.now().isoformat(),
+        "dbPool": connection_pool.stats(),
+        "executors": executors.stats(),
+        "analysisPool": analysis_pool.stats(),
+        "indexPool": index_pool.stats(),
+        "jiebaReady": is_jieba_ready(),
+        "wordcloudCache": wordcloud_cache.stats(),
+        "senderCache": sender_resolver.stats(),
+        "indexer": {
+            "running": background_indexer.running,
+            "lagSeconds": background_indexer.status()["lagSeconds"]
+        }
     }
 
 
@@ -68,8 +115,16 @@ async def root():
             "GET  /api/chats/messages - 获取消息列表",
             "GET  /api/chats/dates - 获取日期列表",
             "GET  /api/chats/view - 查看聊天记录 HTML",
+            "GET  /api/chats/export - 流式导出聊天记录（NDJSON/CSV）",
+            "GET  /api/analytics/overview - 账号总览（跨所有聊天）",
             "GET  /api/analytics/statistics - 获取统计数据",
+            "GET  /api/analytics/patterns - 时间分布（热力图、回复间隔）",
+            "GET  /api/analytics/report - 聊天报告（统计、活跃度、词频、词云）",
             "GET  /api/analytics/wordcloud - 生成词云",
+            "GET  /api/analytics/wordcloud.png - 词云图片（PNG 二进制，另有 .webp）",
+            "POST /api/analytics/wordcloud/batch - 批量生成词云（后台任务）",
+            "GET  /api/search - 全文搜索",
+            "GET  /api/indexer/status - 后台索引状态",
             "POST /api/ai/summarize - 聊天内容总结",
         ]
     }
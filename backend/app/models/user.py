@@ -18,6 +18,7 @@ class Contact(BaseModel):
     """联系人信息"""
     user_name: str = Field(..., alias="userName", description="微信号")
     db_contact_remark: str = Field(..., alias="dbContactRemark", description="联系人备注（hex 编码）")
+    display_name: str = Field('', alias="displayName", description="显示名称（备注 > 昵称 > 微信号）")
     db_contact_profile: Optional[str] = Field(None, alias="dbContactProfile", description="个人简介")
     db_contact_head_image: Optional[str] = Field(None, alias="dbContactHeadImage", description="头像")
     
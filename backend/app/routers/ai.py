@@ -4,6 +4,7 @@ from typing import Optional, Dict, Any
 from pydantic import BaseModel
 
 from app.models import ApiResponse
+from app.services.executors import run_llm
 from app.services.llm_service import LLMService
 
 router = APIRouter()
@@ -50,9 +51,9 @@ async def summarize(
         {'summary': '总结内容', 'topics': ['话题1', '话题2']}
     """
     try:
-        llm = get_llm_service()
-        result = llm.summarize_chat(
-            path, userMd5, tableName, limit, startDate, endDate
+        llm = await run_llm(get_llm_service)
+        result = await run_llm(
+            llm.summarize_chat, path, userMd5, tableName, limit, startDate, endDate
         )
         
         print(f'✅ 聊天内容总结完成')
@@ -92,9 +93,9 @@ async def sentiment(
         {'sentiment': 'positive/neutral/negative', 'score': 0.8, 'description': '描述'}
     """
     try:
-        llm = get_llm_service()
-        result = llm.sentiment_analysis(
-            path, userMd5, tableName, limit, startDate, endDate
+        llm = await run_llm(get_llm_service)
+        result = await run_llm(
+            llm.sentiment_analysis, path, userMd5, tableName, limit, startDate, endDate
         )
         
         print(f'✅ 情感分析完成: {result["sentiment"]}')
@@ -121,8 +122,9 @@ async def qa(request: QARequest):
         回答内容
     """
     try:
-        llm = get_llm_service()
-        answer = llm.qa_chat_history(
+        llm = await run_llm(get_llm_service)
+        answer = await run_llm(
+            llm.qa_chat_history,
             request.path,
             request.userMd5,
             request.tableName,
@@ -1,15 +1,31 @@
 """数据分析 API 路由"""
-from fastapi import APIRouter, Query, HTTPException
-from typing import List, Dict, Any, Optional
+from fastapi import APIRouter, Query, HTTPException, Request, Response
+from typing import List, Dict, Any, Literal, Optional
+from pydantic import BaseModel, Field
 
 from app.models import ApiResponse
+from app.services.analysis_pool import AnalysisCancelledError, AnalysisTimeoutError, analysis_pool
 from app.services.analytics import WeChatAnalytics
-from app.services.wordcloud_gen import WeChatWordCloud
+from app.services.executors import run_cpu, run_db
+from app.services.wordcloud_gen import IMAGE_FORMATS, WeChatWordCloud
+from app.services.wordcloud_jobs import WordCloudJobLimitError, wordcloud_jobs
 
 router = APIRouter()
 analytics = WeChatAnalytics()
 wordcloud_gen = WeChatWordCloud()
 
+# 浏览器可以缓存词云，但每次使用前需用 ETag 重新验证（数据更新后 ETag 会变化）
+WORDCLOUD_CACHE_CONTROL = 'private, no-cache'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """请求头 If-None-Match 是否包含给定的 ETag"""
+    if_none_match = request.headers.get('if-none-match')
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+
 
 @router.get("/statistics", response_model=ApiResponse[Dict[str, Any]])
 async def get_statistics(
@@ -17,7 +33,8 @@ async def get_statistics(
     userMd5: str = Query(..., alias="userMd5", description="用户 MD5"),
     tableName: str = Query(..., alias="tableName", description="表名"),
     startDate: Optional[str] = Query(None, alias="startDate", description="开始日期（YYYY-MM-DD）"),
-    endDate: Optional[str] = Query(None, alias="endDate", description="结束日期（YYYY-MM-DD）")
+    endDate: Optional[str] = Query(None, alias="endDate", description="结束日期（YYYY-MM-DD）"),
+    engine: Optional[str] = Query(None, description="统计引擎（aggregate / sql / python / numpy，默认读取配置）")
 ):
     """
     获取聊天统计数据
@@ -35,25 +52,178 @@ async def get_statistics(
         tableName: 表名
         startDate: 开始日期
         endDate: 结束日期
+        engine: 统计引擎
         
     Returns:
         统计数据
     """
     try:
-        stats = analytics.get_chat_statistics(
-            path, userMd5, tableName, startDate, endDate
+        stats = await run_cpu(
+            analytics.get_chat_statistics, path, userMd5, tableName, startDate, endDate, engine
         )
         
         print(f'✅ 返回统计数据: {stats["totalMessages"]} 条消息')
         
         return ApiResponse(success=True, data=stats)
+    except ValueError as e:
+        # 未知的统计引擎
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f'获取统计数据失败: {e}')
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/overview", response_model=ApiResponse[Dict[str, Any]])
+async def get_account_overview(
+    path: str = Query(..., description="微信数据目录路径"),
+    userMd5: str = Query(..., alias="userMd5", description="用户 MD5"),
+    startDate: Optional[str] = Query(None, alias="startDate", description="开始日期（YYYY-MM-DD，默认不限制）"),
+    endDate: Optional[str] = Query(None, alias="endDate", description="结束日期（YYYY-MM-DD，默认不限制）"),
+    topN: int = Query(20, alias="topN", ge=1, le=200, description="最常联系的人 / 群各返回前 N 个")
+):
+    """
+    获取账号总览（跨所有聊天）
+    
+    返回数据包括：
+    - 总消息数、有消息的聊天数
+    - 每月消息数量趋势
+    - 消息类型分布
+    - 最常联系的人和群
+    - 每个聊天的消息数
+    
+    Args:
+        path: 微信数据目录路径
+        userMd5: 用户 MD5
+        startDate: 开始日期
+        endDate: 结束日期
+        topN: 排行数量
+        
+    Returns:
+        账号总览数据
+    """
+    try:
+        overview = await run_db(
+            analytics.get_account_overview, path, userMd5, startDate, endDate, topN
+        )
+        
+        print(f'✅ 返回账号总览: {overview["totalChats"]} 个聊天, {overview["totalMessages"]} 条消息')
+        
+        return ApiResponse(success=True, data=overview)
+    except ValueError as e:
+        # 日期格式错误
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f'获取账号总览失败: {e}')
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/patterns", response_model=ApiResponse[Dict[str, Any]])
+async def get_time_patterns(
+    path: str = Query(..., description="微信数据目录路径"),
+    userMd5: str = Query(..., alias="userMd5", description="用户 MD5"),
+    tableName: str = Query(..., alias="tableName", description="表名"),
+    startDate: Optional[str] = Query(None, alias="startDate", description="开始日期（YYYY-MM-DD）"),
+    endDate: Optional[str] = Query(None, alias="endDate", description="结束日期（YYYY-MM-DD）")
+):
+    """
+    获取时间分布
+    
+    返回数据包括：
+    - 每小时消息分布
+    - 星期 × 小时热力图
+    - 双方回复间隔（中位数、P90、分段计数）
+    
+    Args:
+        path: 微信数据目录路径
+        userMd5: 用户 MD5
+        tableName: 表名
+        startDate: 开始日期
+        endDate: 结束日期
+        
+    Returns:
+        时间分布数据
+    """
+    try:
+        patterns = await run_cpu(
+            analytics.get_time_patterns, path, userMd5, tableName, startDate, endDate
+        )
+        
+        print(f'✅ 返回时间分布: {patterns["totalMessages"]} 条消息')
+        
+        return ApiResponse(success=True, data=patterns)
+    except ValueError as e:
+        # 日期格式错误
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f'获取时间分布失败: {e}')
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/report", response_model=ApiResponse[Dict[str, Any]])
+async def get_report(
+    request: Request,
+    path: str = Query(..., description="微信数据目录路径"),
+    userMd5: str = Query(..., alias="userMd5", description="用户 MD5"),
+    tableName: str = Query(..., alias="tableName", description="表名"),
+    startDate: Optional[str] = Query(None, alias="startDate", description="开始日期（YYYY-MM-DD）"),
+    endDate: Optional[str] = Query(None, alias="endDate", description="结束日期（YYYY-MM-DD）"),
+    topN: int = Query(100, alias="topN", description="返回前 N 个高频词"),
+    wordcloud: bool = Query(True, description="是否生成词云"),
+    width: int = Query(800, description="词云宽度"),
+    height: int = Query(600, description="词云高度"),
+    backgroundColor: str = Query("white", alias="backgroundColor", description="词云背景颜色"),
+    colormap: str = Query("viridis", description="词云颜色方案"),
+    maxWords: int = Query(200, alias="maxWords", description="词云最大词数")
+):
+    """
+    获取聊天报告（一次请求返回统计数据、活跃度、词频和词云）
+    
+    需要逐条读取消息的分析在同一次流式读取中完成，不再分别请求
+    /statistics、/activity、/wordfreq 和 /wordcloud
+    
+    Args:
+        path: 微信数据目录路径
+        userMd5: 用户 MD5
+        tableName: 表名
+        startDate: 开始日期
+        endDate: 结束日期
+        topN: 返回前 N 个高频词
+        wordcloud: 是否生成词云
+        width: 词云宽度
+        height: 词云高度
+        backgroundColor: 词云背景颜色
+        colormap: 词云颜色方案
+        maxWords: 词云最大词数
+        
+    Returns:
+        {'statistics', 'activity', 'wordFrequency', 'wordcloud', 'processedMessages'}
+    """
+    try:
+        report = await analysis_pool.run(
+            'report', path, userMd5, tableName, startDate, endDate, topN, wordcloud,
+            width, height, backgroundColor, colormap, maxWords,
+            request=request
+        )
+        
+        print(f'✅ 返回聊天报告: {report["statistics"]["totalMessages"]} 条消息')
+        
+        return ApiResponse(success=True, data=report)
+    except AnalysisTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except AnalysisCancelledError as e:
+        # 客户端已断开，响应不会被接收
+        raise HTTPException(status_code=499, detail=str(e))
+    except ValueError as e:
+        # 未知的统计引擎或词频引擎
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f'获取聊天报告失败: {e}')
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/activity", response_model=ApiResponse[Dict[str, Any]])
 async def get_activity(
+    request: Request,
     path: str = Query(..., description="微信数据目录路径"),
     userMd5: str = Query(..., alias="userMd5", description="用户 MD5"),
     tableName: str = Query(..., alias="tableName", description="表名"),
@@ -78,13 +248,18 @@ async def get_activity(
         活跃度数据
     """
     try:
-        activity = analytics.get_user_activity(
-            path, userMd5, tableName, startDate, endDate
+        activity = await analysis_pool.run(
+            'user_activity', path, userMd5, tableName, startDate, endDate, request=request
         )
         
         print(f'✅ 返回活跃度数据: {activity["totalUsers"]} 个用户')
         
         return ApiResponse(success=True, data=activity)
+    except AnalysisTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except AnalysisCancelledError as e:
+        # 客户端已断开，响应不会被接收
+        raise HTTPException(status_code=499, detail=str(e))
     except Exception as e:
         print(f'获取活跃度数据失败: {e}')
         raise HTTPException(status_code=500, detail=str(e))
@@ -92,12 +267,14 @@ async def get_activity(
 
 @router.get("/wordfreq", response_model=ApiResponse[List[Dict[str, Any]]])
 async def get_word_frequency(
+    request: Request,
     path: str = Query(..., description="微信数据目录路径"),
     userMd5: str = Query(..., alias="userMd5", description="用户 MD5"),
     tableName: str = Query(..., alias="tableName", description="表名"),
     topN: int = Query(100, alias="topN", description="返回前 N 个高频词"),
     startDate: Optional[str] = Query(None, alias="startDate", description="开始日期（YYYY-MM-DD）"),
-    endDate: Optional[str] = Query(None, alias="endDate", description="结束日期（YYYY-MM-DD）")
+    endDate: Optional[str] = Query(None, alias="endDate", description="结束日期（YYYY-MM-DD）"),
+    engine: Optional[str] = Query(None, description="词频引擎（index / stream，默认读取配置）")
 ):
     """
     获取词频统计
@@ -111,18 +288,28 @@ async def get_word_frequency(
         topN: 返回前 N 个高频词
         startDate: 开始日期
         endDate: 结束日期
+        engine: 词频引擎
         
     Returns:
         词频列表 [{'word': '词', 'count': 次数}, ...]
     """
     try:
-        word_freq = analytics.get_word_frequency(
-            path, userMd5, tableName, topN, startDate, endDate
+        word_freq = await analysis_pool.run(
+            'word_frequency', path, userMd5, tableName, topN, startDate, endDate, engine,
+            request=request
         )
         
         print(f'✅ 返回词频数据: {len(word_freq)} 个词')
         
         return ApiResponse(success=True, data=word_freq)
+    except AnalysisTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except AnalysisCancelledError as e:
+        # 客户端已断开，响应不会被接收
+        raise HTTPException(status_code=499, detail=str(e))
+    except ValueError as e:
+        # 未知的词频引擎
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f'获取词频数据失败: {e}')
         raise HTTPException(status_code=500, detail=str(e))
@@ -130,6 +317,8 @@ async def get_word_frequency(
 
 @router.get("/wordcloud", response_model=ApiResponse[Dict[str, str]])
 async def generate_wordcloud(
+    request: Request,
+    response: Response,
     path: str = Query(..., description="微信数据目录路径"),
     userMd5: str = Query(..., alias="userMd5", description="用户 MD5"),
     tableName: str = Query(..., alias="tableName", description="表名"),
@@ -146,6 +335,9 @@ async def generate_wordcloud(
     
     返回 base64 编码的 PNG 图片，可直接用于前端显示
     
+    相同参数且数据未变化时直接返回缓存的图片；响应带 ETag，
+    请求头 If-None-Match 与之匹配时返回 304
+    
     Args:
         path: 微信数据目录路径
         userMd5: 用户 MD5
@@ -162,16 +354,210 @@ async def generate_wordcloud(
         {'image': 'base64编码的图片'}
     """
     try:
-        image_base64 = wordcloud_gen.generate_wordcloud(
+        params = (
             path, userMd5, tableName,
             width, height, backgroundColor, colormap, maxWords,
             startDate, endDate
         )
         
+        etag = f'"{await run_db(wordcloud_gen.get_cache_key, *params)}"'
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers={'ETag': etag, 'Cache-Control': WORDCLOUD_CACHE_CONTROL})
+        
+        image_base64 = await analysis_pool.run('wordcloud', *params, request=request)
+        
         print(f'✅ 生成词云图片成功')
         
+        response.headers['ETag'] = etag
+        response.headers['Cache-Control'] = WORDCLOUD_CACHE_CONTROL
         return ApiResponse(success=True, data={'image': image_base64})
+    except AnalysisTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except AnalysisCancelledError as e:
+        # 客户端已断开，响应不会被接收
+        raise HTTPException(status_code=499, detail=str(e))
+    except Exception as e:
+        print(f'生成词云失败: {e}')
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def _wordcloud_image_response(
+    request: Request,
+    params: tuple,
+    scale: int,
+    image_format: str
+) -> Response:
+    """返回词云图片二进制响应（带 ETag，匹配 If-None-Match 时返回 304）"""
+    key = await run_db(wordcloud_gen.get_cache_key, *params)
+    etag = f'"{key}-{scale}x-{image_format}"'
+    headers = {'ETag': etag, 'Cache-Control': WORDCLOUD_CACHE_CONTROL}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    
+    data, _ = await analysis_pool.run(
+        'wordcloud_image', *params, scale=scale, image_format=image_format, request=request
+    )
+    print(f'✅ 返回词云图片: {image_format} {scale}x, {len(data) / 1024:.1f} KB')
+    return Response(content=data, media_type=IMAGE_FORMATS[image_format][0], headers=headers)
+
+
+@router.get("/wordcloud.png", response_class=Response)
+async def get_wordcloud_png(
+    request: Request,
+    path: str = Query(..., description="微信数据目录路径"),
+    userMd5: str = Query(..., alias="userMd5", description="用户 MD5"),
+    tableName: str = Query(..., alias="tableName", description="表名"),
+    width: int = Query(800, description="图片宽度（1 倍）"),
+    height: int = Query(600, description="图片高度（1 倍）"),
+    backgroundColor: str = Query("white", alias="backgroundColor", description="背景颜色"),
+    colormap: str = Query("viridis", description="颜色方案"),
+    maxWords: int = Query(200, alias="maxWords", description="最大词数"),
+    startDate: Optional[str] = Query(None, alias="startDate", description="开始日期（YYYY-MM-DD）"),
+    endDate: Optional[str] = Query(None, alias="endDate", description="结束日期（YYYY-MM-DD）"),
+    scale: int = Query(1, ge=1, le=4, description="输出倍率（2 为高分屏 2x）")
+):
+    """
+    获取词云 PNG 图片（二进制）
+    
+    与 /wordcloud 参数相同，直接返回图片字节，可用于 <img src>；
+    响应带 ETag，请求头 If-None-Match 匹配时返回 304
+    
+    Returns:
+        image/png
+    """
+    try:
+        params = (
+            path, userMd5, tableName,
+            width, height, backgroundColor, colormap, maxWords,
+            startDate, endDate
+        )
+        return await _wordcloud_image_response(request, params, scale, 'png')
+    except AnalysisTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except AnalysisCancelledError as e:
+        # 客户端已断开，响应不会被接收
+        raise HTTPException(status_code=499, detail=str(e))
     except Exception as e:
         print(f'生成词云失败: {e}')
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@router.get("/wordcloud.webp", response_class=Response)
+async def get_wordcloud_webp(
+    request: Request,
+    path: str = Query(..., description="微信数据目录路径"),
+    userMd5: str = Query(..., alias="userMd5", description="用户 MD5"),
+    tableName: str = Query(..., alias="tableName", description="表名"),
+    width: int = Query(800, description="图片宽度（1 倍）"),
+    height: int = Query(600, description="图片高度（1 倍）"),
+    backgroundColor: str = Query("white", alias="backgroundColor", description="背景颜色"),
+    colormap: str = Query("viridis", description="颜色方案"),
+    maxWords: int = Query(200, alias="maxWords", description="最大词数"),
+    startDate: Optional[str] = Query(None, alias="startDate", description="开始日期（YYYY-MM-DD）"),
+    endDate: Optional[str] = Query(None, alias="endDate", description="结束日期（YYYY-MM-DD）"),
+    scale: int = Query(1, ge=1, le=4, description="输出倍率（2 为高分屏 2x）")
+):
+    """
+    获取词云 WebP 图片（二进制）
+    
+    参数与 /wordcloud.png 相同
+    
+    Returns:
+        image/webp
+    """
+    try:
+        params = (
+            path, userMd5, tableName,
+            width, height, backgroundColor, colormap, maxWords,
+            startDate, endDate
+        )
+        return await _wordcloud_image_response(request, params, scale, 'webp')
+    except AnalysisTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except AnalysisCancelledError as e:
+        # 客户端已断开，响应不会被接收
+        raise HTTPException(status_code=499, detail=str(e))
+    except Exception as e:
+        print(f'生成词云失败: {e}')
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+class WordCloudBatchRequest(BaseModel):
+    """批量词云任务请求模型"""
+    path: str
+    userMd5: str
+    tableNames: Optional[List[str]] = None
+    minMessages: int = 0
+    outputDir: Optional[str] = None
+    width: int = 800
+    height: int = 600
+    backgroundColor: str = "white"
+    colormap: str = "viridis"
+    maxWords: int = 200
+    startDate: Optional[str] = None
+    endDate: Optional[str] = None
+    scale: int = Field(1, ge=1, le=4)
+    format: Literal['png', 'webp'] = 'png'
+
+
+@router.post("/wordcloud/batch", response_model=ApiResponse[Dict[str, Any]])
+async def start_wordcloud_batch(request: WordCloudBatchRequest):
+    """
+    创建批量词云任务
+    
+    为指定的聊天（不指定 tableNames 时为消息数超过 minMessages 的全部聊天）生成词云，
+    在进程池中并行分词和渲染，图片以 <表名>.<格式> 写入输出目录，结束后写入 manifest.json。
+    输出目录必须位于缓存目录（CACHE_DIR）下，同时进行的任务数不超过 WORDCLOUD_BATCH_MAX_JOBS。
+    任务在后台执行，用返回的 jobId 查询进度
+    
+    Args:
+        request: 批量任务请求
+        
+    Returns:
+        任务进度
+    """
+    try:
+        job = await run_db(
+            wordcloud_jobs.start,
+            request.path, request.userMd5,
+            table_names=request.tableNames,
+            min_messages=request.minMessages,
+            options={
+                'width': request.width,
+                'height': request.height,
+                'background_color': request.backgroundColor,
+                'colormap': request.colormap,
+                'max_words': request.maxWords,
+                'start_date': request.startDate,
+                'end_date': request.endDate,
+                'scale': request.scale,
+                'image_format': request.format,
+            },
+            output_dir=request.outputDir
+        )
+        return ApiResponse(success=True, data=job)
+    except WordCloudJobLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except ValueError as e:
+        # 输出目录不在缓存目录下、聊天表不存在或没有符合条件的聊天
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f'创建批量词云任务失败: {e}')
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/wordcloud/batch/{jobId}", response_model=ApiResponse[Dict[str, Any]])
+async def get_wordcloud_batch(jobId: str):
+    """
+    查询批量词云任务进度
+    
+    Args:
+        jobId: 任务 ID
+        
+    Returns:
+        任务进度（完成数、失败数、每秒处理的聊天数、预计剩余时间等）
+    """
+    job = wordcloud_jobs.get(jobId)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f'任务不存在: {jobId}')
+    return ApiResponse(success=True, data=job)
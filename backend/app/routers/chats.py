@@ -1,15 +1,36 @@
 """聊天记录 API 路由"""
-from fastapi import APIRouter, Query, HTTPException
-from fastapi.responses import HTMLResponse
+from fastapi import APIRouter, Query, HTTPException, Response
+from fastapi.responses import HTMLResponse, StreamingResponse
 from typing import List, Optional, Dict, Any
 
 from app.models import ChatTable, ApiResponse
-from app.services.database import WeChatDatabase
+from app.services.contact_directory import contact_directory
+from app.services.database import WeChatDatabase, parse_date_range
+from app.services.executors import run_db
+from app.services.exporter import ChatExporter, EXPORT_FORMATS
 from app.services.renderer import WeChatRenderer
+from app.services.sender_resolver import sender_resolver
+
+# 下一页游标响应头
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
 
 router = APIRouter()
 db = WeChatDatabase()
 renderer = WeChatRenderer()
+exporter = ChatExporter()
+
+
+def _attach_senders(path: str, user_md5: str, messages: List[Dict[str, Any]]):
+    """为群聊文本消息补充 sender 和 cleanedMessage 字段（同步，在 db 线程池中执行）"""
+    contacts = contact_directory.get(path, user_md5)
+    
+    for msg in messages:
+        # 如果是文本消息且包含发送者信息
+        if msg.get('Type') == 1 and msg.get('Message'):
+            sender_name, message_text = sender_resolver.parse(contacts, msg['Message'])
+            if sender_name is not None:
+                msg['sender'] = sender_name
+                msg['cleanedMessage'] = message_text
 
 
 @router.get("", response_model=ApiResponse[List[ChatTable]])
@@ -30,7 +51,7 @@ async def get_chats(
         聊天表列表
     """
     try:
-        chat_tables = db.get_chat_tables(path, userMd5, limit)
+        chat_tables = await run_db(db.get_chat_tables, path, userMd5, limit)
         
         print(f'✅ 返回 {len(chat_tables)} 个聊天')
         
@@ -42,17 +63,21 @@ async def get_chats(
 
 @router.get("/messages", response_model=ApiResponse[List[Dict[str, Any]]])
 async def get_messages(
+    response: Response,
     path: str = Query(..., description="微信数据目录路径"),
     userMd5: str = Query(..., alias="userMd5", description="用户 MD5"),
     table: str = Query(..., description="表名"),
     limit: int = Query(100, description="限制数量"),
-    offset: int = Query(0, description="偏移量"),
+    offset: int = Query(0, description="偏移量（指定 before 时忽略）"),
     startDate: Optional[str] = Query(None, alias="startDate", description="开始日期（YYYY-MM-DD）"),
-    endDate: Optional[str] = Query(None, alias="endDate", description="结束日期（YYYY-MM-DD）")
+    endDate: Optional[str] = Query(None, alias="endDate", description="结束日期（YYYY-MM-DD）"),
+    before: Optional[str] = Query(None, description="分页游标（上一页响应头 X-Next-Cursor 的值）")
 ):
     """
     获取消息列表
     
+    下一页游标通过响应头 X-Next-Cursor 返回，没有更多消息时不返回该响应头
+    
     Args:
         path: 微信数据目录路径
         userMd5: 用户 MD5
@@ -61,16 +86,24 @@ async def get_messages(
         offset: 偏移量
         startDate: 开始日期
         endDate: 结束日期
+        before: 分页游标
         
     Returns:
         消息列表
     """
     try:
-        messages = db.get_messages(path, userMd5, table, limit, offset, startDate, endDate)
+        messages, next_cursor = await run_db(
+            db.get_message_page, path, userMd5, table, limit, offset, startDate, endDate, before
+        )
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
         
         print(f'✅ 返回 {len(messages)} 条消息')
         
         return ApiResponse(success=True, data=messages)
+    except ValueError as e:
+        # 游标格式无效
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f'获取消息列表失败: {e}')
         raise HTTPException(status_code=500, detail=str(e))
@@ -94,7 +127,7 @@ async def get_message_dates(
         日期列表（YYYY-MM-DD 格式，倒序）
     """
     try:
-        dates = db.get_message_dates(path, userMd5, tableName)
+        dates = await run_db(db.get_message_dates, path, userMd5, tableName)
         
         print(f'✅ 返回 {len(dates)} 个日期')
         
@@ -104,6 +137,52 @@ async def get_message_dates(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/export")
+async def export_chat(
+    path: str = Query(..., description="微信数据目录路径"),
+    userMd5: str = Query(..., alias="userMd5", description="用户 MD5"),
+    tableName: str = Query(..., alias="tableName", description="表名"),
+    format: str = Query("ndjson", description="导出格式（ndjson / csv）"),
+    startDate: Optional[str] = Query(None, alias="startDate", description="开始日期（YYYY-MM-DD）"),
+    endDate: Optional[str] = Query(None, alias="endDate", description="结束日期（YYYY-MM-DD）")
+):
+    """
+    流式导出聊天记录
+    
+    按时间正序导出整个聊天（可按日期筛选），边读边写，内存占用与聊天大小无关
+    
+    Args:
+        path: 微信数据目录路径
+        userMd5: 用户 MD5
+        tableName: 表名
+        format: 导出格式
+        startDate: 开始日期
+        endDate: 结束日期
+        
+    Returns:
+        NDJSON 或 CSV 文件流
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"不支持的导出格式: {format}")
+    
+    # 日期在开始输出前校验，流式响应发送响应头后无法再返回错误状态码
+    try:
+        parse_date_range(startDate, endDate)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if await run_db(db.locate_table, path, userMd5, tableName) is None:
+        raise HTTPException(status_code=404, detail=f"聊天表不存在: {tableName}")
+    
+    media_type, extension = EXPORT_FORMATS[format]
+    
+    return StreamingResponse(
+        exporter.export_chat(path, userMd5, tableName, format, startDate, endDate),
+        media_type=media_type,
+        headers={'Content-Disposition': f'attachment; filename="{tableName}.{extension}"'}
+    )
+
+
 @router.get("/view", response_class=HTMLResponse)
 async def view_chat(
     path: str = Query(..., description="微信数据目录路径"),
@@ -144,7 +223,8 @@ async def view_chat(
             )
         )
         
-        html = renderer.render_chat_html(
+        html = await run_db(
+            renderer.render_chat_html,
             path, userMd5, tableName, chat_info,
             limit=100, offset=0,
             start_date=startDate, end_date=endDate
@@ -167,18 +247,22 @@ async def view_chat(
 
 @router.get("/view/messages", response_model=ApiResponse[List[Dict[str, Any]]])
 async def get_view_messages(
+    response: Response,
     path: str = Query(..., description="微信数据目录路径"),
     userMd5: str = Query(..., alias="userMd5", description="用户 MD5"),
     tableName: str = Query(..., alias="tableName", description="表名"),
     isGroup: str = Query(..., alias="isGroup", description="是否为群聊"),
     limit: int = Query(100, description="限制数量"),
-    offset: int = Query(0, description="偏移量"),
+    offset: int = Query(0, description="偏移量（指定 before 时忽略）"),
     startDate: Optional[str] = Query(None, alias="startDate", description="开始日期（YYYY-MM-DD）"),
-    endDate: Optional[str] = Query(None, alias="endDate", description="结束日期（YYYY-MM-DD）")
+    endDate: Optional[str] = Query(None, alias="endDate", description="结束日期（YYYY-MM-DD）"),
+    before: Optional[str] = Query(None, description="分页游标（上一页响应头 X-Next-Cursor 的值）")
 ):
     """
     获取消息列表（用于无限滚动）
     
+    下一页游标通过响应头 X-Next-Cursor 返回，没有更多消息时不返回该响应头
+    
     Args:
         path: 微信数据目录路径
         userMd5: 用户 MD5
@@ -188,44 +272,26 @@ async def get_view_messages(
         offset: 偏移量
         startDate: 开始日期
         endDate: 结束日期
+        before: 分页游标
         
     Returns:
         消息列表（群聊消息会包含 sender 和 cleanedMessage 字段）
     """
     try:
-        messages = db.get_messages(path, userMd5, tableName, limit, offset, startDate, endDate)
+        messages, next_cursor = await run_db(
+            db.get_message_page, path, userMd5, tableName, limit, offset, startDate, endDate, before
+        )
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
         
         # 如果是群聊，解析发送者昵称
         processed_messages = messages
         if isGroup.lower() == 'true':
-            from app.utils.crypto import md5, decode_user_name_info, get_friendly_name
-            
-            contacts_map = db.get_contacts(path, userMd5)
-            
-            for msg in processed_messages:
-                # 如果是文本消息且包含发送者信息
-                if msg.get('Type') == 1 and msg.get('Message') and ':\n' in msg['Message']:
-                    parts = msg['Message'].split(':\n', 1)
-                    if len(parts) >= 2:
-                        sender_id = parts[0].strip()
-                        message_text = parts[1]
-                        
-                        # 查找发送者昵称
-                        sender_md5 = md5(sender_id)
-                        sender_contact = contacts_map.get(sender_md5)
-                        sender_name = ''
-                        
-                        if sender_contact:
-                            sender_name = decode_user_name_info(sender_contact.db_contact_remark)
-                        
-                        # 如果没找到昵称，使用友好名称
-                        if not sender_name or sender_name == sender_id:
-                            sender_name = get_friendly_name(sender_id, '', False)
-                        
-                        msg['sender'] = sender_name
-                        msg['cleanedMessage'] = message_text
+            await run_db(_attach_senders, path, userMd5, processed_messages)
         
         return ApiResponse(success=True, data=processed_messages)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f'获取消息列表失败: {e}')
         raise HTTPException(status_code=500, detail=str(e))
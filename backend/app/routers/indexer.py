@@ -0,0 +1,19 @@
+"""后台索引 API 路由"""
+from fastapi import APIRouter
+from typing import Dict, Any
+
+from app.models import ApiResponse
+from app.services.indexer import background_indexer
+
+router = APIRouter()
+
+
+@router.get("/status", response_model=ApiResponse[Dict[str, Any]])
+async def get_indexer_status():
+    """
+    获取后台索引状态
+    
+    Returns:
+        运行状态、监视方式，以及各账号是否有未处理的变化和滞后秒数（lagSeconds）
+    """
+    return ApiResponse(success=True, data=background_indexer.status())
@@ -0,0 +1,51 @@
+"""全文搜索 API 路由"""
+from fastapi import APIRouter, Query, HTTPException
+from typing import Dict, Any, Optional
+
+from app.models import ApiResponse
+from app.services.executors import run_cpu
+from app.services.search_index import search_index
+
+router = APIRouter()
+
+
+@router.get("", response_model=ApiResponse[Dict[str, Any]])
+async def search_messages(
+    path: str = Query(..., description="微信数据目录路径"),
+    userMd5: str = Query(..., alias="userMd5", description="用户 MD5"),
+    q: str = Query(..., min_length=1, description="搜索内容"),
+    limit: int = Query(20, ge=1, le=200, description="返回条数"),
+    offset: int = Query(0, ge=0, description="偏移量"),
+    tableName: Optional[str] = Query(None, alias="tableName", description="只搜索指定聊天表")
+):
+    """
+    搜索所有聊天的文本消息
+
+    索引不是最新时（首次搜索或有新消息）在分析进程池中后台更新，不等待索引完成：
+    更新期间返回已索引部分的结果，indexing 为 true
+
+    Args:
+        path: 微信数据目录路径
+        userMd5: 用户 MD5
+        q: 搜索内容（按 jieba 分词，所有词都出现的消息才会命中）
+        limit: 返回条数
+        offset: 偏移量
+        tableName: 只搜索指定聊天表
+
+    Returns:
+        按相关度排序的命中消息（表名、CreateTime、带 <mark> 高亮的摘要等）及索引状态
+    """
+    try:
+        result = await run_cpu(
+            search_index.search, path, userMd5, q,
+            limit=limit, offset=offset, table_name=tableName
+        )
+
+        print(f'✅ 搜索 "{q}": {result["total"]} 条结果' + ('（索引更新中）' if result['indexing'] else ''))
+
+        return ApiResponse(success=True, data=result)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f'搜索失败: {e}')
+        raise HTTPException(status_code=500, detail=str(e))
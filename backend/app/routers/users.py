@@ -1,14 +1,64 @@
 """用户相关 API 路由"""
 from fastapi import APIRouter, Query, HTTPException
-from typing import List, Dict
+from typing import Dict, Optional
 
 from app.models import UserInfo, ApiResponse
+from app.services.executors import run_db
 from app.services.parser import WeChatParser
 
 router = APIRouter()
 parser = WeChatParser()
 
 
+def _load_users(path: str) -> Dict[str, UserInfo]:
+    """读取用户列表（同步，在 db 线程池中执行）"""
+    # 解析 LoginInfo2.dat
+    user_info_map = parser.parse_login_info(path)
+    
+    # 扫描用户目录
+    user_md5s = parser.scan_users(path)
+    
+    # 合并信息并补充头像
+    result = {}
+    for user_md5 in user_md5s:
+        if user_md5 in user_info_map:
+            user_info = user_info_map[user_md5]
+        else:
+            # 如果 LoginInfo2.dat 中没有，创建一个默认的
+            user_info = UserInfo(
+                md5=user_md5,
+                wechatId=f"user_{user_md5[:8]}",
+                nickname=f"用户-{user_md5[:8]}"
+            )
+        
+        # 尝试获取头像路径
+        avatar = parser.get_user_avatar(path, user_md5)
+        if avatar:
+            user_info.avatar = avatar
+        
+        result[user_md5] = user_info
+    
+    return result
+
+
+def _load_user(path: str, md5: str) -> Optional[UserInfo]:
+    """读取单个用户信息，不存在返回 None（同步，在 db 线程池中执行）"""
+    # 解析 LoginInfo2.dat
+    user_info_map = parser.parse_login_info(path)
+    
+    if md5 not in user_info_map:
+        return None
+    
+    user_info = user_info_map[md5]
+    
+    # 尝试获取头像路径
+    avatar = parser.get_user_avatar(path, md5)
+    if avatar:
+        user_info.avatar = avatar
+    
+    return user_info
+
+
 @router.get("", response_model=ApiResponse[Dict[str, UserInfo]])
 async def get_users(
     path: str = Query(..., description="微信数据目录路径")
@@ -23,31 +73,7 @@ async def get_users(
         用户信息字典
     """
     try:
-        # 解析 LoginInfo2.dat
-        user_info_map = parser.parse_login_info(path)
-        
-        # 扫描用户目录
-        user_md5s = parser.scan_users(path)
-        
-        # 合并信息并补充头像
-        result = {}
-        for user_md5 in user_md5s:
-            if user_md5 in user_info_map:
-                user_info = user_info_map[user_md5]
-            else:
-                # 如果 LoginInfo2.dat 中没有，创建一个默认的
-                user_info = UserInfo(
-                    md5=user_md5,
-                    wechatId=f"user_{user_md5[:8]}",
-                    nickname=f"用户-{user_md5[:8]}"
-                )
-            
-            # 尝试获取头像路径
-            avatar = parser.get_user_avatar(path, user_md5)
-            if avatar:
-                user_info.avatar = avatar
-            
-            result[user_md5] = user_info
+        result = await run_db(_load_users, path)
         
         print(f'✅ 返回 {len(result)} 个用户')
         
@@ -73,19 +99,11 @@ async def get_user(
         用户信息
     """
     try:
-        # 解析 LoginInfo2.dat
-        user_info_map = parser.parse_login_info(path)
+        user_info = await run_db(_load_user, path, md5)
         
-        if md5 not in user_info_map:
+        if user_info is None:
             raise HTTPException(status_code=404, detail=f"用户不存在: {md5}")
         
-        user_info = user_info_map[md5]
-        
-        # 尝试获取头像路径
-        avatar = parser.get_user_avatar(path, md5)
-        if avatar:
-            user_info.avatar = avatar
-        
         print(f'✅ 返回用户信息: {user_info.nickname}')
         
         return ApiResponse(success=True, data=user_info)
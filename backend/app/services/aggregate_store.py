@@ -0,0 +1,281 @@
+"""统计数据预聚合存储（每个账号一个 SQLite sidecar 文件）"""
+import sqlite3
+import threading
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+from app.services.database import DAY_BUCKET_SQL, HOUR_BUCKET_SQL, empty_counts
+from app.services.db_pool import connection_pool, get_db_path, get_file_signature
+from app.services.table_index import table_locator
+from app.utils.storage import open_sidecar_db
+
+AGGREGATE_DB_FILE = 'aggregates.sqlite'
+# sidecar 结构版本，结构变化时递增以重建
+SCHEMA_VERSION = 2
+
+SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS message_counts (
+        table_name TEXT NOT NULL,
+        day TEXT NOT NULL,          -- 本地日期 YYYY-MM-DD，CreateTime 为空时为 ''
+        hour INTEGER NOT NULL,      -- 本地小时 0-23，CreateTime 为空时为 -1
+        type INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (table_name, day, hour, type)
+    );
+    CREATE TABLE IF NOT EXISTS table_state (
+        table_name TEXT PRIMARY KEY,
+        db_index INTEGER NOT NULL,
+        max_row_id INTEGER NOT NULL,  -- 已聚合的最大 rowid（高水位）
+        row_count INTEGER NOT NULL,   -- 已聚合的消息数（源表行数与之不符时整表重建）
+        mtime_ns INTEGER,             -- 上次刷新时源数据库文件的签名
+        size INTEGER
+    );
+"""
+
+DROP_SQL = """
+    DROP TABLE IF EXISTS message_counts;
+    DROP TABLE IF EXISTS table_state;
+"""
+
+# 源表的最大 rowid、总行数和高水位之后的行数
+SOURCE_STATE_SQL = """
+    SELECT MAX(rowid) AS maxRowId, COUNT(*) AS rowCount, SUM(rowid > ?) AS newRows
+    FROM "{table_name}"
+"""
+
+# 按 (日期, 小时, 类型) 聚合源表中 rowid 大于高水位的消息
+SOURCE_AGGREGATE_SQL = """
+    SELECT
+        {day_bucket} AS day,
+        {hour_bucket} AS hour,
+        COALESCE(Type, 0) AS msg_type,
+        COUNT(*) AS count
+    FROM "{table_name}"
+    WHERE rowid > ?
+    GROUP BY day, hour, msg_type
+"""
+
+
+class AggregateStore:
+    """按 (表, 日期, 小时, 类型) 预聚合的消息计数，按 rowid 高水位增量更新"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 每个 sidecar 文件一把写锁，避免同一进程内重复刷新同一张表
+        self._write_locks: Dict[str, threading.Lock] = {}
+
+    def _connect(self, documents_path: str, user_md5: str) -> sqlite3.Connection:
+        """打开（必要时创建）账号的 sidecar 数据库"""
+        return open_sidecar_db(
+            documents_path, user_md5, AGGREGATE_DB_FILE, SCHEMA_SQL, SCHEMA_VERSION, DROP_SQL
+        )
+
+    def _write_lock(self, documents_path: str, user_md5: str) -> threading.Lock:
+        """获取账号 sidecar 的写锁"""
+        key = f'{documents_path}\0{user_md5}'
+        with self._lock:
+            return self._write_locks.setdefault(key, threading.Lock())
+
+    def refresh_table(self, documents_path: str, user_md5: str, table_name: str) -> bool:
+        """
+        把源表中新增的消息合并进聚合数据
+
+        源数据库文件未变化时直接返回；rowid 高水位回退或源表行数与已聚合的行数加新增行数不符
+        （消息被删除或备份被替换）时整表重建。分析进程池、服务进程可能同时刷新同一张表，
+        写入前在 BEGIN IMMEDIATE 事务中确认高水位未被其他进程更新，否则放弃写入
+
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+            table_name: 表名
+
+        Returns:
+            表是否存在
+        """
+        db_index = table_locator.locate(documents_path, user_md5, table_name)
+        if db_index is None:
+            return False
+
+        db_name = f'message_{db_index}.sqlite'
+        signature = get_file_signature(get_db_path(documents_path, user_md5, db_name))
+        if signature is None:
+            return False
+
+        with self._write_lock(documents_path, user_md5):
+            store = self._connect(documents_path, user_md5)
+            try:
+                state = store.execute(
+                    'SELECT * FROM table_state WHERE table_name = ?', (table_name,)
+                ).fetchone()
+
+                if (state and state['db_index'] == db_index
+                        and (state['mtime_ns'], state['size']) == signature):
+                    return True
+
+                committed = state['max_row_id'] if state else None
+                if state and state['db_index'] == db_index:
+                    high_water, row_count = committed, state['row_count']
+                else:
+                    high_water, row_count = 0, 0
+
+                with connection_pool.connection(documents_path, user_md5, db_name) as conn:
+                    if not conn:
+                        return False
+
+                    source = conn.execute(
+                        SOURCE_STATE_SQL.format(table_name=table_name), (high_water,)
+                    ).fetchone()
+                    source_max = source['maxRowId'] or 0
+
+                    # 首次构建、数据回退或有消息被删除：整表重建
+                    rebuild = (source_max < high_water or high_water == 0
+                               or row_count + (source['newRows'] or 0) != source['rowCount'])
+                    if rebuild:
+                        high_water = 0
+
+                    rows = []
+                    if source_max > high_water:
+                        rows = conn.execute(
+                            SOURCE_AGGREGATE_SQL.format(
+                                table_name=table_name,
+                                day_bucket=DAY_BUCKET_SQL,
+                                hour_bucket=HOUR_BUCKET_SQL
+                            ),
+                            (high_water,)
+                        ).fetchall()
+
+                if not self._begin_write(store, table_name, committed):
+                    return True
+                if rebuild:
+                    store.execute('DELETE FROM message_counts WHERE table_name = ?', (table_name,))
+                store.executemany("""
+                    INSERT INTO message_counts (table_name, day, hour, type, count)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (table_name, day, hour, type)
+                    DO UPDATE SET count = count + excluded.count
+                """, [(table_name, row['day'], row['hour'], row['msg_type'], row['count']) for row in rows])
+
+                store.execute("""
+                    INSERT OR REPLACE INTO table_state (table_name, db_index, max_row_id, row_count, mtime_ns, size)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (table_name, db_index, source_max, source['rowCount'], signature[0], signature[1]))
+                store.commit()
+
+                if rows:
+                    print(f'聚合数据已更新: {table_name}（rowid > {high_water}，{len(rows)} 个分组）')
+                return True
+            finally:
+                store.close()
+
+    def _begin_write(
+        self,
+        store: sqlite3.Connection,
+        table_name: str,
+        committed: Optional[int]
+    ) -> bool:
+        """
+        开始写事务，并确认高水位仍是读取源表前的值
+
+        其他进程同时在聚合同一张表时放弃写入，避免计数被重复累加
+
+        Returns:
+            是否可以继续写入（False 时事务已回滚）
+        """
+        store.execute('BEGIN IMMEDIATE')
+        row = store.execute(
+            'SELECT max_row_id FROM table_state WHERE table_name = ?', (table_name,)
+        ).fetchone()
+        if (row['max_row_id'] if row else None) != committed:
+            store.rollback()
+            print(f'聚合数据 {table_name} 正由其他进程更新，跳过')
+            return False
+        return True
+
+    def get_counts(
+        self,
+        documents_path: str,
+        user_md5: str,
+        table_name: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> Dict[str, Counter]:
+        """
+        读取日期范围内的消息计数（先增量刷新）
+
+        未指定日期时与 get_messages 一致，只统计最新一天
+
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+            table_name: 表名
+            start_date: 开始日期（YYYY-MM-DD）
+            end_date: 结束日期（YYYY-MM-DD）
+
+        Returns:
+            计数结果（见 database.empty_counts）
+        """
+        counts = empty_counts()
+        if not self.refresh_table(documents_path, user_md5, table_name):
+            return counts
+
+        store = self._connect(documents_path, user_md5)
+        try:
+            condition, params = self._day_condition(store, table_name, start_date, end_date)
+            params = [table_name] + params
+
+            # 三个维度分别在 SQLite 中求和，只返回几百行
+            for row in store.execute(f"""
+                SELECT type, SUM(count) AS count FROM message_counts
+                WHERE table_name = ? {condition}
+                GROUP BY type
+            """, params):
+                counts['types'][row['type']] = row['count']
+
+            for row in store.execute(f"""
+                SELECT day, SUM(count) AS count FROM message_counts
+                WHERE table_name = ? {condition} AND day <> ''
+                GROUP BY day
+            """, params):
+                counts['daily'][row['day']] = row['count']
+
+            for row in store.execute(f"""
+                SELECT hour, SUM(count) AS count FROM message_counts
+                WHERE table_name = ? {condition} AND day <> ''
+                GROUP BY hour
+            """, params):
+                counts['hourly'][row['hour']] = row['count']
+        finally:
+            store.close()
+
+        return counts
+
+    def _day_condition(
+        self,
+        store: sqlite3.Connection,
+        table_name: str,
+        start_date: Optional[str],
+        end_date: Optional[str]
+    ) -> Tuple[str, list]:
+        """构建按本地日期筛选的条件"""
+        if start_date or end_date:
+            condition = "AND day <> ''"
+            params: list = []
+            if start_date:
+                condition += ' AND day >= ?'
+                params.append(start_date)
+            if end_date:
+                condition += ' AND day <= ?'
+                params.append(end_date)
+            return condition, params
+
+        # 默认只统计最新一天
+        latest_day = store.execute(
+            "SELECT MAX(day) FROM message_counts WHERE table_name = ? AND day <> ''", (table_name,)
+        ).fetchone()[0]
+        if latest_day is None:
+            return '', []
+        return 'AND day >= ?', [latest_day]
+
+
+# 全局预聚合存储实例
+aggregate_store = AggregateStore()
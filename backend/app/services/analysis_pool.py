@@ -0,0 +1,326 @@
+"""CPU 密集的分析请求（词频、活跃度、词云、聊天报告）在独立进程中执行，带超时和断开取消
+
+分析任务在子进程中执行，不占用服务进程的 GIL，消息浏览等请求不会被拖慢。
+客户端断开或超时时取消排队中的任务；超时的任务已在执行时重启进程池
+（ProcessPoolExecutor 无法单独终止某个任务）。
+后台索引任务使用单独的索引进程池，分析请求超时重启进程池时不会中断索引
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from typing import Any, Dict, List, Optional, Tuple
+
+from starlette.requests import Request
+
+from app.config import settings
+from app.services.executors import executors, run_cpu
+from app.utils.jieba_loader import get_jieba
+
+# 检查客户端是否断开的间隔（秒）
+DISCONNECT_POLL_INTERVAL = 0.5
+
+# 任务名 → (服务, 方法名)
+ANALYSIS_TASKS: Dict[str, Tuple[str, str]] = {
+    'word_frequency': ('analytics', 'get_word_frequency'),
+    'user_activity': ('analytics', 'get_user_activity'),
+    'wordcloud': ('wordcloud', 'generate_wordcloud'),
+    'wordcloud_image': ('wordcloud', 'get_wordcloud_image'),
+    'report': ('wordcloud', 'generate_report'),
+    'search_index': ('search', 'refresh'),
+    'index_table': ('indexer', 'refresh_table'),
+}
+
+# 执行任务的进程中的服务实例（每个进程一份）
+_services: Dict[str, Any] = {}
+_services_lock = threading.Lock()
+
+
+class AnalysisTimeoutError(TimeoutError):
+    """分析任务超时"""
+
+
+class AnalysisCancelledError(Exception):
+    """分析任务因客户端断开或进程池重启被取消"""
+
+
+def _init_worker():
+    """子进程初始化：禁用嵌套的分词进程池并预加载 jieba 词典"""
+    settings.segment_workers = 1
+    get_jieba()
+
+
+def _warmup_task() -> int:
+    """空任务：返回时所在进程已完成初始化（jieba 词典已加载）"""
+    return os.getpid()
+
+
+def _get_service(name: str) -> Any:
+    """获取当前进程的服务实例（首次使用时创建）"""
+    with _services_lock:
+        if name not in _services:
+            if name == 'analytics':
+                from app.services.analytics import WeChatAnalytics
+                _services[name] = WeChatAnalytics()
+            elif name == 'search':
+                from app.services.search_index import search_index
+                _services[name] = search_index
+            elif name == 'indexer':
+                from app.services.indexer import background_indexer
+                _services[name] = background_indexer
+            else:
+                from app.services.wordcloud_gen import WeChatWordCloud
+                _services[name] = WeChatWordCloud()
+        return _services[name]
+
+
+def run_analysis_task(task: str, args: tuple, kwargs: Dict[str, Any]) -> Any:
+    """
+    执行分析任务（在子进程中，或进程池关闭时在 cpu 线程池中）
+
+    Args:
+        task: 任务名（见 ANALYSIS_TASKS）
+        args: 位置参数
+        kwargs: 关键字参数
+
+    Returns:
+        对应服务方法的返回值
+    """
+    service_name, method_name = ANALYSIS_TASKS[task]
+    return getattr(_get_service(service_name), method_name)(*args, **kwargs)
+
+
+class AnalysisPool:
+    """分析进程池（应用启动时创建并预热，应用关闭时释放）"""
+
+    def __init__(self, name: str = '分析', workers_setting: str = 'analysis_workers'):
+        """
+        Args:
+            name: 进程池名称（用于日志）
+            workers_setting: 进程数对应的配置项
+        """
+        self._name = name
+        self._workers_setting = workers_setting
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # 预热任务 (进程池, 各进程的空任务)
+        self._warmup: Optional[Tuple[ProcessPoolExecutor, List[Future]]] = None
+
+    @property
+    def workers(self) -> int:
+        """进程数（settings.analysis_workers / index_workers，0 表示不使用进程池）"""
+        return max(0, getattr(settings, self._workers_setting))
+
+    @property
+    def enabled(self) -> bool:
+        """是否在进程池中执行分析任务"""
+        return self.workers > 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn 启动，避免在已有线程的服务进程中 fork
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=get_context('spawn'),
+                    initializer=_init_worker
+                )
+                print(f'✅ {self._name}进程池已启动: {self.workers} 个进程')
+            return self._executor
+
+    def warmup(self):
+        """
+        启动进程池并为每个进程提交一个空任务（应用启动时以及进程池重启后调用）
+
+        进程启动和初始化（加载 jieba 词典）在后台完成，首个分析请求不再需要等待，
+        也不会因此超时
+        """
+        if not self.enabled:
+            return
+
+        executor = self._get_executor()
+        start = time.perf_counter()
+        futures = [executor.submit(_warmup_task) for _ in range(self.workers)]
+        with self._lock:
+            self._warmup = (executor, futures)
+
+        def on_done(_: Future):
+            if all(future.done() for future in futures) and self._is_warm():
+                print(f'✅ {self._name}进程池预热完成: {self.workers} 个进程，耗时 {time.perf_counter() - start:.2f}s')
+
+        for future in futures:
+            future.add_done_callback(on_done)
+
+    def _is_warm(self) -> bool:
+        """当前进程池的预热任务是否都已成功完成"""
+        warmup = self._warmup
+        if warmup is None or warmup[0] is not self._executor:
+            return False
+        return all(
+            future.done() and not future.cancelled() and future.exception() is None
+            for future in warmup[1]
+        )
+
+    def submit(self, task: str, *args: Any, **kwargs: Any) -> Future:
+        """
+        提交后台任务（如建立索引），不等待结果、不设超时
+
+        进程池关闭时在 cpu 线程池中执行；进程池因超时被重启时任务以 BrokenProcessPool 结束
+
+        Args:
+            task: 任务名（见 ANALYSIS_TASKS）
+            *args: 位置参数
+            **kwargs: 关键字参数
+
+        Returns:
+            任务的 Future
+        """
+        if task not in ANALYSIS_TASKS:
+            raise ValueError(f'未知的分析任务: {task}')
+        if not self.enabled:
+            return executors.submit('cpu', run_analysis_task, task, args, kwargs)
+        executor = self._get_executor()
+        try:
+            return executor.submit(run_analysis_task, task, args, kwargs)
+        except BrokenProcessPool:
+            # 子进程异常退出后进程池不再可用，重建后重新提交
+            self._restart(executor, f'{self._name}进程池不可用')
+            return self._get_executor().submit(run_analysis_task, task, args, kwargs)
+
+    async def run(
+        self,
+        task: str,
+        *args: Any,
+        request: Optional[Request] = None,
+        timeout: Optional[float] = None,
+        **kwargs: Any
+    ) -> Any:
+        """
+        执行分析任务并等待结果
+
+        Args:
+            task: 任务名（见 ANALYSIS_TASKS）
+            *args: 位置参数
+            request: 当前请求，客户端断开时取消任务
+            timeout: 超时秒数（默认 settings.analysis_timeout，0 表示不限制）
+            **kwargs: 关键字参数
+
+        Returns:
+            对应服务方法的返回值
+
+        Raises:
+            AnalysisTimeoutError: 超时
+            AnalysisCancelledError: 客户端断开或进程池被重启
+        """
+        if task not in ANALYSIS_TASKS:
+            raise ValueError(f'未知的分析任务: {task}')
+        if timeout is None:
+            timeout = settings.analysis_timeout
+
+        if not self.enabled:
+            # 不使用进程池时在 cpu 线程池中执行（线程无法中止，超时只结束等待）
+            coro = run_cpu(run_analysis_task, task, args, kwargs)
+            try:
+                return await asyncio.wait_for(coro, timeout or None)
+            except asyncio.TimeoutError:
+                raise AnalysisTimeoutError(f'分析任务超时（{timeout:g} 秒）: {task}')
+
+        executor = self._get_executor()
+        future = executor.submit(run_analysis_task, task, args, kwargs)
+        try:
+            return await self._wait(task, executor, future, request, timeout)
+        except BrokenProcessPool:
+            raise AnalysisCancelledError(f'分析进程池已重启，任务被取消: {task}')
+
+    async def _wait(
+        self,
+        task: str,
+        executor: ProcessPoolExecutor,
+        future: Future,
+        request: Optional[Request],
+        timeout: float
+    ) -> Any:
+        """等待任务完成，期间检查客户端是否断开和是否超时"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout else None
+        waiter = asyncio.wrap_future(future)
+
+        while True:
+            interval = DISCONNECT_POLL_INTERVAL
+            if deadline is not None:
+                interval = max(0.0, min(interval, deadline - loop.time()))
+            done, _ = await asyncio.wait({waiter}, timeout=interval)
+            if done:
+                return waiter.result()
+
+            if request is not None and await request.is_disconnected():
+                # 已开始执行的任务继续完成（结果会写入词云缓存和分词索引，重试时可以复用）
+                if future.cancel():
+                    print(f'客户端已断开，取消排队中的分析任务: {task}')
+                self._discard(waiter)
+                raise AnalysisCancelledError(f'客户端已断开: {task}')
+
+            if deadline is not None and loop.time() >= deadline:
+                if not future.cancel():
+                    self._restart(executor, f'分析任务超时: {task}')
+                self._discard(waiter)
+                raise AnalysisTimeoutError(f'分析任务超时（{timeout:g} 秒）: {task}')
+
+    @staticmethod
+    def _discard(waiter: asyncio.Future):
+        """不再等待的任务：忽略其结果和异常"""
+        waiter.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+    def _restart(self, executor: ProcessPoolExecutor, reason: str):
+        """终止进程池中的进程并重新创建、预热，该进程池中的其他任务会被取消"""
+        with self._lock:
+            current = self._executor is executor
+            if current:
+                self._executor = None
+        print(f'{reason}，重启{self._name}进程池')
+        self._terminate(executor)
+        if current:
+            self.warmup()
+
+    @staticmethod
+    def _terminate(executor: ProcessPoolExecutor):
+        # ProcessPoolExecutor 没有公开的终止接口，直接结束子进程
+        processes = list((getattr(executor, '_processes', None) or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        进程池状态
+
+        Returns:
+            {'enabled', 'workers', 'started', 'warm', 'timeout'}；
+            warm 表示所有进程都已启动并加载好 jieba 词典
+        """
+        return {
+            'enabled': self.enabled,
+            'workers': self.workers,
+            'started': self._executor is not None,
+            'warm': self._is_warm(),
+            'timeout': settings.analysis_timeout,
+        }
+
+    def shutdown(self):
+        """关闭进程池（终止进行中的任务）"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._warmup = None
+        if executor is not None:
+            self._terminate(executor)
+
+
+# 全局分析进程池实例
+analysis_pool = AnalysisPool()
+
+# 全局后台索引进程池实例（统计预聚合、预分词、全文搜索索引，只通过 submit 提交，不会因请求超时被重启）
+index_pool = AnalysisPool('索引', 'index_workers')
@@ -1,11 +1,27 @@
 """数据分析服务"""
+import time
 from typing import Dict, List, Any, Optional
-from datetime import datetime
 from collections import Counter
-import jieba
-import jieba.analyse
 
+from app.config import settings
+from app.services.aggregate_store import aggregate_store
+from app.services.analyzers import (
+    STOP_WORDS, StatisticsAnalyzer, UserActivityAnalyzer, WordFrequencyAnalyzer
+)
+from app.services.columnar import (
+    WEEKDAY_NAMES, count_messages, get_timezone, response_times, to_local_seconds, weekday_heatmap
+)
+from app.services.contact_directory import contact_directory
 from app.services.database import WeChatDatabase
+from app.services.table_index import get_message_db_version
+from app.services.token_index import token_index
+from app.utils.lru_cache import LRUCache
+
+STATISTICS_ENGINES = ('aggregate', 'sql', 'python', 'numpy')
+WORD_FREQUENCY_ENGINES = ('index', 'stream')
+
+# 内存中缓存的账号总览数（键包含数据版本，数据库或联系人更新后自动失效）
+OVERVIEW_CACHE_SIZE = 16
 
 
 class WeChatAnalytics:
@@ -14,12 +30,8 @@ class WeChatAnalytics:
     def __init__(self):
         self.db = WeChatDatabase()
         # 停用词列表（可以扩展）
-        self.stop_words = set([
-            '的', '了', '在', '是', '我', '有', '和', '就', '不', '人', '都', '一',
-            '一个', '上', '也', '很', '到', '说', '要', '去', '你', '会', '着', '没有',
-            '看', '好', '自己', '这', '那', '什么', '吗', '他', '她', '它', '们',
-            '啊', '哦', '呢', '吧', '哈', '嗯', '哎', '哟', '嘿', '嘛', '呀'
-        ])
+        self.stop_words = set(STOP_WORDS)
+        self._overview_cache = LRUCache(OVERVIEW_CACHE_SIZE)
     
     def get_chat_statistics(
         self,
@@ -27,7 +39,8 @@ class WeChatAnalytics:
         user_md5: str,
         table_name: str,
         start_date: Optional[str] = None,
-        end_date: Optional[str] = None
+        end_date: Optional[str] = None,
+        engine: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         获取聊天统计数据
@@ -38,20 +51,140 @@ class WeChatAnalytics:
             table_name: 表名
             start_date: 开始日期（YYYY-MM-DD）
             end_date: 结束日期（YYYY-MM-DD）
+            engine: 统计引擎（默认 settings.statistics_engine）
+                aggregate - 读取预聚合 sidecar（增量更新）
+                sql - 在 SQLite 中 GROUP BY，只传回分组结果
+                python - 流式读取消息后逐条统计（不限消息数量）
+                numpy - 读取 CreateTime / Type 列为数组后向量化分桶（时区见 settings.analytics_timezone）
             
         Returns:
             统计数据字典
+            
+        Raises:
+            ValueError: 未知的统计引擎
+        """
+        counts = self._count_messages(
+            documents_path, user_md5, table_name, start_date, end_date,
+            engine or settings.statistics_engine
+        )
+        return self._build_statistics(counts)
+    
+    def _count_messages(
+        self,
+        documents_path: str,
+        user_md5: str,
+        table_name: str,
+        start_date: Optional[str],
+        end_date: Optional[str],
+        engine: str
+    ) -> Dict[str, Counter]:
+        """用指定的统计引擎计数（见 get_chat_statistics）"""
+        if engine == 'aggregate':
+            return aggregate_store.get_counts(
+                documents_path, user_md5, table_name, start_date, end_date
+            )
+        if engine == 'sql':
+            return self.db.get_message_counts(
+                documents_path, user_md5, table_name, start_date, end_date
+            )
+        if engine == 'python':
+            return self._count_messages_python(
+                documents_path, user_md5, table_name, start_date, end_date
+            )
+        if engine == 'numpy':
+            return self._count_messages_numpy(
+                documents_path, user_md5, table_name, start_date, end_date
+            )
+        raise ValueError(f'未知的统计引擎: {engine}')
+    
+    def _count_messages_python(
+        self,
+        documents_path: str,
+        user_md5: str,
+        table_name: str,
+        start_date: Optional[str],
+        end_date: Optional[str]
+    ) -> Dict[str, Counter]:
+        """流式读取消息后在 Python 中逐条计数"""
+        analyzer = StatisticsAnalyzer()
+        self._run_analyzers(
+            documents_path, user_md5, table_name, start_date, end_date, [analyzer]
+        )
+        return analyzer.result()
+    
+    def _count_messages_numpy(
+        self,
+        documents_path: str,
+        user_md5: str,
+        table_name: str,
+        start_date: Optional[str],
+        end_date: Optional[str]
+    ) -> Dict[str, Counter]:
+        """读取 CreateTime / Type 列为数组后向量化计数"""
+        columns = self.db.fetch_columns(
+            documents_path, user_md5, table_name, ('CreateTime', 'Type'), start_date, end_date
+        )
+        create_times = columns['CreateTime']
+        local_seconds = to_local_seconds(create_times[create_times > 0], get_timezone())
+        return count_messages(columns, local_seconds)
+    
+    def _run_analyzers(
+        self,
+        documents_path: str,
+        user_md5: str,
+        table_name: str,
+        start_date: Optional[str],
+        end_date: Optional[str],
+        analyzers: List[Any]
+    ) -> int:
+        """
+        分批读取消息（只读取分析器需要的列），逐条交给各分析器
+        
+        未指定日期时与 get_messages 一致，只分析最新一天
+        
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+            table_name: 表名
+            start_date: 开始日期（YYYY-MM-DD）
+            end_date: 结束日期（YYYY-MM-DD）
+            analyzers: 分析器列表（见 app.services.analyzers）
+            
+        Returns:
+            处理的消息条数
         """
-        # 获取所有消息（不限制数量）
-        messages = self.db.get_messages(
-            documents_path, user_md5, table_name,
-            limit=100000,  # 大数量限制
-            offset=0,
-            start_date=start_date,
-            end_date=end_date
+        columns = sorted({column for analyzer in analyzers for column in analyzer.columns})
+        messages = self.db.iter_messages(
+            documents_path, user_md5, table_name, start_date, end_date,
+            columns=columns,
+            latest_day_default=True
         )
         
-        if not messages:
+        start = time.perf_counter()
+        processed = 0
+        for msg in messages:
+            processed += 1
+            for analyzer in analyzers:
+                analyzer.feed(msg)
+        
+        names = ', '.join(type(analyzer).__name__ for analyzer in analyzers)
+        print(f'分析 {table_name} 完成 [{names}]: 处理 {processed} 条消息, '
+              f'耗时 {time.perf_counter() - start:.2f}s')
+        return processed
+    
+    def _build_statistics(self, counts: Dict[str, Counter]) -> Dict[str, Any]:
+        """
+        由计数结果构建统计数据（所有统计引擎共用，保证返回结构一致）
+        
+        Args:
+            counts: 计数结果 {'types': ..., 'daily': ..., 'hourly': ...}
+            
+        Returns:
+            统计数据字典
+        """
+        total_messages = sum(counts['types'].values())
+        
+        if not total_messages:
             return {
                 'totalMessages': 0,
                 'dateRange': {'start': None, 'end': None},
@@ -62,66 +195,38 @@ class WeChatAnalytics:
         
         # 消息类型统计
         type_counter = Counter()
-        # 每日消息数量
-        daily_counter = Counter()
-        # 每小时分布
-        hourly_counter = Counter(range(24))  # 初始化 0-23 小时
-        
-        # 日期范围
-        min_time = float('inf')
-        max_time = 0
-        
-        for msg in messages:
-            msg_type = msg.get('Type', 0)
-            create_time = msg.get('CreateTime', 0)
-            
-            # 类型统计
-            type_name = self._get_message_type_name(msg_type)
-            type_counter[type_name] += 1
-            
-            # 时间统计
-            if create_time:
-                min_time = min(min_time, create_time)
-                max_time = max(max_time, create_time)
-                
-                # 日期
-                dt = datetime.fromtimestamp(create_time)
-                date_str = dt.strftime('%Y-%m-%d')
-                daily_counter[date_str] += 1
-                
-                # 小时
-                hourly_counter[dt.hour] += 1
+        for msg_type, count in counts['types'].items():
+            type_counter[self._get_message_type_name(msg_type)] += count
         
         # 构建每日数据（按时间排序）
+        sorted_dates = sorted(counts['daily'].keys())
         daily_data = []
-        if daily_counter:
-            sorted_dates = sorted(daily_counter.keys())
-            for date in sorted_dates:
-                daily_data.append({
-                    'date': date,
-                    'count': daily_counter[date]
-                })
+        for date in sorted_dates:
+            daily_data.append({
+                'date': date,
+                'count': counts['daily'][date]
+            })
         
         # 构建每小时数据
         hourly_data = []
         for hour in range(24):
             hourly_data.append({
                 'hour': hour,
-                'count': hourly_counter[hour]
+                'count': counts['hourly'][hour]
             })
         
         return {
-            'totalMessages': len(messages),
+            'totalMessages': total_messages,
             'dateRange': {
-                'start': datetime.fromtimestamp(min_time).strftime('%Y-%m-%d') if min_time != float('inf') else None,
-                'end': datetime.fromtimestamp(max_time).strftime('%Y-%m-%d') if max_time > 0 else None
+                'start': sorted_dates[0] if sorted_dates else None,
+                'end': sorted_dates[-1] if sorted_dates else None
             },
             'messageTypes': dict(type_counter),
             'dailyCount': daily_data,
             'hourlyDistribution': hourly_data
         }
     
-    def get_user_activity(
+    def get_time_patterns(
         self,
         documents_path: str,
         user_md5: str,
@@ -130,73 +235,240 @@ class WeChatAnalytics:
         end_date: Optional[str] = None
     ) -> Dict[str, Any]:
         """
-        获取用户活跃度分析（主要用于群聊）
+        获取时间分布：每小时分布、星期 × 小时热力图和双方的回复间隔
+        
+        读取 CreateTime / Des 列为数组后向量化计算
         
         Args:
             documents_path: 微信数据目录路径
             user_md5: 用户 MD5
             table_name: 表名
-            start_date: 开始日期
-            end_date: 结束日期
+            start_date: 开始日期（YYYY-MM-DD）
+            end_date: 结束日期（YYYY-MM-DD）
             
         Returns:
-            活跃度数据
+            {'totalMessages', 'timezone', 'hourlyDistribution', 'weekdays', 'weekdayHeatmap', 'responseTimes'}，
+            回复间隔单位为秒（mine 为自己回复对方，theirs 为对方回复自己）
         """
-        from app.utils.crypto import md5, decode_user_name_info, get_friendly_name
-        
-        # 获取所有消息
-        messages = self.db.get_messages(
-            documents_path, user_md5, table_name,
-            limit=100000,
-            offset=0,
-            start_date=start_date,
-            end_date=end_date
+        columns = self.db.fetch_columns(
+            documents_path, user_md5, table_name, ('CreateTime', 'Des'), start_date, end_date
         )
+        valid = columns['CreateTime'] > 0
+        create_times = columns['CreateTime'][valid]
         
-        # 获取联系人信息
-        contacts_map = self.db.get_contacts(documents_path, user_md5)
+        tz = get_timezone()
+        local_seconds = to_local_seconds(create_times, tz)
+        heatmap = weekday_heatmap(local_seconds)
         
-        # 统计每个用户的发言次数
-        user_counter = Counter()
+        return {
+            'totalMessages': int(create_times.size),
+            'timezone': str(tz),
+            'hourlyDistribution': [
+                {'hour': hour, 'count': sum(row[hour] for row in heatmap)}
+                for hour in range(24)
+            ],
+            'weekdays': WEEKDAY_NAMES,
+            'weekdayHeatmap': heatmap,
+            'responseTimes': response_times(create_times, columns['Des'][valid])
+        }
+    
+    def get_report(
+        self,
+        documents_path: str,
+        user_md5: str,
+        table_name: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        top_n: int = 100,
+        statistics_engine: Optional[str] = None,
+        word_frequency_engine: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        一次获取同一聊天、同一日期范围的统计数据、活跃度和词频
         
-        for msg in messages:
-            # 只统计文本消息中的发送者
-            if msg.get('Type') == 1 and msg.get('Message'):
-                message_text = msg['Message']
-                if ':\n' in message_text:
-                    parts = message_text.split(':\n', 1)
-                    if len(parts) >= 2:
-                        sender_id = parts[0].strip()
-                        
-                        # 解析发送者昵称
-                        sender_md5 = md5(sender_id)
-                        sender_contact = contacts_map.get(sender_md5)
-                        sender_name = ''
-                        
-                        if sender_contact:
-                            sender_name = decode_user_name_info(sender_contact.db_contact_remark)
-                        
-                        if not sender_name or sender_name == sender_id:
-                            sender_name = get_friendly_name(sender_id, '', False)
-                        
-                        user_counter[sender_name] += 1
-        
-        # 按发言次数排序
-        sorted_users = user_counter.most_common(50)  # 只取前50名
-        
-        ranking = []
-        for rank, (user_name, count) in enumerate(sorted_users, 1):
-            ranking.append({
-                'rank': rank,
-                'userName': user_name,
-                'messageCount': count
-            })
+        需要逐条读取消息的分析（活跃度，以及 python 统计引擎 / stream 词频引擎）在同一次流式读取中完成；
+        统计和词频使用预聚合 / 预分词索引时直接读取索引，不再读取消息
+        
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+            table_name: 表名
+            start_date: 开始日期（YYYY-MM-DD）
+            end_date: 结束日期（YYYY-MM-DD）
+            top_n: 返回前 N 个高频词
+            statistics_engine: 统计引擎（默认 settings.statistics_engine）
+            word_frequency_engine: 词频引擎（默认 settings.word_frequency_engine）
+            
+        Returns:
+            {'statistics', 'activity', 'wordFrequency', 'processedMessages'}，
+            各项与 get_chat_statistics / get_user_activity / get_word_frequency 的返回值一致
+            
+        Raises:
+            ValueError: 未知的统计引擎或词频引擎
+        """
+        statistics_engine = statistics_engine or settings.statistics_engine
+        word_frequency_engine = word_frequency_engine or settings.word_frequency_engine
+        # 读取消息之前检查，避免读完才发现参数错误
+        if statistics_engine not in STATISTICS_ENGINES:
+            raise ValueError(f'未知的统计引擎: {statistics_engine}')
+        if word_frequency_engine not in WORD_FREQUENCY_ENGINES:
+            raise ValueError(f'未知的词频引擎: {word_frequency_engine}')
+        
+        contacts = contact_directory.get(documents_path, user_md5)
+        activity_analyzer = UserActivityAnalyzer(contacts)
+        analyzers: List[Any] = [activity_analyzer]
+        
+        statistics_analyzer = None
+        if statistics_engine == 'python':
+            statistics_analyzer = StatisticsAnalyzer()
+            analyzers.append(statistics_analyzer)
+        
+        word_analyzer = None
+        if word_frequency_engine == 'stream':
+            word_analyzer = WordFrequencyAnalyzer(self.stop_words)
+            analyzers.append(word_analyzer)
+        
+        processed = self._run_analyzers(
+            documents_path, user_md5, table_name, start_date, end_date, analyzers
+        )
+        
+        if statistics_analyzer is not None:
+            counts = statistics_analyzer.result()
+        else:
+            counts = self._count_messages(
+                documents_path, user_md5, table_name, start_date, end_date, statistics_engine
+            )
+        
+        if word_analyzer is not None:
+            word_frequency = word_analyzer.result(top_n)
+        else:
+            word_frequency = self.get_word_frequency(
+                documents_path, user_md5, table_name, top_n, start_date, end_date, word_frequency_engine
+            )
+        
+        activity = activity_analyzer.result()
+        activity['processedMessages'] = processed
         
         return {
-            'totalUsers': len(user_counter),
-            'ranking': ranking
+            'statistics': self._build_statistics(counts),
+            'activity': activity,
+            'wordFrequency': word_frequency,
+            'processedMessages': processed
         }
     
+    def get_account_overview(
+        self,
+        documents_path: str,
+        user_md5: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        top_n: int = 20
+    ) -> Dict[str, Any]:
+        """
+        获取账号总览：所有聊天的消息数、每月消息数、最常联系的人和群、消息类型分布
+        
+        四个消息数据库并行扫描一遍，结果按数据版本（消息数据库和联系人数据库的文件签名）缓存
+        
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+            start_date: 开始日期（YYYY-MM-DD，不指定时不限制）
+            end_date: 结束日期（YYYY-MM-DD，不指定时不限制）
+            top_n: 最常联系的人 / 群各返回前 N 个
+            
+        Returns:
+            {'totalMessages', 'totalChats', 'dateRange', 'messageTypes', 'monthly',
+            'topContacts', 'topGroups', 'chats'}，chats 为所有有消息的聊天（按消息数倒序）
+            
+        Raises:
+            ValueError: 日期格式错误
+        """
+        contacts = contact_directory.get(documents_path, user_md5)
+        key = (
+            str(documents_path), user_md5, get_message_db_version(documents_path, user_md5),
+            contacts.version, start_date, end_date, top_n
+        )
+        cached = self._overview_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        start = time.perf_counter()
+        table_counts = self.db.get_account_counts(documents_path, user_md5, start_date, end_date)
+        
+        type_counter: Counter = Counter()
+        monthly: Counter = Counter()
+        chats = []
+        for table_name, counts in table_counts.items():
+            total = sum(counts.values())
+            if not total:
+                continue
+            for (month, msg_type), count in counts.items():
+                type_counter[self._get_message_type_name(msg_type)] += count
+                if month:
+                    monthly[month] += count
+            
+            contact = contacts.chat_contact(table_name.split('_', 1)[-1])
+            chats.append({
+                'tableName': table_name,
+                'contact': contact.model_dump(by_alias=True),
+                'totalMessages': total,
+            })
+        
+        chats.sort(key=lambda chat: chat['totalMessages'], reverse=True)
+        months = sorted(monthly)
+        
+        overview = {
+            'totalMessages': sum(chat['totalMessages'] for chat in chats),
+            'totalChats': len(chats),
+            'dateRange': {
+                'start': months[0] if months else None,
+                'end': months[-1] if months else None
+            },
+            'messageTypes': dict(type_counter.most_common()),
+            'monthly': [{'month': month, 'count': monthly[month]} for month in months],
+            'topContacts': [chat for chat in chats if not chat['contact']['isGroup']][:top_n],
+            'topGroups': [chat for chat in chats if chat['contact']['isGroup']][:top_n],
+            'chats': chats
+        }
+        
+        print(f'账号总览统计完成: {len(table_counts)} 个聊天表, {overview["totalMessages"]} 条消息, '
+              f'耗时 {time.perf_counter() - start:.2f}s')
+        self._overview_cache.put(key, overview)
+        return overview
+    
+    def get_user_activity(
+        self,
+        documents_path: str,
+        user_md5: str,
+        table_name: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        获取用户活跃度分析（主要用于群聊）
+        
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+            table_name: 表名
+            start_date: 开始日期
+            end_date: 结束日期
+            
+        Returns:
+            活跃度数据 {'totalUsers', 'ranking', 'processedMessages'}
+        """
+        # 获取联系人信息（显示名称已预先解码）
+        contacts = contact_directory.get(documents_path, user_md5)
+        
+        analyzer = UserActivityAnalyzer(contacts)
+        processed = self._run_analyzers(
+            documents_path, user_md5, table_name, start_date, end_date, [analyzer]
+        )
+        
+        activity = analyzer.result()
+        activity['processedMessages'] = processed
+        return activity
+    
     def get_word_frequency(
         self,
         documents_path: str,
@@ -204,7 +476,8 @@ class WeChatAnalytics:
         table_name: str,
         top_n: int = 100,
         start_date: Optional[str] = None,
-        end_date: Optional[str] = None
+        end_date: Optional[str] = None,
+        engine: Optional[str] = None
     ) -> List[Dict[str, Any]]:
         """
         获取词频统计
@@ -216,62 +489,32 @@ class WeChatAnalytics:
             top_n: 返回前 N 个高频词
             start_date: 开始日期
             end_date: 结束日期
+            engine: 词频引擎（默认 settings.word_frequency_engine）
+                index - 读取预分词索引 sidecar（增量分词）
+                stream - 流式读取消息后重新分词
             
         Returns:
             词频列表 [{'word': '词', 'count': 次数}, ...]
+            
+        Raises:
+            ValueError: 未知的词频引擎
         """
-        # 获取所有文本消息
-        messages = self.db.get_messages(
-            documents_path, user_md5, table_name,
-            limit=100000,
-            offset=0,
-            start_date=start_date,
-            end_date=end_date
-        )
+        engine = engine or settings.word_frequency_engine
         
-        # 提取所有文本内容
-        all_text = []
-        for msg in messages:
-            if msg.get('Type') == 1 and msg.get('Message'):
-                text = msg['Message']
-                # 如果是群聊消息，去掉发送者部分
-                if ':\n' in text:
-                    parts = text.split(':\n', 1)
-                    if len(parts) >= 2:
-                        text = parts[1]
-                all_text.append(text)
-        
-        if not all_text:
-            return []
-        
-        # 合并所有文本
-        full_text = ' '.join(all_text)
-        
-        # 使用 jieba 分词
-        words = jieba.lcut(full_text)
-        
-        # 过滤：去除停用词、单字、数字、标点
-        filtered_words = []
-        for word in words:
-            word = word.strip()
-            if (len(word) >= 2 and 
-                word not in self.stop_words and
-                not word.isdigit() and
-                word.isalnum()):
-                filtered_words.append(word)
-        
-        # 统计词频
-        word_counter = Counter(filtered_words)
-        
-        # 返回前 N 个
-        result = []
-        for word, count in word_counter.most_common(top_n):
-            result.append({
-                'word': word,
-                'count': count
-            })
+        if engine == 'index':
+            word_counts = token_index.get_word_counts(
+                documents_path, user_md5, table_name, top_n, start_date, end_date
+            )
+            return [{'word': word, 'count': count} for word, count in word_counts]
         
-        return result
+        if engine != 'stream':
+            raise ValueError(f'未知的词频引擎: {engine}')
+        
+        analyzer = WordFrequencyAnalyzer(self.stop_words)
+        self._run_analyzers(
+            documents_path, user_md5, table_name, start_date, end_date, [analyzer]
+        )
+        return analyzer.result(top_n)
     
     def _get_message_type_name(self, msg_type: int) -> str:
         """获取消息类型名称"""
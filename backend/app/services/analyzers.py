@@ -0,0 +1,199 @@
+"""逐条消息分析器（配合 WeChatDatabase.iter_messages 流式使用，内存占用与聊天大小无关）
+
+每个分析器声明需要读取的列（columns），通过 feed 逐条接收消息，最后由 result 输出结果。
+"""
+from collections import Counter, deque
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Any, Deque, Dict, Iterable, List, Set
+
+from app.services.contact_directory import ContactDirectory
+from app.services.database import empty_counts
+from app.services.segment_pool import segment_pool
+from app.services.sender_resolver import sender_resolver, split_sender
+from app.utils.jieba_loader import get_jieba
+
+# 文本消息类型
+TEXT_MESSAGE_TYPE = 1
+
+# 一次交给 jieba 分词的文本字符数（按批分词，避免拼接整个聊天的文本）
+SEGMENT_BATCH_CHARS = 200000
+
+# 停用词列表（可以扩展）
+STOP_WORDS = frozenset([
+    '的', '了', '在', '是', '我', '有', '和', '就', '不', '人', '都', '一',
+    '一个', '上', '也', '很', '到', '说', '要', '去', '你', '会', '着', '没有',
+    '看', '好', '自己', '这', '那', '什么', '吗', '他', '她', '它', '们',
+    '啊', '哦', '呢', '吧', '哈', '嗯', '哎', '哟', '嘿', '嘛', '呀'
+])
+
+
+def filter_tokens(words: Iterable[str], stop_words: Set[str] = STOP_WORDS) -> List[str]:
+    """
+    过滤分词结果：去除停用词、单字、数字和标点
+
+    Args:
+        words: jieba 分词结果
+        stop_words: 停用词集合
+
+    Returns:
+        保留的词列表
+    """
+    tokens = []
+    for word in words:
+        word = word.strip()
+        if (len(word) >= 2 and
+                word not in stop_words and
+                not word.isdigit() and
+                word.isalnum()):
+            tokens.append(word)
+    return tokens
+
+
+def count_words(texts: Iterable[str], stop_words: Set[str] = STOP_WORDS) -> Counter:
+    """
+    对一批文本分词并统计词频
+
+    Args:
+        texts: 文本列表
+        stop_words: 停用词集合
+
+    Returns:
+        词频计数
+    """
+    return Counter(filter_tokens(get_jieba().lcut(' '.join(texts)), stop_words))
+
+
+def segment_texts(texts: List[str]) -> List[List[str]]:
+    """
+    逐条分词并过滤（默认停用词）
+
+    Args:
+        texts: 文本列表
+
+    Returns:
+        与 texts 一一对应的词列表
+    """
+    jieba = get_jieba()
+    return [filter_tokens(jieba.lcut(text)) for text in texts]
+
+
+class StatisticsAnalyzer:
+    """按消息类型、日期、小时计数"""
+
+    columns = ('CreateTime', 'Type')
+
+    def __init__(self):
+        self.counts = empty_counts()
+
+    def feed(self, msg: Dict[str, Any]):
+        create_time = msg.get('CreateTime') or 0
+        self.counts['types'][msg.get('Type') or 0] += 1
+
+        if create_time:
+            dt = datetime.fromtimestamp(create_time)
+            self.counts['daily'][dt.strftime('%Y-%m-%d')] += 1
+            self.counts['hourly'][dt.hour] += 1
+
+    def result(self) -> Dict[str, Counter]:
+        """计数结果（见 database.empty_counts）"""
+        return self.counts
+
+
+class UserActivityAnalyzer:
+    """统计群聊中每个发送者的文本消息数"""
+
+    columns = ('Type', 'Message')
+
+    def __init__(self, contacts: ContactDirectory, top_n: int = 50):
+        self.contacts = contacts
+        self.top_n = top_n
+        # 先按发送者 ID 计数，结束时再解析昵称，每个发送者只解析一次
+        self.sender_counter = Counter()
+
+    def feed(self, msg: Dict[str, Any]):
+        # 只统计文本消息中的发送者
+        if msg.get('Type') != TEXT_MESSAGE_TYPE or not msg.get('Message'):
+            return
+
+        sender_id, _ = split_sender(msg['Message'])
+        if sender_id is not None:
+            self.sender_counter[sender_id] += 1
+
+    def result(self) -> Dict[str, Any]:
+        """活跃度数据 {'totalUsers', 'ranking'}"""
+        # 不同 ID 可能解析出相同昵称，按昵称合并
+        user_counter = Counter()
+        for sender_id, count in self.sender_counter.items():
+            user_counter[sender_resolver.resolve(self.contacts, sender_id)] += count
+
+        ranking = []
+        for rank, (user_name, count) in enumerate(user_counter.most_common(self.top_n), 1):
+            ranking.append({
+                'rank': rank,
+                'userName': user_name,
+                'messageCount': count
+            })
+
+        return {
+            'totalUsers': len(user_counter),
+            'ranking': ranking
+        }
+
+
+class WordFrequencyAnalyzer:
+    """文本消息词频统计（攒够一批文本后分词，只保留词频计数）"""
+
+    columns = ('Type', 'Message')
+
+    def __init__(self, stop_words: Set[str] = STOP_WORDS):
+        self.stop_words = stop_words
+        self.word_counter = Counter()
+        self._pending: List[str] = []
+        self._pending_chars = 0
+        # 多进程分词时尚未合并的批次
+        self._futures: Deque[Future] = deque()
+
+    def feed(self, msg: Dict[str, Any]):
+        if msg.get('Type') != TEXT_MESSAGE_TYPE or not msg.get('Message'):
+            return
+
+        # 如果是群聊消息，去掉发送者部分
+        _, text = split_sender(msg['Message'])
+        self._pending.append(text)
+        self._pending_chars += len(text)
+
+        if self._pending_chars >= SEGMENT_BATCH_CHARS:
+            self._flush()
+
+    def _flush(self, final: bool = False):
+        """
+        对已攒下的文本分词
+
+        启用多进程时各批次提交到进程池并行分词，再合并各批次的 Counter；
+        只有一批文本（小聊天）时直接在当前进程分词
+        """
+        if self._pending:
+            if segment_pool.enabled and not (final and not self._futures):
+                self._futures.append(
+                    segment_pool.submit(count_words, self._pending, self.stop_words)
+                )
+                # 限制在途批次数量，保证内存占用有上限
+                while len(self._futures) > segment_pool.workers * 2:
+                    self.word_counter.update(self._futures.popleft().result())
+            else:
+                self.word_counter.update(count_words(self._pending, self.stop_words))
+            self._pending = []
+            self._pending_chars = 0
+
+        if final:
+            while self._futures:
+                self.word_counter.update(self._futures.popleft().result())
+
+    def result(self, top_n: int = 100) -> List[Dict[str, Any]]:
+        """前 N 个高频词 [{'word': '词', 'count': 次数}, ...]"""
+        self._flush(final=True)
+        return [
+            {'word': word, 'count': count}
+            for word, count in self.word_counter.most_common(top_n)
+        ]
@@ -0,0 +1,85 @@
+"""聊天列表缓存（持久化到 sidecar 文件，按数据库文件签名增量刷新）"""
+import json
+import threading
+from typing import Any, Dict, Tuple
+
+from app.utils.storage import get_account_cache_dir, write_json_atomic
+
+# sidecar 文件格式版本，结构变化时递增以丢弃旧缓存
+CACHE_FORMAT_VERSION = 1
+CHAT_LIST_FILE = 'chat_list.json'
+
+
+def empty_state() -> Dict[str, Any]:
+    """
+    空的缓存状态
+
+    结构：
+        files: {数据库索引: [mtime_ns, size]}，扫描时的文件签名
+        tables: {表名: {db, maxRowId, messageCount, lastTime, lastType, lastMessage}}
+    """
+    return {'formatVersion': CACHE_FORMAT_VERSION, 'files': {}, 'tables': {}}
+
+
+class ChatListCache:
+    """按账号缓存聊天表扫描结果（内存 + sidecar 文件）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._states: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    def load(self, documents_path: str, user_md5: str) -> Dict[str, Any]:
+        """
+        读取缓存状态，内存中没有时从 sidecar 文件加载
+
+        返回的状态视为只读，更新时请构造新状态并调用 save
+
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+
+        Returns:
+            缓存状态（不存在或格式不匹配时为空状态）
+        """
+        key = (str(documents_path), user_md5)
+        with self._lock:
+            state = self._states.get(key)
+        if state is not None:
+            return state
+
+        state = empty_state()
+        path = get_account_cache_dir(documents_path, user_md5) / CHAT_LIST_FILE
+        if path.exists():
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('formatVersion') == CACHE_FORMAT_VERSION:
+                    state = data
+            except Exception as e:
+                print(f'读取聊天列表缓存失败: {e}')
+
+        with self._lock:
+            self._states[key] = state
+        return state
+
+    def save(self, documents_path: str, user_md5: str, state: Dict[str, Any]):
+        """
+        保存缓存状态到内存和 sidecar 文件
+
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+            state: 新的缓存状态
+        """
+        with self._lock:
+            self._states[(str(documents_path), user_md5)] = state
+
+        try:
+            path = get_account_cache_dir(documents_path, user_md5) / CHAT_LIST_FILE
+            write_json_atomic(path, state)
+        except Exception as e:
+            print(f'写入聊天列表缓存失败: {e}')
+
+
+# 全局聊天列表缓存实例
+chat_list_cache = ChatListCache()
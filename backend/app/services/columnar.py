@@ -0,0 +1,189 @@
+"""列式统计：把 CreateTime / Type / Des 列一次读成 numpy 数组，用向量化运算分桶计数
+
+时间按时区整体换算为本地时间（pandas tz_convert，含夏令时），之后的日期、小时、星期
+都由整数运算得到，不再逐条创建 datetime。numpy / pandas 在函数中导入，只有列式引擎需要。
+"""
+import os
+from collections import Counter
+from datetime import datetime, tzinfo
+from itertools import chain
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Sequence, Union
+
+from app.config import settings
+
+if TYPE_CHECKING:
+    import numpy as np
+
+SECONDS_PER_DAY = 86400
+# 1970-01-01 是星期四（星期一为 0）
+EPOCH_WEEKDAY = 3
+
+WEEKDAY_NAMES = ['周一', '周二', '周三', '周四', '周五', '周六', '周日']
+
+# 回复间隔分段：上限秒数（不含）→ 标签，最后一段没有上限
+RESPONSE_BUCKET_EDGES = [60, 300, 1800, 3600, 21600]
+RESPONSE_BUCKET_LABELS = ['1 分钟内', '1-5 分钟', '5-30 分钟', '30-60 分钟', '1-6 小时', '6 小时以上']
+
+# 消息方向：Des 为 0 时是自己发送的消息（与渲染器一致）
+DES_SENT = 0
+
+
+def get_timezone() -> Union[str, tzinfo]:
+    """
+    统计使用的时区
+
+    依次使用 settings.analytics_timezone、TZ 环境变量、/etc/localtime 指向的时区，
+    都没有时使用当前的本地 UTC 偏移（不含夏令时规则）
+
+    Returns:
+        IANA 时区名或 tzinfo
+    """
+    if settings.analytics_timezone:
+        return settings.analytics_timezone
+    if os.environ.get('TZ'):
+        return os.environ['TZ'].lstrip(':')
+
+    try:
+        target = str(Path('/etc/localtime').resolve())
+        if 'zoneinfo/' in target:
+            return target.split('zoneinfo/', 1)[1]
+    except OSError:
+        pass
+    return datetime.now().astimezone().tzinfo
+
+
+def read_columns(cursor, columns: Sequence[str], chunk_size: int) -> Dict[str, 'np.ndarray']:
+    """
+    把查询结果读成每列一个 int64 数组（fetchmany 分批，每批用 numpy.fromiter 展开）
+
+    Args:
+        cursor: 已执行查询的游标（各列均为整数，NULL 需在 SQL 中替换为 0）
+        columns: 列名（与 SELECT 的列顺序一致）
+        chunk_size: 每批读取的行数
+
+    Returns:
+        {列名: 数组}
+    """
+    import numpy as np
+
+    width = len(columns)
+    chunks = []
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        chunks.append(np.fromiter(chain.from_iterable(rows), dtype=np.int64, count=len(rows) * width))
+
+    data = np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int64)
+    data = data.reshape(-1, width)
+    return {column: data[:, i] for i, column in enumerate(columns)}
+
+
+def to_local_seconds(create_times: 'np.ndarray', tz: Union[str, tzinfo]) -> 'np.ndarray':
+    """
+    Unix 时间戳 → 本地时间的“墙上时间”秒数（本地日期和时刻可直接整除得到）
+
+    Args:
+        create_times: Unix 时间戳数组
+        tz: 时区
+
+    Returns:
+        本地秒数数组
+    """
+    import pandas as pd  # 延迟导入，只有列式引擎需要
+
+    utc = pd.to_datetime(create_times, unit='s', utc=True)
+    return utc.tz_convert(tz).tz_localize(None).asi8 // 10 ** 9
+
+
+def count_messages(columns: Dict[str, 'np.ndarray'], local_seconds: 'np.ndarray') -> Dict[str, Counter]:
+    """
+    按消息类型、日期、小时计数（结果结构与 database.empty_counts 一致）
+
+    Args:
+        columns: read_columns 的结果（需要 CreateTime、Type）
+        local_seconds: 有效时间（CreateTime > 0）消息的本地秒数
+
+    Returns:
+        {'types': Counter, 'daily': Counter, 'hourly': Counter}
+    """
+    import numpy as np
+
+    types, type_counts = np.unique(columns['Type'], return_counts=True)
+
+    days, day_counts = np.unique(local_seconds // SECONDS_PER_DAY, return_counts=True)
+    day_strings = np.datetime_as_string(days.astype('datetime64[D]'))
+
+    hours = np.bincount(local_seconds % SECONDS_PER_DAY // 3600, minlength=24)
+
+    return {
+        'types': Counter(dict(zip(types.tolist(), type_counts.tolist()))),
+        'daily': Counter(dict(zip(day_strings.tolist(), day_counts.tolist()))),
+        'hourly': Counter({hour: count for hour, count in enumerate(hours.tolist()) if count}),
+    }
+
+
+def weekday_heatmap(local_seconds: 'np.ndarray') -> List[List[int]]:
+    """
+    星期 × 小时的消息数
+
+    Args:
+        local_seconds: 本地秒数
+
+    Returns:
+        7 × 24 矩阵，行依次为周一到周日
+    """
+    import numpy as np
+
+    days = local_seconds // SECONDS_PER_DAY
+    weekdays = (days + EPOCH_WEEKDAY) % 7
+    hours = local_seconds % SECONDS_PER_DAY // 3600
+    cells = np.bincount(weekdays * 24 + hours, minlength=7 * 24)
+    return cells.reshape(7, 24).tolist()
+
+
+def _describe_gaps(gaps: 'np.ndarray') -> Dict[str, Any]:
+    """回复间隔的统计量（秒）和分段计数"""
+    import numpy as np
+
+    buckets = np.bincount(
+        np.searchsorted(RESPONSE_BUCKET_EDGES, gaps, side='right'),
+        minlength=len(RESPONSE_BUCKET_LABELS)
+    )
+    result: Dict[str, Any] = {
+        'count': int(gaps.size),
+        'buckets': [
+            {'label': label, 'count': count}
+            for label, count in zip(RESPONSE_BUCKET_LABELS, buckets.tolist())
+        ],
+    }
+    if gaps.size:
+        median, p90 = np.percentile(gaps, [50, 90])
+        result.update({'median': float(median), 'p90': float(p90), 'mean': round(float(gaps.mean()), 1)})
+    else:
+        result.update({'median': None, 'p90': None, 'mean': None})
+    return result
+
+
+def response_times(create_times: 'np.ndarray', des: 'np.ndarray') -> Dict[str, Any]:
+    """
+    回复间隔：消息方向切换时与上一条消息的时间差
+
+    Args:
+        create_times: 按时间正序的 Unix 时间戳
+        des: 对应的消息方向（0 为自己发送）
+
+    Returns:
+        {'mine': 自己回复对方的间隔, 'theirs': 对方回复自己的间隔}，各含 count / median / p90 / mean / buckets
+    """
+    import numpy as np
+
+    sent = des == DES_SENT
+    switched = sent[1:] != sent[:-1]
+    gaps = np.diff(create_times)
+
+    return {
+        'mine': _describe_gaps(gaps[switched & sent[1:]]),
+        'theirs': _describe_gaps(gaps[switched & ~sent[1:]]),
+    }
@@ -0,0 +1,145 @@
+"""联系人目录缓存（按账号，显示名称预先解码，WCDB_Contact.sqlite 变化后自动失效）"""
+import threading
+from typing import Dict, Hashable, Optional, Tuple
+
+from app.models import ChatContact, Contact
+from app.services.db_pool import (
+    CONTACT_DB_NAME, FileSignature, connection_pool, get_db_path, get_file_signature
+)
+from app.utils.crypto import md5, decode_contact_remark, get_friendly_name
+
+
+class ContactDirectory:
+    """一个账号的联系人目录，可按 MD5 或微信号查找"""
+
+    def __init__(self, contacts: Dict[str, Contact], version: Optional[Hashable] = None):
+        # 目录版本（账号 + 文件签名），用作发送者名称缓存键的一部分，None 表示不可缓存
+        self.version = version
+        # {md5(userName): Contact}
+        self.by_md5 = contacts
+        # {userName: Contact}
+        self.by_user_name = {contact.user_name: contact for contact in contacts.values()}
+
+    def __len__(self) -> int:
+        return len(self.by_md5)
+
+    def get(self, name_md5: str) -> Optional[Contact]:
+        """按微信号的 MD5 查找联系人"""
+        return self.by_md5.get(name_md5)
+
+    def get_by_user_name(self, user_name: str) -> Optional[Contact]:
+        """按微信号查找联系人"""
+        return self.by_user_name.get(user_name)
+
+    def chat_contact(self, chatter_md5: str) -> ChatContact:
+        """
+        获取聊天对象信息（聊天表名中的 MD5 → 微信号、昵称、是否群聊）
+
+        Args:
+            chatter_md5: 聊天对象微信号的 MD5
+
+        Returns:
+            聊天对象信息，没有昵称或昵称就是 wxid 时使用友好名称
+        """
+        contact = self.by_md5.get(chatter_md5)
+        wechat_id = contact.user_name if contact else '未知'
+        is_group = '@chatroom' in wechat_id
+
+        # 昵称在加载联系人目录时已解码
+        nickname = contact.display_name if contact else ''
+        if not nickname or nickname == wechat_id or nickname.startswith('wxid_'):
+            nickname = get_friendly_name(wechat_id, nickname, is_group)
+
+        return ChatContact(md5=chatter_md5, wechatId=wechat_id, nickname=nickname, isGroup=is_group)
+
+    def sender_name(self, sender_id: str) -> str:
+        """
+        解析群聊发送者的显示名称
+
+        Args:
+            sender_id: 发送者微信号（群聊消息 "wxid:\\n内容" 中的前缀）
+
+        Returns:
+            显示名称，联系人不存在或没有名称时使用友好名称
+        """
+        contact = self.by_user_name.get(sender_id)
+        sender_name = contact.display_name if contact else ''
+
+        if not sender_name or sender_name == sender_id:
+            sender_name = get_friendly_name(sender_id, '', False)
+        return sender_name
+
+
+class ContactDirectoryCache:
+    """联系人目录缓存（每个账号一份，按 WCDB_Contact.sqlite 的文件签名失效）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # {(documents_path, user_md5): (文件签名, 联系人目录)}
+        self._entries: Dict[Tuple[str, str], Tuple[FileSignature, ContactDirectory]] = {}
+
+    def get(self, documents_path: str, user_md5: str) -> ContactDirectory:
+        """
+        获取联系人目录，联系人数据库变化后重新读取
+
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+
+        Returns:
+            联系人目录（数据库不可用时为空目录，且不缓存）
+        """
+        key = (str(documents_path), user_md5)
+        signature = get_file_signature(get_db_path(documents_path, user_md5, CONTACT_DB_NAME))
+
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+
+        contacts = self._load(documents_path, user_md5)
+        if signature is None or contacts is None:
+            return ContactDirectory(contacts or {})
+
+        directory = ContactDirectory(contacts, (key, signature))
+        with self._lock:
+            self._entries[key] = (signature, directory)
+        return directory
+
+    def _load(self, documents_path: str, user_md5: str) -> Optional[Dict[str, Contact]]:
+        """读取 Friend 表并解码显示名称，读取失败返回 None"""
+        with connection_pool.connection(documents_path, user_md5, CONTACT_DB_NAME) as conn:
+            if not conn:
+                print(f'WCDB_Contact.sqlite 不可用: {get_db_path(documents_path, user_md5, CONTACT_DB_NAME)}')
+                return None
+
+            try:
+                # 直接读取原始字节，不在 SQL 中转换为 hex 字符串
+                rows = conn.execute('SELECT userName, dbContactRemark FROM Friend').fetchall()
+            except Exception as e:
+                print(f'读取联系人失败: {e}')
+                return None
+
+        contacts: Dict[str, Contact] = {}
+        for row in rows:
+            user_name = row['userName']
+            if not user_name:
+                continue
+            remark = row['dbContactRemark']
+            contacts[md5(user_name)] = Contact(
+                userName=user_name,
+                dbContactRemark=remark.hex() if isinstance(remark, bytes) else '',
+                displayName=decode_contact_remark(remark)
+            )
+
+        print(f'从 WCDB_Contact.sqlite 读取到 {len(contacts)} 个联系人')
+        return contacts
+
+    def invalidate(self, documents_path: str, user_md5: str):
+        """清除某个账号的联系人目录"""
+        with self._lock:
+            self._entries.pop((str(documents_path), user_md5), None)
+
+
+# 全局联系人目录缓存实例
+contact_directory = ContactDirectoryCache()
@@ -1,10 +1,35 @@
 """微信数据库操作服务"""
+import base64
 import sqlite3
-from pathlib import Path
-from typing import Dict, List, Optional, Any
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import TYPE_CHECKING, ContextManager, Dict, Iterator, List, Optional, Any, Sequence, Tuple
 
-from app.models import Contact, ChatTable, ChatContact, Message
-from app.utils.crypto import md5, decode_user_name_info, get_friendly_name
+from app.config import settings
+from app.models import Contact, ChatTable, Message
+from app.services.chat_list_cache import chat_list_cache, empty_state
+from app.services.columnar import read_columns
+from app.services.contact_directory import ContactDirectory, contact_directory
+from app.services.db_pool import CONTACT_DB_NAME, connection_pool, connect_readonly, get_db_path
+from app.services.sender_resolver import sender_resolver
+from app.services.table_index import (
+    CHAT_TABLES_SQL, MESSAGE_DB_COUNT, get_message_db_version, table_locator
+)
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# 按本地日期 / 小时 / 月份分桶的 SQL 表达式（CreateTime 为空时分别为 ''、-1 和 ''）
+DAY_BUCKET_SQL = "CASE WHEN CreateTime > 0 THEN date(CreateTime, 'unixepoch', 'localtime') ELSE '' END"
+HOUR_BUCKET_SQL = (
+    "CASE WHEN CreateTime > 0 "
+    "THEN CAST(strftime('%H', CreateTime, 'unixepoch', 'localtime') AS INTEGER) ELSE -1 END"
+)
+MONTH_BUCKET_SQL = "CASE WHEN CreateTime > 0 THEN strftime('%Y-%m', CreateTime, 'unixepoch', 'localtime') ELSE '' END"
+
+# 缓存的最后一条文本消息长度（预览只显示 40 个字符，保留余量给群聊发送者前缀）
+PREVIEW_SOURCE_LENGTH = 200
 
 
 def decode_message(data: Any) -> str:
@@ -35,12 +60,85 @@ def decode_message(data: Any) -> str:
         return ''
 
 
+def encode_cursor(create_time: int, mes_local_id: int) -> str:
+    """
+    生成分页游标（对调用方不透明）
+    
+    Args:
+        create_time: 本页最后一条消息的 CreateTime
+        mes_local_id: 本页最后一条消息的 MesLocalID
+        
+    Returns:
+        URL 安全的游标字符串
+    """
+    raw = f'{create_time},{mes_local_id}'.encode('ascii')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[int, int]:
+    """
+    解析分页游标
+    
+    Args:
+        cursor: encode_cursor 生成的游标
+        
+    Returns:
+        (CreateTime, MesLocalID)
+        
+    Raises:
+        ValueError: 游标格式无效
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        create_time, mes_local_id = base64.urlsafe_b64decode(padded).decode('ascii').split(',')
+        return int(create_time), int(mes_local_id)
+    except Exception:
+        raise ValueError(f'无效的分页游标: {cursor}')
+
+
+def parse_date_range(
+    start_date: Optional[str],
+    end_date: Optional[str]
+) -> Tuple[Optional[int], Optional[int]]:
+    """
+    将日期范围转换为时间戳（开始日期的 0 点到结束日期的 23:59:59）
+    
+    Args:
+        start_date: 开始日期（YYYY-MM-DD）
+        end_date: 结束日期（YYYY-MM-DD）
+        
+    Returns:
+        (开始时间戳, 结束时间戳)，未指定的一端为 None
+        
+    Raises:
+        ValueError: 日期格式无效
+    """
+    try:
+        start_timestamp = int(datetime.fromisoformat(start_date).timestamp()) if start_date else None
+        end_timestamp = int(datetime.fromisoformat(end_date + ' 23:59:59').timestamp()) if end_date else None
+    except ValueError:
+        raise ValueError(f'无效的日期: {start_date or ""} ~ {end_date or ""}（格式应为 YYYY-MM-DD）')
+    return start_timestamp, end_timestamp
+
+
+def empty_counts() -> Dict[str, Counter]:
+    """
+    空的消息计数结果
+    
+    结构：
+        types: {消息类型: 数量}
+        daily: {YYYY-MM-DD: 数量}（不含没有时间的消息）
+        hourly: {小时: 数量}（不含没有时间的消息）
+    """
+    return {'types': Counter(), 'daily': Counter(), 'hourly': Counter()}
+
+
 class WeChatDatabase:
     """微信数据库操作"""
     
     def open_contact_db(self, documents_path: str, user_md5: str) -> Optional[sqlite3.Connection]:
         """
-        打开联系人数据库
+        打开联系人数据库（独立的只读连接，由调用方负责关闭）
         
         Args:
             documents_path: 微信数据目录路径
@@ -49,23 +147,21 @@ class WeChatDatabase:
         Returns:
             数据库连接对象，失败返回 None
         """
-        db_path = Path(documents_path) / user_md5 / 'DB' / 'WCDB_Contact.sqlite'
+        db_path = get_db_path(documents_path, user_md5, CONTACT_DB_NAME)
         
         if not db_path.exists():
             print(f'WCDB_Contact.sqlite 不存在: {db_path}')
             return None
         
         try:
-            conn = sqlite3.connect(str(db_path))
-            conn.row_factory = sqlite3.Row  # 使用 Row 对象
-            return conn
+            return connect_readonly(db_path, connection_pool.immutable)
         except Exception as e:
             print(f'打开联系人数据库失败: {e}')
             return None
     
     def open_message_db(self, documents_path: str, user_md5: str, db_index: int) -> Optional[sqlite3.Connection]:
         """
-        打开消息数据库
+        打开消息数据库（独立的只读连接，由调用方负责关闭）
         
         Args:
             documents_path: 微信数据目录路径
@@ -75,58 +171,67 @@ class WeChatDatabase:
         Returns:
             数据库连接对象，失败返回 None
         """
-        db_path = Path(documents_path) / user_md5 / 'DB' / f'message_{db_index}.sqlite'
+        db_path = get_db_path(documents_path, user_md5, f'message_{db_index}.sqlite')
         
         if not db_path.exists():
             return None
         
         try:
-            conn = sqlite3.connect(str(db_path))
-            conn.row_factory = sqlite3.Row
-            return conn
+            return connect_readonly(db_path, connection_pool.immutable)
         except Exception as e:
             print(f'打开 message_{db_index}.sqlite 失败: {e}')
             return None
     
-    def get_contacts(self, documents_path: str, user_md5: str) -> Dict[str, Contact]:
+    def contact_db(self, documents_path: str, user_md5: str) -> ContextManager[Optional[sqlite3.Connection]]:
         """
-        获取联系人列表
+        从连接池借出联系人数据库连接
+        
+        用法：
+            with db.contact_db(path, user_md5) as conn:
+                ...
         
         Args:
             documents_path: 微信数据目录路径
             user_md5: 用户 MD5
             
         Returns:
-            联系人字典 {md5: Contact}
+            上下文管理器，产出连接对象，数据库不存在时产出 None
         """
-        contacts_map: Dict[str, Contact] = {}
-        conn = self.open_contact_db(documents_path, user_md5)
-        
-        if not conn:
-            return contacts_map
+        return connection_pool.connection(documents_path, user_md5, CONTACT_DB_NAME)
+    
+    def message_db(
+        self,
+        documents_path: str,
+        user_md5: str,
+        db_index: int
+    ) -> ContextManager[Optional[sqlite3.Connection]]:
+        """
+        从连接池借出消息数据库连接
         
-        try:
-            cursor = conn.cursor()
-            cursor.execute('SELECT *, lower(quote(dbContactRemark)) as cr FROM Friend')
-            rows = cursor.fetchall()
-            
-            for row in rows:
-                user_name = row['userName']
-                cr = row['cr']
-                name_md5 = md5(user_name)
-                
-                contacts_map[name_md5] = Contact(
-                    userName=user_name,
-                    dbContactRemark=cr
-                )
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+            db_index: 数据库索引（1-4）
             
-            print(f'从 WCDB_Contact.sqlite 读取到 {len(contacts_map)} 个联系人')
-        except Exception as e:
-            print(f'读取联系人失败: {e}')
-        finally:
-            conn.close()
+        Returns:
+            上下文管理器，产出连接对象，数据库不存在时产出 None
+        """
+        return connection_pool.connection(documents_path, user_md5, f'message_{db_index}.sqlite')
+    
+    def get_contacts(self, documents_path: str, user_md5: str) -> Dict[str, Contact]:
+        """
+        获取联系人列表
         
-        return contacts_map
+        结果来自按账号缓存的联系人目录，WCDB_Contact.sqlite 未变化时不会重新读取
+        
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+            
+        Returns:
+            联系人字典 {md5: Contact}（Contact.display_name 已解码）
+        """
+        return contact_directory.get(documents_path, user_md5).by_md5
     
     def get_chat_tables(
         self,
@@ -137,6 +242,9 @@ class WeChatDatabase:
         """
         获取聊天表列表
         
+        扫描结果缓存在 sidecar 文件中：数据库文件未变化时直接复用缓存，
+        文件变化时只重新统计 MAX(rowid) 或消息数量发生变化的表
+        
         Args:
             documents_path: 微信数据目录路径
             user_md5: 用户 MD5
@@ -145,138 +253,284 @@ class WeChatDatabase:
         Returns:
             聊天表列表
         """
+        contacts = contact_directory.get(documents_path, user_md5)
+        
+        version = get_message_db_version(documents_path, user_md5)
+        state = chat_list_cache.load(documents_path, user_md5)
+        new_state = empty_state()
+        
+        cached_by_db: Dict[int, Dict[str, Dict[str, Any]]] = {
+            i: {} for i in range(1, MESSAGE_DB_COUNT + 1)
+        }
+        for name, entry in state['tables'].items():
+            cached_by_db.setdefault(entry['db'], {})[name] = entry
+        
+        # 只有文件签名变化的数据库需要重新扫描，各数据库互不依赖，可以并行扫描
+        pending = [
+            i for i in range(1, MESSAGE_DB_COUNT + 1)
+            if version[i - 1] is not None and state['files'].get(str(i)) != list(version[i - 1])
+        ]
+        scanned = self._scan_message_dbs(documents_path, user_md5, pending, cached_by_db)
+        
+        # 按 message_1.sqlite 到 message_4.sqlite 的顺序合并结果
+        for i in range(1, MESSAGE_DB_COUNT + 1):
+            signature = version[i - 1]
+            if signature is None:
+                continue
+            
+            cached_tables = cached_by_db[i]
+            
+            if i not in scanned:
+                # 文件未变化，直接复用缓存
+                tables = cached_tables
+            else:
+                tables = scanned[i]
+                if tables is None:
+                    # 扫描失败时不记录文件签名，下次重新扫描
+                    tables = cached_tables
+                    signature = None
+            
+            if signature is not None:
+                new_state['files'][str(i)] = list(signature)
+            for name, entry in tables.items():
+                new_state['tables'].setdefault(name, entry)
+        
+        if new_state != state:
+            chat_list_cache.save(documents_path, user_md5, new_state)
+        
+        # 顺便记录每个表所在的数据库，供后续消息查询直接定位
+        table_locator.update(documents_path, user_md5, version, {
+            name: entry['db'] for name, entry in new_state['tables'].items()
+        })
+        
         chat_tables: List[ChatTable] = []
-        contacts_map = self.get_contacts(documents_path, user_md5)
+        for table_name, entry in new_state['tables'].items():
+            # 如果消息数量太少，跳过
+            if message_limit > 0 and entry['messageCount'] <= message_limit:
+                continue
+            chat_tables.append(self._build_chat_table(table_name, entry, contacts))
+        
+        # 按最后消息时间倒序排列（最近的聊天在最前面）
+        chat_tables.sort(key=lambda x: x.last_message_time or 0, reverse=True)
         
-        # 遍历 message_1.sqlite 到 message_4.sqlite
-        for i in range(1, 5):
-            conn = self.open_message_db(documents_path, user_md5, i)
+        print(f'找到 {len(chat_tables)} 个聊天表（已按最后消息时间倒序排列）')
+        return chat_tables
+    
+    def _scan_message_dbs(
+        self,
+        documents_path: str,
+        user_md5: str,
+        db_indexes: List[int],
+        cached_by_db: Dict[int, Dict[str, Dict[str, Any]]]
+    ) -> Dict[int, Optional[Dict[str, Dict[str, Any]]]]:
+        """
+        扫描多个消息数据库（线程池并行，每个线程从连接池借用各自的连接）
+        
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+            db_indexes: 需要扫描的数据库索引
+            cached_by_db: 各数据库上次扫描的缓存 {数据库索引: {表名: 扫描结果}}
+            
+        Returns:
+            {数据库索引: 扫描结果}，扫描失败的数据库对应 None
+        """
+        workers = min(settings.chat_scan_workers, len(db_indexes))
+        
+        if workers <= 1:
+            return {
+                i: self._scan_message_db(documents_path, user_md5, i, cached_by_db[i])
+                for i in db_indexes
+            }
+        
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='chat-scan') as executor:
+            futures = {
+                i: executor.submit(self._scan_message_db, documents_path, user_md5, i, cached_by_db[i])
+                for i in db_indexes
+            }
+            return {i: future.result() for i, future in futures.items()}
+    
+    def _scan_message_db(
+        self,
+        documents_path: str,
+        user_md5: str,
+        db_index: int,
+        cached_tables: Dict[str, Dict[str, Any]]
+    ) -> Optional[Dict[str, Dict[str, Any]]]:
+        """
+        增量扫描一个消息数据库中的聊天表
+        
+        MAX(rowid) 和消息数量都未变化的表直接复用缓存（MesLocalID 是自增主键，新消息必然改变 MAX(rowid)，
+        删除消息会改变消息数量），其余表重新统计最后一条消息
+        
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+            db_index: 数据库索引（1-4）
+            cached_tables: 该数据库上次扫描的缓存 {表名: 扫描结果}
+            
+        Returns:
+            {表名: 扫描结果}，数据库无法打开或扫描失败返回 None
+        """
+        with self.message_db(documents_path, user_md5, db_index) as conn:
             if not conn:
-                continue
+                return None
             
             try:
                 cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT * FROM SQLITE_MASTER 
-                    WHERE type = 'table' 
-                    AND (name LIKE 'Chat/_%' ESCAPE '/' OR name LIKE 'ChatExt2/_%' ESCAPE '/')
-                """)
-                tables = cursor.fetchall()
+                cursor.execute(CHAT_TABLES_SQL)
+                table_names = [row['name'] for row in cursor.fetchall()]
                 
-                for table in tables:
-                    table_name = table['name']
-                    
-                    # 获取消息数量
-                    cursor.execute(f'SELECT COUNT(*) as count FROM "{table_name}"')
-                    message_count = cursor.fetchone()['count']
-                    
-                    # 如果消息数量太少，跳过
-                    if message_limit > 0 and message_count <= message_limit:
-                        continue
-                    
-                    # 从表名提取聊天对象的 MD5
-                    chatter_md5 = self._extract_chatter_md5(table_name)
-                    contact = contacts_map.get(chatter_md5)
-                    
-                    # 获取基本信息
-                    wechat_id = contact.user_name if contact else '未知'
-                    is_group = '@chatroom' in wechat_id
-                    
-                    # 获取最后一条消息（用于排序和预览）
-                    last_message_time = 0
-                    last_message_preview = ''
-                    
+                tables: Dict[str, Dict[str, Any]] = {}
+                refreshed = 0
+                
+                for table_name in table_names:
                     try:
-                        cursor.execute(f"""
-                            SELECT CreateTime, Message, Type 
-                            FROM "{table_name}" 
-                            ORDER BY CreateTime DESC 
-                            LIMIT 1
-                        """)
-                        last_msg = cursor.fetchone()
-                        
-                        if last_msg:
-                            last_message_time = last_msg['CreateTime'] or 0
-                            msg_type = last_msg['Type'] or 0
-                            msg_content = decode_message(last_msg['Message'])
-                            
-                            # 生成消息预览
-                            if msg_type == 1:
-                                # 文本消息
-                                preview = msg_content
-                                
-                                # 如果是群聊，解析发送者昵称
-                                if is_group and ':\n' in msg_content:
-                                    parts = msg_content.split(':\n', 1)
-                                    if len(parts) >= 2:
-                                        sender_id = parts[0].strip()
-                                        content = parts[1]
-                                        
-                                        # 查找发送者的昵称
-                                        sender_md5 = md5(sender_id)
-                                        sender = contacts_map.get(sender_md5)
-                                        sender_name = ''
-                                        
-                                        if sender:
-                                            sender_name = decode_user_name_info(sender.db_contact_remark)
-                                        
-                                        # 如果没找到昵称，使用友好名称
-                                        if not sender_name or sender_name == sender_id:
-                                            sender_name = get_friendly_name(sender_id, '', False)
-                                        
-                                        preview = f'{sender_name}: {content}'
-                                
-                                # 限制长度
-                                if len(preview) > 40:
-                                    preview = preview[:40] + '...'
-                                
-                                last_message_preview = preview
-                            elif msg_type == 3:
-                                last_message_preview = '[图片]'
-                            elif msg_type == 34:
-                                last_message_preview = '[语音]'
-                            elif msg_type == 43:
-                                last_message_preview = '[视频]'
-                            elif msg_type == 47:
-                                last_message_preview = '[表情]'
-                            elif msg_type == 49:
-                                last_message_preview = '[链接]'
-                            else:
-                                last_message_preview = '[消息]'
+                        cursor.execute(
+                            f'SELECT MAX(rowid) as maxRowId, COUNT(*) as count FROM "{table_name}"'
+                        )
+                        row = cursor.fetchone()
+                        max_row_id, message_count = row['maxRowId'] or 0, row['count']
                     except Exception:
-                        pass  # 忽略获取最后消息失败的情况
+                        max_row_id = message_count = None  # 无法判断是否变化，总是重新统计
                     
-                    # 尝试解析昵称
-                    nickname = ''
-                    if contact:
-                        nickname = decode_user_name_info(contact.db_contact_remark)
-                    
-                    # 如果没有昵称或昵称就是 wxid，使用友好名称
-                    if not nickname or nickname == wechat_id or nickname.startswith('wxid_'):
-                        nickname = get_friendly_name(wechat_id, nickname, is_group)
+                    cached = cached_tables.get(table_name)
+                    if (cached and max_row_id is not None
+                            and cached['maxRowId'] == max_row_id
+                            and cached['messageCount'] == message_count):
+                        tables[table_name] = cached
+                        continue
                     
-                    chat_tables.append(ChatTable(
-                        tableName=table_name,
-                        messageCount=message_count,
-                        contact=ChatContact(
-                            md5=chatter_md5,
-                            wechatId=wechat_id,
-                            nickname=nickname,
-                            isGroup=is_group
-                        ),
-                        lastMessageTime=last_message_time,
-                        lastMessagePreview=last_message_preview
-                    ))
+                    tables[table_name] = self._scan_chat_table(
+                        cursor, table_name, db_index, max_row_id, message_count
+                    )
+                    refreshed += 1
+                
+                print(f'扫描 message_{db_index}.sqlite：{len(table_names)} 个聊天表，重新统计 {refreshed} 个')
+                return tables
             except Exception as e:
-                print(f'扫描 message_{i}.sqlite 失败: {e}')
-            finally:
-                conn.close()
+                print(f'扫描 message_{db_index}.sqlite 失败: {e}')
+                return None
+    
+    def _scan_chat_table(
+        self,
+        cursor: sqlite3.Cursor,
+        table_name: str,
+        db_index: int,
+        max_row_id: Optional[int],
+        message_count: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        统计单个聊天表的消息数量和最后一条消息
         
-        # 按最后消息时间倒序排列（最近的聊天在最前面）
-        chat_tables.sort(key=lambda x: x.last_message_time or 0, reverse=True)
+        Args:
+            cursor: 数据库游标
+            table_name: 表名
+            db_index: 数据库索引（1-4）
+            max_row_id: 当前 MAX(rowid)
+            message_count: 已统计的消息数量（None 时重新统计）
+            
+        Returns:
+            扫描结果 {db, maxRowId, messageCount, lastTime, lastType, lastMessage}
+        """
+        # 获取消息数量
+        if message_count is None:
+            cursor.execute(f'SELECT COUNT(*) as count FROM "{table_name}"')
+            message_count = cursor.fetchone()['count']
+        entry: Dict[str, Any] = {
+            'db': db_index,
+            'maxRowId': max_row_id,
+            'messageCount': message_count,
+            'lastTime': 0,
+            'lastType': None,
+            'lastMessage': '',
+        }
         
-        print(f'找到 {len(chat_tables)} 个聊天表（已按最后消息时间倒序排列）')
-        return chat_tables
+        # 获取最后一条消息（用于排序和预览）
+        try:
+            cursor.execute(f"""
+                SELECT CreateTime, Message, Type 
+                FROM "{table_name}" 
+                ORDER BY CreateTime DESC 
+                LIMIT 1
+            """)
+            last_msg = cursor.fetchone()
+            
+            if last_msg:
+                entry['lastTime'] = last_msg['CreateTime'] or 0
+                entry['lastType'] = last_msg['Type'] or 0
+                if entry['lastType'] == 1:
+                    # 只有文本消息需要内容，截断后足够生成预览
+                    entry['lastMessage'] = decode_message(last_msg['Message'])[:PREVIEW_SOURCE_LENGTH]
+        except Exception:
+            pass  # 忽略获取最后消息失败的情况
+        
+        return entry
+    
+    def _build_chat_table(
+        self,
+        table_name: str,
+        entry: Dict[str, Any],
+        contacts: ContactDirectory
+    ) -> ChatTable:
+        """
+        根据扫描结果和联系人信息构建聊天表信息
+        
+        Args:
+            table_name: 表名
+            entry: 扫描结果
+            contacts: 联系人目录
+            
+        Returns:
+            聊天表信息
+        """
+        # 从表名提取聊天对象的 MD5
+        chatter_md5 = self._extract_chatter_md5(table_name)
+        
+        # 获取基本信息（微信号、昵称、是否群聊）
+        chat_contact = contacts.chat_contact(chatter_md5)
+        is_group = chat_contact.is_group
+        
+        # 生成消息预览
+        last_message_preview = ''
+        msg_type = entry['lastType']
+        
+        if msg_type == 1:
+            # 文本消息
+            msg_content = entry['lastMessage']
+            preview = msg_content
+            
+            # 如果是群聊，解析发送者昵称
+            if is_group:
+                sender_name, content = sender_resolver.parse(contacts, msg_content)
+                if sender_name is not None:
+                    preview = f'{sender_name}: {content}'
+            
+            # 限制长度
+            if len(preview) > 40:
+                preview = preview[:40] + '...'
+            
+            last_message_preview = preview
+        elif msg_type == 3:
+            last_message_preview = '[图片]'
+        elif msg_type == 34:
+            last_message_preview = '[语音]'
+        elif msg_type == 43:
+            last_message_preview = '[视频]'
+        elif msg_type == 47:
+            last_message_preview = '[表情]'
+        elif msg_type == 49:
+            last_message_preview = '[链接]'
+        elif msg_type is not None:
+            last_message_preview = '[消息]'
+        
+        return ChatTable(
+            tableName=table_name,
+            messageCount=entry['messageCount'],
+            contact=chat_contact,
+            lastMessageTime=entry['lastTime'],
+            lastMessagePreview=last_message_preview
+        )
     
     def get_messages(
         self,
@@ -286,7 +540,8 @@ class WeChatDatabase:
         limit: int = 100,
         offset: int = 0,
         start_date: Optional[str] = None,
-        end_date: Optional[str] = None
+        end_date: Optional[str] = None,
+        before: Optional[str] = None
     ) -> List[Dict[str, Any]]:
         """
         获取消息列表
@@ -296,74 +551,88 @@ class WeChatDatabase:
             user_md5: 用户 MD5
             table_name: 表名
             limit: 限制数量
-            offset: 偏移量
+            offset: 偏移量（指定 before 时忽略）
             start_date: 开始日期（YYYY-MM-DD）
             end_date: 结束日期（YYYY-MM-DD）
+            before: 分页游标（上一页返回的 nextCursor）
             
         Returns:
             消息列表
         """
+        messages, _ = self.get_message_page(
+            documents_path, user_md5, table_name, limit, offset, start_date, end_date, before
+        )
+        return messages
+    
+    def get_message_page(
+        self,
+        documents_path: str,
+        user_md5: str,
+        table_name: str,
+        limit: int = 100,
+        offset: int = 0,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        before: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        获取一页消息（按时间倒序）及下一页游标
+        
+        指定 before 时使用游标分页：WHERE CreateTime <= ? 可以走 CreateTime 索引，
+        翻到多深都只读取一页数据；否则使用 LIMIT/OFFSET
+        
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+            table_name: 表名
+            limit: 限制数量
+            offset: 偏移量（指定 before 时忽略）
+            start_date: 开始日期（YYYY-MM-DD）
+            end_date: 结束日期（YYYY-MM-DD）
+            before: 分页游标（上一页返回的 nextCursor）
+            
+        Returns:
+            (消息列表, 下一页游标)，没有更多消息时游标为 None
+            
+        Raises:
+            ValueError: 游标格式无效
+        """
         messages: List[Dict[str, Any]] = []
+        cursor_position = decode_cursor(before) if before else None
+        
+        db_index = self.locate_table(documents_path, user_md5, table_name)
+        if db_index is None:
+            print(f'聊天表不存在: {table_name}')
+            return messages, None
         
-        # 尝试从各个 message 数据库中查找
-        for i in range(1, 5):
-            conn = self.open_message_db(documents_path, user_md5, i)
+        with self.message_db(documents_path, user_md5, db_index) as conn:
             if not conn:
-                continue
+                return messages, None
             
             try:
                 cursor = conn.cursor()
                 
-                # 检查表是否存在
-                cursor.execute(
-                    "SELECT name FROM SQLITE_MASTER WHERE type = 'table' AND name = ?",
-                    (table_name,)
+                # 构建日期筛选条件（未指定日期时默认只返回最新一天的数据）
+                conditions, params = self._build_date_conditions(
+                    cursor, table_name, start_date, end_date, latest_day_default=True
                 )
                 
-                if not cursor.fetchone():
-                    conn.close()
-                    continue
+                # 游标条件：排在 (CreateTime, MesLocalID) 之后的消息
+                if cursor_position:
+                    before_time, before_id = cursor_position
+                    conditions.append('CreateTime <= ? AND (CreateTime < ? OR MesLocalID < ?)')
+                    params.extend([before_time, before_time, before_id])
                 
-                # 构建日期筛选条件
-                date_condition = ''
-                params = []
-                
-                if start_date or end_date:
-                    # 用户指定了日期范围
-                    conditions = []
-                    if start_date:
-                        from datetime import datetime
-                        start_timestamp = int(datetime.fromisoformat(start_date).timestamp())
-                        conditions.append('CreateTime >= ?')
-                        params.append(start_timestamp)
-                    if end_date:
-                        from datetime import datetime
-                        end_timestamp = int(datetime.fromisoformat(end_date + ' 23:59:59').timestamp())
-                        conditions.append('CreateTime <= ?')
-                        params.append(end_timestamp)
-                    date_condition = 'WHERE ' + ' AND '.join(conditions)
-                else:
-                    # 默认只返回最新一天的数据
-                    cursor.execute(f'SELECT MAX(CreateTime) as maxTime FROM "{table_name}"')
-                    max_time_row = cursor.fetchone()
-                    
-                    if max_time_row and max_time_row['maxTime']:
-                        from datetime import datetime
-                        max_time = max_time_row['maxTime']
-                        max_date = datetime.fromtimestamp(max_time)
-                        max_date = max_date.replace(hour=0, minute=0, second=0, microsecond=0)
-                        day_start_timestamp = int(max_date.timestamp())
-                        date_condition = 'WHERE CreateTime >= ?'
-                        params.append(day_start_timestamp)
+                date_condition = 'WHERE ' + ' AND '.join(conditions) if conditions else ''
                 
-                # 查询消息
+                # 查询消息（MesLocalID 保证同一秒内的消息顺序稳定）
                 query = f'''
                     SELECT * FROM "{table_name}" 
                     {date_condition}
-                    ORDER BY CreateTime DESC 
+                    ORDER BY CreateTime DESC, MesLocalID DESC 
                     LIMIT ? OFFSET ?
                 '''
-                params.extend([limit, offset])
+                params.extend([limit, 0 if cursor_position else offset])
                 
                 cursor.execute(query, params)
                 rows = cursor.fetchall()
@@ -374,14 +643,272 @@ class WeChatDatabase:
                     if 'Message' in message:
                         message['Message'] = decode_message(message['Message'])
                     messages.append(message)
+            except Exception as e:
+                print(f'从 message_{db_index}.sqlite 读取消息失败: {e}')
+        
+        next_cursor = None
+        if messages and len(messages) == limit:
+            last = messages[-1]
+            next_cursor = encode_cursor(last['CreateTime'], last['MesLocalID'])
+        
+        return messages, next_cursor
+    
+    def iter_messages(
+        self,
+        documents_path: str,
+        user_md5: str,
+        table_name: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        columns: Optional[List[str]] = None,
+        chunk_size: Optional[int] = None,
+        latest_day_default: bool = False
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        按时间正序逐条读取消息（fetchmany 分批读取，内存占用与聊天大小无关）
+        
+        迭代期间持有一个连接池连接，迭代结束或生成器关闭时归还
+        
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+            table_name: 表名
+            start_date: 开始日期（YYYY-MM-DD）
+            end_date: 结束日期（YYYY-MM-DD）
+            columns: 只读取这些列（默认全部列）
+            chunk_size: 每批读取的行数（默认 settings.message_chunk_size）
+            latest_day_default: 未指定日期时是否只读取最新一天（与 get_messages 一致）
+            
+        Yields:
+            消息字典（Message 字段已解码为字符串）
+        """
+        db_index = self.locate_table(documents_path, user_md5, table_name)
+        if db_index is None:
+            print(f'聊天表不存在: {table_name}')
+            return
+        
+        chunk_size = chunk_size or settings.message_chunk_size
+        select_columns = ', '.join(f'"{column}"' for column in columns) if columns else '*'
+        
+        with self.message_db(documents_path, user_md5, db_index) as conn:
+            if not conn:
+                return
+            
+            cursor = conn.cursor()
+            conditions, params = self._build_date_conditions(
+                cursor, table_name, start_date, end_date, latest_day_default
+            )
+            date_condition = 'WHERE ' + ' AND '.join(conditions) if conditions else ''
+            
+            cursor.execute(f'''
+                SELECT {select_columns} FROM "{table_name}" 
+                {date_condition}
+                ORDER BY CreateTime ASC, MesLocalID ASC
+            ''', params)
+            
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                
+                for row in rows:
+                    message = dict(row)
+                    if 'Message' in message:
+                        message['Message'] = decode_message(message['Message'])
+                    yield message
+    
+    def get_message_counts(
+        self,
+        documents_path: str,
+        user_md5: str,
+        table_name: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> Dict[str, Counter]:
+        """
+        在 SQLite 中按 (日期, 小时, 类型) 分组计数，只传回分组结果而不是每条消息
+        
+        未指定日期时与 get_messages 一致，只统计最新一天
+        
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+            table_name: 表名
+            start_date: 开始日期（YYYY-MM-DD）
+            end_date: 结束日期（YYYY-MM-DD）
+            
+        Returns:
+            计数结果（见 empty_counts）
+        """
+        counts = empty_counts()
+        
+        db_index = self.locate_table(documents_path, user_md5, table_name)
+        if db_index is None:
+            print(f'聊天表不存在: {table_name}')
+            return counts
+        
+        with self.message_db(documents_path, user_md5, db_index) as conn:
+            if not conn:
+                return counts
+            
+            try:
+                cursor = conn.cursor()
+                conditions, params = self._build_date_conditions(
+                    cursor, table_name, start_date, end_date, latest_day_default=True
+                )
+                date_condition = 'WHERE ' + ' AND '.join(conditions) if conditions else ''
                 
-                conn.close()
-                break  # 找到表后退出循环
+                cursor.execute(f'''
+                    SELECT {DAY_BUCKET_SQL} AS day, {HOUR_BUCKET_SQL} AS hour,
+                        Type AS msg_type, COUNT(*) AS count
+                    FROM "{table_name}"
+                    {date_condition}
+                    GROUP BY day, hour, msg_type
+                ''', params)
+                
+                for row in cursor.fetchall():
+                    counts['types'][row['msg_type']] += row['count']
+                    if row['day']:
+                        counts['daily'][row['day']] += row['count']
+                        counts['hourly'][row['hour']] += row['count']
             except Exception as e:
-                print(f'从 message_{i}.sqlite 读取消息失败: {e}')
-                conn.close()
+                print(f'从 message_{db_index}.sqlite 统计消息失败: {e}')
         
-        return messages
+        return counts
+    
+    def get_account_counts(
+        self,
+        documents_path: str,
+        user_md5: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> Dict[str, Counter]:
+        """
+        统计账号所有聊天表按 (月份, 类型) 的消息数
+        
+        四个消息数据库并行扫描（线程池，每个线程借用各自的连接），每张表一次 GROUP BY，
+        只传回分组结果
+        
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+            start_date: 开始日期（YYYY-MM-DD，不指定时不限制）
+            end_date: 结束日期（YYYY-MM-DD，不指定时不限制）
+            
+        Returns:
+            {表名: Counter({(月份 YYYY-MM, 类型): 消息数})}，CreateTime 为空的消息月份为 ''
+        """
+        tables_by_db: Dict[int, List[str]] = {}
+        for table_name, db_index in table_locator.locations(documents_path, user_md5).items():
+            tables_by_db.setdefault(db_index, []).append(table_name)
+        
+        # 不按最新一天筛选时与具体的表无关，所有表共用（日期格式错误时在这里抛出 ValueError）
+        conditions, params = self._build_date_conditions(
+            None, '', start_date, end_date, latest_day_default=False
+        )
+        date_condition = 'WHERE ' + ' AND '.join(conditions) if conditions else ''
+        
+        db_indexes = sorted(tables_by_db)
+        workers = min(settings.chat_scan_workers, len(db_indexes))
+        args = [(documents_path, user_md5, i, tables_by_db[i], date_condition, params) for i in db_indexes]
+        
+        if workers <= 1:
+            results = [self._count_message_db(*arg) for arg in args]
+        else:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='account-scan') as executor:
+                results = list(executor.map(lambda arg: self._count_message_db(*arg), args))
+        
+        counts: Dict[str, Counter] = {}
+        for result in results:
+            counts.update(result)
+        return counts
+    
+    def _count_message_db(
+        self,
+        documents_path: str,
+        user_md5: str,
+        db_index: int,
+        table_names: List[str],
+        date_condition: str,
+        params: List[Any]
+    ) -> Dict[str, Counter]:
+        """统计一个消息数据库中各聊天表按 (月份, 类型) 的消息数"""
+        counts: Dict[str, Counter] = {}
+        
+        with self.message_db(documents_path, user_md5, db_index) as conn:
+            if not conn:
+                return counts
+            
+            cursor = conn.cursor()
+            for table_name in table_names:
+                try:
+                    cursor.execute(f'''
+                        SELECT {MONTH_BUCKET_SQL} AS month, COALESCE(Type, 0) AS msg_type, COUNT(*) AS count
+                        FROM "{table_name}"
+                        {date_condition}
+                        GROUP BY month, msg_type
+                    ''', params)
+                    counts[table_name] = Counter({
+                        (row['month'], row['msg_type']): row['count'] for row in cursor.fetchall()
+                    })
+                except Exception as e:
+                    print(f'从 message_{db_index}.sqlite 统计 {table_name} 失败: {e}')
+        
+        return counts
+    
+    def fetch_columns(
+        self,
+        documents_path: str,
+        user_md5: str,
+        table_name: str,
+        columns: Sequence[str],
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> Dict[str, 'np.ndarray']:
+        """
+        按时间正序把整数列读成 numpy 数组（供列式统计使用，NULL 读为 0）
+        
+        未指定日期时与 get_messages 一致，只读取最新一天
+        
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+            table_name: 表名
+            columns: 列名（如 CreateTime、Type、Des）
+            start_date: 开始日期（YYYY-MM-DD）
+            end_date: 结束日期（YYYY-MM-DD）
+            
+        Returns:
+            {列名: int64 数组}，表不存在时为空数组
+        """
+        import numpy as np  # 延迟导入，只有列式引擎需要
+        
+        empty = {column: np.empty(0, dtype=np.int64) for column in columns}
+        
+        db_index = self.locate_table(documents_path, user_md5, table_name)
+        if db_index is None:
+            print(f'聊天表不存在: {table_name}')
+            return empty
+        
+        with self.message_db(documents_path, user_md5, db_index) as conn:
+            if not conn:
+                return empty
+            
+            cursor = conn.cursor()
+            conditions, params = self._build_date_conditions(
+                cursor, table_name, start_date, end_date, latest_day_default=True
+            )
+            date_condition = 'WHERE ' + ' AND '.join(conditions) if conditions else ''
+            select_columns = ', '.join(f'COALESCE("{column}", 0)' for column in columns)
+            
+            # 返回元组而不是 Row，便于直接展开
+            cursor.row_factory = None
+            cursor.execute(f'''
+                SELECT {select_columns} FROM "{table_name}"
+                {date_condition}
+                ORDER BY CreateTime ASC, MesLocalID ASC
+            ''', params)
+            return read_columns(cursor, columns, settings.message_chunk_size)
     
     def get_message_dates(
         self,
@@ -402,25 +929,18 @@ class WeChatDatabase:
         """
         dates = set()
         
-        # 尝试从各个 message 数据库中查找
-        for i in range(1, 5):
-            conn = self.open_message_db(documents_path, user_md5, i)
+        db_index = self.locate_table(documents_path, user_md5, table_name)
+        if db_index is None:
+            print(f'聊天表不存在: {table_name}')
+            return []
+        
+        with self.message_db(documents_path, user_md5, db_index) as conn:
             if not conn:
-                continue
+                return []
             
             try:
                 cursor = conn.cursor()
                 
-                # 检查表是否存在
-                cursor.execute(
-                    "SELECT name FROM SQLITE_MASTER WHERE type = 'table' AND name = ?",
-                    (table_name,)
-                )
-                
-                if not cursor.fetchone():
-                    conn.close()
-                    continue
-                
                 # 查询所有不同的日期
                 cursor.execute(f"""
                     SELECT DISTINCT date(CreateTime, 'unixepoch', 'localtime') as date 
@@ -432,15 +952,73 @@ class WeChatDatabase:
                 for row in rows:
                     if row['date']:
                         dates.add(row['date'])
-                
-                conn.close()
-                break
             except Exception as e:
-                print(f'从 message_{i}.sqlite 读取日期失败: {e}')
-                conn.close()
+                print(f'从 message_{db_index}.sqlite 读取日期失败: {e}')
         
         return sorted(list(dates), reverse=True)  # 倒序
     
+    def _build_date_conditions(
+        self,
+        cursor: Optional[sqlite3.Cursor],
+        table_name: str,
+        start_date: Optional[str],
+        end_date: Optional[str],
+        latest_day_default: bool
+    ) -> Tuple[List[str], List[Any]]:
+        """
+        构建日期筛选条件
+        
+        Args:
+            cursor: 数据库游标（只在按最新一天筛选时使用）
+            table_name: 表名
+            start_date: 开始日期（YYYY-MM-DD）
+            end_date: 结束日期（YYYY-MM-DD）
+            latest_day_default: 未指定日期时是否只筛选最新一天
+            
+        Returns:
+            (SQL 条件列表, 参数列表)
+        """
+        conditions: List[str] = []
+        params: List[Any] = []
+        
+        if start_date or end_date:
+            # 用户指定了日期范围
+            start_timestamp, end_timestamp = parse_date_range(start_date, end_date)
+            if start_timestamp is not None:
+                conditions.append('CreateTime >= ?')
+                params.append(start_timestamp)
+            if end_timestamp is not None:
+                conditions.append('CreateTime <= ?')
+                params.append(end_timestamp)
+        elif latest_day_default:
+            # 只筛选最新一天的数据
+            cursor.execute(f'SELECT MAX(CreateTime) as maxTime FROM "{table_name}"')
+            max_time_row = cursor.fetchone()
+            
+            if max_time_row and max_time_row['maxTime']:
+                max_time = max_time_row['maxTime']
+                max_date = datetime.fromtimestamp(max_time)
+                max_date = max_date.replace(hour=0, minute=0, second=0, microsecond=0)
+                day_start_timestamp = int(max_date.timestamp())
+                conditions.append('CreateTime >= ?')
+                params.append(day_start_timestamp)
+        
+        return conditions, params
+    
+    def locate_table(self, documents_path: str, user_md5: str, table_name: str) -> Optional[int]:
+        """
+        查找聊天表所在的消息数据库
+        
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+            table_name: 表名
+            
+        Returns:
+            数据库索引（1-4），表不存在返回 None
+        """
+        return table_locator.locate(documents_path, user_md5, table_name)
+    
     def _extract_chatter_md5(self, table_name: str) -> str:
         """
         从表名提取聊天对象的 MD5
@@ -0,0 +1,229 @@
+"""SQLite 只读连接池"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.config import settings
+
+# 联系人数据库文件名
+CONTACT_DB_NAME = 'WCDB_Contact.sqlite'
+
+# 连接池键：(documents_path, user_md5, 数据库文件名)
+PoolKey = Tuple[str, str, str]
+# 文件签名：(mtime_ns, size)，用于发现备份被替换
+FileSignature = Tuple[int, int]
+
+
+def get_db_path(documents_path: str, user_md5: str, db_name: str) -> Path:
+    """
+    获取用户数据库文件路径
+
+    Args:
+        documents_path: 微信数据目录路径
+        user_md5: 用户 MD5
+        db_name: 数据库文件名（如 message_1.sqlite）
+
+    Returns:
+        数据库文件路径
+    """
+    return Path(documents_path) / user_md5 / 'DB' / db_name
+
+
+def get_file_signature(path: Path) -> Optional[FileSignature]:
+    """
+    获取文件签名（修改时间 + 大小），文件不存在返回 None
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        (mtime_ns, size)
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def connect_readonly(db_path: Path, immutable: bool = False) -> sqlite3.Connection:
+    """
+    以只读模式打开 SQLite 数据库
+
+    Args:
+        db_path: 数据库文件路径
+        immutable: 是否使用 immutable=1（跳过文件锁，仅适用于不会再变化的备份）
+
+    Returns:
+        数据库连接对象（row_factory 为 sqlite3.Row）
+    """
+    uri = f'{db_path.resolve().as_uri()}?mode=ro'
+    if immutable:
+        uri += '&immutable=1'
+
+    # 连接会在 FastAPI 线程池的不同线程间复用，同一时刻只被一个线程持有
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+class ConnectionPool:
+    """按 (documents_path, user_md5, 数据库文件) 复用的只读连接池（线程安全）"""
+
+    def __init__(
+        self,
+        max_idle: Optional[int] = None,
+        idle_timeout: Optional[float] = None,
+        immutable: Optional[bool] = None
+    ):
+        self.max_idle = settings.db_pool_max_idle if max_idle is None else max_idle
+        self.idle_timeout = settings.db_pool_idle_timeout if idle_timeout is None else idle_timeout
+        self.immutable = settings.db_immutable if immutable is None else immutable
+
+        self._lock = threading.Lock()
+        # 空闲连接：{key: [(连接, 归还时间), ...]}
+        self._idle: Dict[PoolKey, List[Tuple[sqlite3.Connection, float]]] = {}
+        # 连接对应的文件签名，文件变化后旧连接全部作废
+        self._signatures: Dict[PoolKey, FileSignature] = {}
+
+        # 统计指标
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._in_use = 0
+
+    @contextmanager
+    def connection(
+        self,
+        documents_path: str,
+        user_md5: str,
+        db_name: str
+    ) -> Iterator[Optional[sqlite3.Connection]]:
+        """
+        借出一个连接，退出上下文时自动归还
+
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+            db_name: 数据库文件名
+
+        Yields:
+            数据库连接对象，文件不存在或打开失败时为 None
+        """
+        key: PoolKey = (str(documents_path), user_md5, db_name)
+        db_path = get_db_path(documents_path, user_md5, db_name)
+        signature = get_file_signature(db_path)
+        conn = self._acquire(key, db_path, signature) if signature else None
+
+        if conn is None:
+            yield None
+            return
+
+        try:
+            yield conn
+        finally:
+            self._release(key, conn, signature)
+
+    def _acquire(
+        self,
+        key: PoolKey,
+        db_path: Path,
+        signature: FileSignature
+    ) -> Optional[sqlite3.Connection]:
+        """借出连接：优先复用空闲连接，否则新建"""
+        with self._lock:
+            self._evict_expired(time.monotonic())
+
+            # 文件被替换或更新过，丢弃旧连接
+            if self._signatures.get(key) != signature:
+                self._close_idle(key)
+                self._signatures[key] = signature
+
+            idle = self._idle.get(key)
+            if idle:
+                conn, _ = idle.pop()
+                self._hits += 1
+                self._in_use += 1
+                return conn
+
+            self._misses += 1
+
+        # 在锁外建立连接，避免阻塞其他线程
+        try:
+            conn = connect_readonly(db_path, self.immutable)
+        except Exception as e:
+            print(f'打开 {db_path.name} 失败: {e}')
+            return None
+
+        with self._lock:
+            self._in_use += 1
+        return conn
+
+    def _release(self, key: PoolKey, conn: sqlite3.Connection, signature: FileSignature):
+        """归还连接"""
+        now = time.monotonic()
+        close_conn = False
+
+        with self._lock:
+            self._in_use -= 1
+            idle = self._idle.setdefault(key, [])
+            # 借出期间文件已变化，或空闲连接已满，直接关闭
+            if self._signatures.get(key) != signature or len(idle) >= self.max_idle:
+                close_conn = True
+            else:
+                idle.append((conn, now))
+            self._evict_expired(now)
+
+        if close_conn:
+            conn.close()
+
+    def _evict_expired(self, now: float):
+        """回收超时的空闲连接（调用方需持有锁）"""
+        for key, idle in self._idle.items():
+            alive = []
+            for conn, released_at in idle:
+                if now - released_at > self.idle_timeout:
+                    conn.close()
+                    self._evictions += 1
+                else:
+                    alive.append((conn, released_at))
+            idle[:] = alive
+
+    def _close_idle(self, key: PoolKey):
+        """关闭某个键的全部空闲连接（调用方需持有锁）"""
+        for conn, _ in self._idle.pop(key, []):
+            conn.close()
+            self._evictions += 1
+
+    def close_all(self):
+        """关闭所有空闲连接"""
+        with self._lock:
+            for key in list(self._idle.keys()):
+                self._close_idle(key)
+            self._signatures.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取连接池统计数据
+
+        Returns:
+            {'hits', 'misses', 'hitRate', 'evictions', 'idle', 'inUse'}
+        """
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hitRate': round(self._hits / total, 4) if total else 0.0,
+                'evictions': self._evictions,
+                'idle': sum(len(idle) for idle in self._idle.values()),
+                'inUse': self._in_use,
+            }
+
+
+# 全局连接池实例
+connection_pool = ConnectionPool()
@@ -0,0 +1,150 @@
+"""按负载类型划分的线程池：把同步的 SQLite / jieba / 词云 / 大模型调用移出事件循环
+
+每类负载使用独立的有界线程池，词云等耗时请求只会占满 cpu 线程池，
+不会让消息浏览（db）或大模型请求（llm）排在它们后面
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from app.config import settings
+
+# 负载类型 → 线程数配置项
+WORKLOADS = {
+    'db': 'db_threads',  # SQLite 查询、聊天列表、HTML 渲染
+    'cpu': 'cpu_threads',  # 分词、统计、词云渲染
+    'llm': 'llm_threads',  # 大模型接口调用（等待网络 I/O）
+}
+
+
+class WorkloadExecutors:
+    """各负载类型的线程池（首次使用时创建，应用关闭时释放）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executors: Dict[str, ThreadPoolExecutor] = {}
+        # 已提交但未完成的任务数（含排队中的）
+        self._pending: Dict[str, int] = {workload: 0 for workload in WORKLOADS}
+
+    def _get_executor(self, workload: str) -> ThreadPoolExecutor:
+        with self._lock:
+            executor = self._executors.get(workload)
+            if executor is None:
+                executor = ThreadPoolExecutor(
+                    max_workers=self.workers(workload),
+                    thread_name_prefix=f'{workload}-worker'
+                )
+                self._executors[workload] = executor
+            return executor
+
+    def workers(self, workload: str) -> int:
+        """
+        线程数
+
+        Args:
+            workload: 负载类型（db / cpu / llm）
+
+        Returns:
+            配置的线程数（至少为 1）
+
+        Raises:
+            ValueError: 未知的负载类型
+        """
+        if workload not in WORKLOADS:
+            raise ValueError(f'未知的负载类型: {workload}')
+        return max(1, getattr(settings, WORKLOADS[workload]))
+
+    async def run(self, workload: str, fn: Callable, *args: Any, **kwargs: Any) -> Any:
+        """
+        在对应负载类型的线程池中执行同步函数并等待结果
+
+        Args:
+            workload: 负载类型（db / cpu / llm）
+            fn: 同步函数
+            *args: 位置参数
+            **kwargs: 关键字参数
+
+        Returns:
+            fn 的返回值（异常原样抛出）
+        """
+        executor = self._get_executor(workload)
+        loop = asyncio.get_running_loop()
+
+        with self._lock:
+            self._pending[workload] += 1
+        try:
+            return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            with self._lock:
+                self._pending[workload] -= 1
+
+    def submit(self, workload: str, fn: Callable, *args: Any, **kwargs: Any) -> Future:
+        """
+        在对应负载类型的线程池中提交同步函数，不等待结果（供后台任务使用）
+
+        Args:
+            workload: 负载类型（db / cpu / llm）
+            fn: 同步函数
+            *args: 位置参数
+            **kwargs: 关键字参数
+
+        Returns:
+            任务的 Future
+        """
+        executor = self._get_executor(workload)
+        future = executor.submit(fn, *args, **kwargs)
+
+        with self._lock:
+            self._pending[workload] += 1
+
+        def on_done(_: Future):
+            with self._lock:
+                self._pending[workload] -= 1
+
+        future.add_done_callback(on_done)
+        return future
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        各线程池的状态
+
+        Returns:
+            {负载类型: {'workers', 'pending', 'started'}}
+        """
+        with self._lock:
+            return {
+                workload: {
+                    'workers': self.workers(workload),
+                    'pending': self._pending[workload],
+                    'started': workload in self._executors,
+                }
+                for workload in WORKLOADS
+            }
+
+    def shutdown(self):
+        """关闭所有线程池（不等待进行中的任务）"""
+        with self._lock:
+            executors, self._executors = self._executors, {}
+        for executor in executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+# 全局线程池实例
+executors = WorkloadExecutors()
+
+
+async def run_db(fn: Callable, *args: Any, **kwargs: Any) -> Any:
+    """在 db 线程池中执行（SQLite 查询等）"""
+    return await executors.run('db', fn, *args, **kwargs)
+
+
+async def run_cpu(fn: Callable, *args: Any, **kwargs: Any) -> Any:
+    """在 cpu 线程池中执行（分词、统计、词云渲染等）"""
+    return await executors.run('cpu', fn, *args, **kwargs)
+
+
+async def run_llm(fn: Callable, *args: Any, **kwargs: Any) -> Any:
+    """在 llm 线程池中执行（大模型接口调用）"""
+    return await executors.run('llm', fn, *args, **kwargs)
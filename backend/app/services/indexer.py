@@ -0,0 +1,404 @@
+"""后台增量索引：监视微信数据目录，备份更新后立即更新各类 sidecar 索引
+
+监视 settings.wechat_documents_path 下的 LoginInfo2.dat 和各账号的 message_N.sqlite、WCDB_Contact.sqlite
+及其 WAL 文件（有 watchfiles 时使用 inotify 等系统通知，否则定时轮询文件签名）。
+变化的消息数据库中的表按各索引自己的高水位只处理新增消息，请求时不再需要等待索引更新。
+统计预聚合、预分词和全文搜索索引在后台索引进程池中逐表建立，不占用服务进程的 GIL；
+失败的账号按指数退避重试。
+"""
+import re
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from app.config import settings
+from app.services.aggregate_store import aggregate_store
+from app.services.analysis_pool import index_pool
+from app.services.contact_directory import contact_directory
+from app.services.database import WeChatDatabase
+from app.services.db_pool import CONTACT_DB_NAME, FileSignature, get_file_signature
+from app.services.search_index import search_index
+from app.services.table_index import MESSAGE_DB_COUNT, table_locator
+from app.services.token_index import token_index
+
+try:
+    import watchfiles
+except ImportError:  # 未安装时使用轮询
+    watchfiles = None
+
+LOGIN_INFO_FILE = 'LoginInfo2.dat'
+
+# 可由后台更新的索引：chats（聊天列表缓存）/ aggregate（统计预聚合）/ tokens（预分词）/ search（全文搜索）
+INDEXES = ('chats', 'aggregate', 'tokens', 'search')
+
+# 账号目录名（32 位 MD5）
+ACCOUNT_DIR_RE = re.compile(r'^[a-f0-9]{32}$', re.IGNORECASE)
+
+# 账号 DB 目录中需要监视的文件（数据库及其 WAL 文件）
+ACCOUNT_DBS = tuple(f'message_{i}.sqlite' for i in range(1, MESSAGE_DB_COUNT + 1)) + (CONTACT_DB_NAME,)
+ACCOUNT_FILES = ACCOUNT_DBS + tuple(f'{name}-wal' for name in ACCOUNT_DBS)
+MESSAGE_DB_RE = re.compile(r'/DB/message_(\d+)\.sqlite(?:-wal)?$')
+
+# 监视目录停止后重试前的等待秒数
+WATCH_RETRY_INTERVAL = 5.0
+
+# 文件系统通知模式下没有文件变化时，检查是否有到期的失败重试的间隔（秒）
+RETRY_CHECK_INTERVAL = 5.0
+
+# 失败重试的最长等待秒数
+RETRY_MAX_INTERVAL = 3600.0
+
+# 等待进程池中的索引任务时检查是否停止的间隔（秒）
+STOP_POLL_INTERVAL = 0.5
+
+
+def get_enabled_indexes() -> List[str]:
+    """解析 settings.indexer_indexes（如 "chats,aggregate,tokens,search"），忽略未知的索引名"""
+    names = []
+    for item in settings.indexer_indexes.split(','):
+        item = item.strip().lower()
+        if item in INDEXES and item not in names:
+            names.append(item)
+    return names
+
+
+def _format_time(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp else None
+
+
+class BackgroundIndexer:
+    """后台索引线程（应用启动时开始，关闭时停止）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._documents_path: Optional[str] = None
+        self._mode: Optional[str] = None
+        # 已索引时各文件的签名 {相对路径: 签名}
+        self._indexed: Dict[str, Optional[FileSignature]] = {}
+        # 账号状态 {user_md5: {...}}
+        self._accounts: Dict[str, Dict[str, Any]] = {}
+        self._last_check: Optional[float] = None
+        self._last_error: Optional[str] = None
+        self._db = WeChatDatabase()
+
+    @property
+    def running(self) -> bool:
+        """后台线程是否在运行"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> bool:
+        """
+        启动后台索引线程（未配置 wechat_documents_path 或 indexer_enabled 为 false 时不启动）
+
+        Returns:
+            是否已启动
+        """
+        if not settings.indexer_enabled or not settings.wechat_documents_path:
+            return False
+        if self.running:
+            return True
+
+        self._documents_path = settings.wechat_documents_path
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='background-indexer', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self, timeout: float = 5.0):
+        """停止后台索引线程（进行中的表写完当前批次后退出）"""
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
+
+    def _run(self):
+        """后台线程：先补齐服务未运行期间的变化，再等待文件变化"""
+        mode = 'watch' if watchfiles is not None else 'poll'
+        print(f'✅ 后台索引已启动: {self._documents_path}'
+              f'（{"文件系统通知" if mode == "watch" else "轮询"}，索引 {",".join(get_enabled_indexes())}）')
+
+        self._sync()
+        while not self._stop.is_set():
+            try:
+                changes = self._watch() if mode == 'watch' else self._poll()
+                for _ in changes:
+                    self._sync()
+            except Exception as e:
+                # 目录不存在、inotify 数量超限等：改为轮询
+                self._last_error = f'监视目录失败: {e}'
+                print(f'{self._last_error}，改为轮询')
+                mode = 'poll'
+                self._stop.wait(WATCH_RETRY_INTERVAL)
+
+    def _watch(self) -> Iterator[None]:
+        """文件系统通知：相关文件变化（并静默 indexer_debounce 秒）后产出"""
+        self._mode = 'watch'
+        watched = {LOGIN_INFO_FILE, *ACCOUNT_FILES}
+        for changes in watchfiles.watch(
+            self._documents_path,
+            watch_filter=lambda change, path: Path(path).name in watched,
+            debounce=int(settings.indexer_debounce * 1000),
+            stop_event=self._stop,
+            rust_timeout=int(RETRY_CHECK_INTERVAL * 1000),
+            yield_on_timeout=True,
+            raise_interrupt=False
+        ):
+            # 超时时产出空集合：只在有到期的失败重试时检查
+            if changes or self._retry_due():
+                yield
+
+    def _retry_due(self) -> bool:
+        """是否有到了重试时间的失败账号"""
+        now = time.time()
+        with self._lock:
+            return any(state['retryAt'] and state['retryAt'] <= now for state in self._accounts.values())
+
+    def _poll(self) -> Iterator[None]:
+        """轮询：每 indexer_poll_interval 秒产出一次"""
+        self._mode = 'poll'
+        while not self._stop.wait(max(1.0, settings.indexer_poll_interval)):
+            yield
+
+    def _snapshot(self) -> Dict[str, Optional[FileSignature]]:
+        """数据目录中所有被监视文件的签名 {相对路径: 签名}"""
+        root = Path(self._documents_path)
+        snapshot = {LOGIN_INFO_FILE: get_file_signature(root / LOGIN_INFO_FILE)}
+        try:
+            account_dirs = [item for item in root.iterdir() if ACCOUNT_DIR_RE.match(item.name)]
+        except OSError:
+            return snapshot
+
+        for account_dir in account_dirs:
+            db_dir = account_dir / 'DB'
+            if not db_dir.is_dir():
+                continue
+            for file_name in ACCOUNT_FILES:
+                snapshot[f'{account_dir.name.lower()}/DB/{file_name}'] = get_file_signature(db_dir / file_name)
+        return snapshot
+
+    def _wait_until_stable(
+        self,
+        snapshot: Dict[str, Optional[FileSignature]]
+    ) -> Optional[Dict[str, Optional[FileSignature]]]:
+        """等待文件停止变化（备份仍在写入时不读取），停止时返回 None"""
+        while not self._stop.wait(settings.indexer_debounce):
+            latest = self._snapshot()
+            if latest == snapshot:
+                return snapshot
+            snapshot = latest
+        return None
+
+    def _sync(self):
+        """比较文件签名，对有变化的账号执行增量索引"""
+        snapshot = self._snapshot()
+        self._last_check = time.time()
+
+        changed = {path for path in snapshot.keys() | self._indexed.keys()
+                   if snapshot.get(path) != self._indexed.get(path)}
+        # LoginInfo2.dat 本身不需要索引（账号目录的变化已在快照中体现），直接记录，避免每次都判定为变化
+        self._indexed[LOGIN_INFO_FILE] = snapshot[LOGIN_INFO_FILE]
+        if not changed:
+            return
+
+        changed_accounts: Dict[str, Set[str]] = {}
+        for path in changed:
+            if '/' in path:
+                changed_accounts.setdefault(path.split('/', 1)[0], set()).add(path)
+
+        now = time.time()
+        accounts = []
+        with self._lock:
+            for user_md5, paths in sorted(changed_accounts.items()):
+                state = self._accounts.setdefault(user_md5, {
+                    'pendingSince': None, 'lastIndexedAt': None, 'lastDuration': None,
+                    'lastError': None, 'passes': 0, 'failures': 0, 'retryAt': None, 'failedFiles': None,
+                })
+                # 滞后从未索引的文件中最新的修改时间算起（服务停止期间的变化也计入）
+                mtimes = [snapshot[path][0] / 1e9 for path in paths if snapshot.get(path)]
+                state['pendingSince'] = max(mtimes, default=state['pendingSince'] or now)
+                # 失败后文件没有再变化时，等到重试时间再处理
+                account_files = {path: signature for path, signature in snapshot.items()
+                                 if path.startswith(f'{user_md5}/DB/')}
+                if state['retryAt'] and state['retryAt'] > now and account_files == state['failedFiles']:
+                    continue
+                accounts.append(user_md5)
+        if not accounts:
+            return
+
+        snapshot = self._wait_until_stable(snapshot)
+        if snapshot is None:
+            return
+
+        for user_md5 in accounts:
+            if self._stop.is_set():
+                return
+            prefix = f'{user_md5}/DB/'
+            account_files = {path: signature for path, signature in snapshot.items() if path.startswith(prefix)}
+            if not account_files:
+                # 账号目录已删除
+                with self._lock:
+                    self._accounts.pop(user_md5, None)
+                continue
+            changed_dbs = {
+                int(match.group(1))
+                for path, signature in account_files.items()
+                for match in [MESSAGE_DB_RE.search(path)]
+                if match and signature != self._indexed.get(path)
+            }
+            if self._index_account(user_md5, changed_dbs, account_files):
+                self._indexed.update(account_files)
+
+        # 账号已删除的文件
+        for path in list(self._indexed):
+            if path not in snapshot:
+                del self._indexed[path]
+
+    def _index_account(
+        self,
+        user_md5: str,
+        changed_dbs: Set[int],
+        account_files: Dict[str, Optional[FileSignature]]
+    ) -> bool:
+        """
+        增量更新一个账号的索引
+
+        聊天列表在当前线程中更新；统计预聚合、预分词逐表提交到后台索引进程池，
+        全文搜索索引使用搜索索引自己的后台任务，依次等待完成
+
+        Args:
+            user_md5: 用户 MD5
+            changed_dbs: 有变化的消息数据库编号（只更新位于这些数据库中的表）
+            account_files: 本次处理的账号文件签名（失败时记录，文件不再变化时按退避时间重试）
+
+        Returns:
+            是否完成（出错或停止时为 False，出错时按退避时间重试）
+        """
+        documents_path = self._documents_path
+        indexes = get_enabled_indexes()
+        table_indexes = [name for name in ('aggregate', 'tokens') if name in indexes]
+        start = time.perf_counter()
+        error = None
+        tables: List[str] = []
+
+        try:
+            # 联系人目录按文件签名缓存，这里只是预先加载
+            contact_directory.get(documents_path, user_md5)
+            if 'chats' in indexes:
+                self._db.get_chat_tables(documents_path, user_md5)
+
+            tables = [
+                table_name
+                for table_name, db_index in table_locator.locations(documents_path, user_md5).items()
+                if db_index in changed_dbs
+            ]
+            # 逐表提交：进程池中的分析请求可以排在各表之间执行
+            for table_name in tables if table_indexes else []:
+                future = index_pool.submit('index_table', documents_path, user_md5, table_name, table_indexes)
+                if not self._wait(future):
+                    return False
+            if 'search' in indexes and tables:
+                if not self._wait(search_index.refresh_in_background(documents_path, user_md5)):
+                    return False
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            print(f'后台索引 {user_md5} 失败: {error}')
+
+        duration = time.perf_counter() - start
+        with self._lock:
+            state = self._accounts[user_md5]
+            state['lastDuration'] = round(duration, 3)
+            state['lastError'] = error
+            if error is None:
+                state.update(pendingSince=None, lastIndexedAt=time.time(), failures=0, retryAt=None, failedFiles=None)
+                state['passes'] += 1
+            else:
+                state['failures'] += 1
+                delay = min(RETRY_MAX_INTERVAL, settings.indexer_retry_interval * 2 ** (state['failures'] - 1))
+                state.update(retryAt=time.time() + delay, failedFiles=account_files)
+
+        if error is None:
+            print(f'✅ 后台索引完成: {user_md5}（检查 {len(tables)} 个表，耗时 {duration:.2f}s）')
+        else:
+            print(f'后台索引 {user_md5} 将在 {delay:.0f}s 后重试（第 {state["failures"]} 次失败）')
+        return error is None
+
+    def _wait(self, future: Future) -> bool:
+        """
+        等待进程池中的索引任务完成
+
+        Returns:
+            是否完成（停止时为 False，不再等待任务结果）
+
+        Raises:
+            任务中的异常
+        """
+        while True:
+            try:
+                future.result(timeout=STOP_POLL_INTERVAL)
+                return True
+            except FutureTimeoutError:
+                if self._stop.is_set():
+                    return False
+
+    @staticmethod
+    def refresh_table(documents_path: str, user_md5: str, table_name: str, indexes: List[str]):
+        """
+        更新一个表的统计预聚合和预分词（在后台索引进程池中执行）
+
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+            table_name: 聊天表名
+            indexes: 要更新的索引（aggregate / tokens）
+        """
+        if 'aggregate' in indexes:
+            aggregate_store.refresh_table(documents_path, user_md5, table_name)
+        if 'tokens' in indexes:
+            token_index.refresh_table(documents_path, user_md5, table_name)
+
+    def status(self) -> Dict[str, Any]:
+        """
+        后台索引状态
+
+        Returns:
+            {'enabled', 'running', 'mode', 'documentsPath', 'indexes', 'lastCheckAt', 'lastError',
+            'lagSeconds', 'accounts': {user_md5: {'pending', 'lagSeconds', 'lastIndexedAt', 'retryAt', ...}}}；
+            lagSeconds 为未索引的数据库 / WAL 文件中最新的修改时间距今的秒数，0 表示索引已是最新；
+            retryAt 为失败后下次重试的时间
+        """
+        now = time.time()
+        with self._lock:
+            accounts = {}
+            for user_md5, state in self._accounts.items():
+                pending_since = state['pendingSince']
+                accounts[user_md5] = {
+                    'pending': pending_since is not None,
+                    'lagSeconds': round(now - pending_since, 1) if pending_since else 0,
+                    'lastIndexedAt': _format_time(state['lastIndexedAt']),
+                    'lastDuration': state['lastDuration'],
+                    'lastError': state['lastError'],
+                    'failures': state['failures'],
+                    'retryAt': _format_time(state['retryAt']),
+                    'passes': state['passes'],
+                }
+
+        return {
+            'enabled': settings.indexer_enabled and bool(settings.wechat_documents_path),
+            'running': self.running,
+            'mode': self._mode if self.running else None,
+            'documentsPath': self._documents_path,
+            'indexes': get_enabled_indexes(),
+            'lastCheckAt': _format_time(self._last_check),
+            'lastError': self._last_error,
+            'lagSeconds': max((account['lagSeconds'] for account in accounts.values()), default=0),
+            'accounts': accounts,
+        }
+
+
+# 全局后台索引实例
+background_indexer = BackgroundIndexer()
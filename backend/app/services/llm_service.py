@@ -1,20 +1,23 @@
 """大模型服务"""
-from typing import Optional, List, Dict, Any
-from openai import OpenAI
+from typing import TYPE_CHECKING, Optional, List, Dict, Any
 
 from app.config import settings
 from app.services.database import WeChatDatabase
 
+if TYPE_CHECKING:
+    from openai import OpenAI
+
 
 class LLMService:
     """大模型服务（基于 OpenAI API）"""
     
     def __init__(self):
         self.db = WeChatDatabase()
-        self.client: Optional[OpenAI] = None
+        self.client: Optional['OpenAI'] = None
         
-        # 初始化 OpenAI 客户端
+        # 初始化 OpenAI 客户端（openai 包较大，用到时才导入）
         if settings.openai_api_key:
+            from openai import OpenAI
             self.client = OpenAI(
                 api_key=settings.openai_api_key,
                 base_url=settings.openai_base_url
@@ -3,9 +3,10 @@ import html
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 
-from app.models import ChatTable, Contact
+from app.models import ChatTable
+from app.services.contact_directory import ContactDirectory, contact_directory
 from app.services.database import WeChatDatabase
-from app.utils.crypto import md5, decode_user_name_info, get_friendly_name
+from app.services.sender_resolver import sender_resolver
 
 
 class WeChatRenderer:
@@ -41,22 +42,22 @@ class WeChatRenderer:
         Returns:
             HTML 字符串
         """
-        messages = self.db.get_messages(
+        messages, next_cursor = self.db.get_message_page(
             documents_path, user_md5, table_name, limit, offset, start_date, end_date
         )
         
         # 如果是群聊，加载联系人信息用于解析昵称
-        contacts_map: Optional[Dict[str, Contact]] = None
+        contacts: Optional[ContactDirectory] = None
         if chat_info.contact.is_group:
-            contacts_map = self.db.get_contacts(documents_path, user_md5)
+            contacts = contact_directory.get(documents_path, user_md5)
         
         # 构建 HTML
         html_content = self._build_html_head(chat_info)
-        html_content += self._build_messages_html(messages, contacts_map, chat_info.contact.is_group)
+        html_content += self._build_messages_html(messages, contacts, chat_info.contact.is_group)
         html_content += self._build_html_footer(
             documents_path, user_md5, table_name,
             chat_info.contact.nickname, chat_info.contact.is_group,
-            len(messages), limit, start_date, end_date
+            next_cursor, limit, start_date, end_date
         )
         
         return html_content
@@ -118,7 +119,7 @@ class WeChatRenderer:
     def _build_messages_html(
         self,
         messages: List[Dict[str, Any]],
-        contacts_map: Optional[Dict[str, Contact]],
+        contacts: Optional[ContactDirectory],
         is_group: bool
     ) -> str:
         """构建消息列表 HTML"""
@@ -131,25 +132,9 @@ class WeChatRenderer:
             message_text = msg['Message']
             
             # 如果是群聊文本消息，先提取发送者
-            if contacts_map and msg['Type'] == 1 and message_text and ':\n' in message_text:
-                parts = message_text.split(':\n', 1)
-                if len(parts) >= 2:
-                    sender_id = parts[0].strip()
-                    message_text = parts[1]
-                    
-                    # 查找发送者昵称
-                    sender_md5 = md5(sender_id)
-                    sender_contact = contacts_map.get(sender_md5)
-                    sender_name = ''
-                    
-                    if sender_contact:
-                        sender_name = decode_user_name_info(sender_contact.db_contact_remark)
-                    
-                    # 如果没找到昵称，使用友好名称
-                    if not sender_name or sender_name == sender_id:
-                        sender_name = get_friendly_name(sender_id, '', False)
-                    
-                    sender = sender_name
+            if contacts is not None and msg['Type'] == 1 and message_text:
+                sender_name, message_text = sender_resolver.parse(contacts, message_text)
+                sender = sender_name or ''
             
             # 格式化消息内容
             content = self._format_message_content(msg, message_text)
@@ -173,7 +158,7 @@ class WeChatRenderer:
         table_name: str,
         nickname: str,
         is_group: bool,
-        messages_count: int,
+        next_cursor: Optional[str],
         limit: int,
         start_date: Optional[str],
         end_date: Optional[str]
@@ -181,6 +166,7 @@ class WeChatRenderer:
         """构建 HTML 尾部（包含 JavaScript）"""
         start_date_str = f"'{start_date}'" if start_date else 'null'
         end_date_str = f"'{end_date}'" if end_date else 'null'
+        next_cursor_str = f"'{next_cursor}'" if next_cursor else 'null'
         
         return f'''
   </div>
@@ -200,9 +186,9 @@ class WeChatRenderer:
       tableName: '{table_name}',
       isGroup: '{str(is_group).lower()}'
     }};
-    let currentOffset = {messages_count};
+    let nextCursor = {next_cursor_str};
     let isLoading = false;
-    let hasMore = {str(messages_count == limit).lower()};
+    let hasMore = nextCursor !== null;
     let currentStartDate = {start_date_str};
     let currentEndDate = {end_date_str};
     let startPicker = null;
@@ -299,7 +285,7 @@ class WeChatRenderer:
         const loadParams = new URLSearchParams({{
           ...params,
           limit: {limit},
-          offset: currentOffset
+          before: nextCursor
         }});
         
         if (currentStartDate) loadParams.set('startDate', currentStartDate);
@@ -319,8 +305,12 @@ class WeChatRenderer:
               const messageEl = createMessageElement(msg);
               document.getElementById('messages').appendChild(messageEl);
             }});
-            currentOffset += messages.length;
-            hasMore = messages.length === {limit};
+            // 下一页游标通过响应头返回，没有时说明已经到底
+            nextCursor = response.headers.get('X-Next-Cursor');
+            hasMore = nextCursor !== null;
+            if (!hasMore) {{
+              document.getElementById('noMore').style.display = 'block';
+            }}
           }}
         }} else {{
           throw new Error(data.error || '加载失败');
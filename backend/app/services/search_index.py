@@ -0,0 +1,531 @@
+"""全文搜索索引（每个账号一个 SQLite FTS5 sidecar 文件）
+
+文本消息入库时用 jieba（搜索引擎模式）分词，词之间以空格分隔后交给 FTS5 的 unicode61 分词器，
+查询语句按同样的方式分词，所有词都出现的消息按 bm25 排序返回。
+每张表按 (CreateTime, MesLocalID) 高水位增量索引；索引在后台索引进程池中更新，搜索请求不等待。
+"""
+import html
+import re
+import sqlite3
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.config import settings
+from app.services.analysis_pool import index_pool
+from app.services.analyzers import TEXT_MESSAGE_TYPE
+from app.services.contact_directory import contact_directory
+from app.services.database import decode_message
+from app.services.db_pool import FileSignature, connection_pool, get_db_path, get_file_signature
+from app.services.segment_pool import PARALLEL_MIN_MESSAGES, segment_pool
+from app.services.sender_resolver import sender_resolver, split_sender
+from app.services.table_index import table_locator
+from app.utils.jieba_loader import get_jieba
+from app.utils.storage import open_sidecar_db
+
+SEARCH_DB_FILE = 'search.sqlite'
+# sidecar 结构版本，结构或分词规则变化时递增以重建
+SCHEMA_VERSION = 2
+
+SCHEMA_SQL = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS message_fts USING fts5(
+        tokens,                   -- jieba 分词结果，空格分隔
+        text UNINDEXED,           -- 去掉发送者前缀的正文（生成摘要用）
+        table_name UNINDEXED,
+        mes_local_id UNINDEXED,
+        create_time UNINDEXED,
+        sender_id UNINDEXED,      -- 群聊发送者微信号，非群聊消息为 NULL
+        tokenize = 'unicode61'
+    );
+    CREATE TABLE IF NOT EXISTS table_state (
+        table_name TEXT PRIMARY KEY,
+        db_index INTEGER NOT NULL,
+        max_create_time INTEGER NOT NULL,  -- 已索引的最大 (CreateTime, MesLocalID)（高水位）
+        max_local_id INTEGER NOT NULL,
+        row_count INTEGER NOT NULL,        -- 源表中不超过高水位的行数（所有类型，与源表不符时整表重建）
+        mtime_ns INTEGER,                  -- 上次刷新时源数据库文件的签名
+        size INTEGER
+    );
+"""
+
+DROP_SQL = """
+    DROP TABLE IF EXISTS message_fts;
+    DROP TABLE IF EXISTS table_state;
+"""
+
+# 源表最新一条消息的 (CreateTime, MesLocalID)
+SOURCE_LAST_SQL = """
+    SELECT CreateTime, MesLocalID FROM "{table_name}"
+    WHERE CreateTime IS NOT NULL
+    ORDER BY CreateTime DESC, MesLocalID DESC
+    LIMIT 1
+"""
+
+# 源表的总行数和高水位之后的行数
+SOURCE_COUNT_SQL = """
+    SELECT COUNT(CreateTime) AS rowCount, SUM((CreateTime, MesLocalID) > (?, ?)) AS newRows
+    FROM "{table_name}"
+"""
+
+# 源表在两个 (CreateTime, MesLocalID) 之间（左开右闭）的行数
+SOURCE_RANGE_COUNT_SQL = """
+    SELECT COUNT(*) FROM "{table_name}"
+    WHERE (CreateTime, MesLocalID) > (?, ?) AND (CreateTime, MesLocalID) <= (?, ?)
+"""
+
+# 读取高水位之后、本次刷新开始时最新一条消息之前（含）的文本消息
+SOURCE_TEXT_SQL = """
+    SELECT MesLocalID, CreateTime, Message
+    FROM "{table_name}"
+    WHERE Type = {text_type}
+        AND (CreateTime, MesLocalID) > (?, ?) AND (CreateTime, MesLocalID) <= (?, ?)
+    ORDER BY CreateTime, MesLocalID
+"""
+
+# 摘要长度（字符数，不含省略号）
+SNIPPET_LENGTH = 60
+
+
+def tokenize_for_search(texts: List[str]) -> List[str]:
+    """
+    对一批文本分词（模块级函数，可在分词进程池中执行）
+
+    Args:
+        texts: 文本列表
+
+    Returns:
+        每条文本的分词结果（小写，空格分隔）
+    """
+    jieba = get_jieba()
+    return [
+        ' '.join(word for word in jieba.cut_for_search(text.lower()) if not word.isspace())
+        for text in texts
+    ]
+
+
+def parse_query(query: str) -> List[str]:
+    """
+    将搜索语句分词为检索词（去掉标点和空白，去重）
+
+    Args:
+        query: 搜索语句
+
+    Returns:
+        检索词列表
+    """
+    terms = []
+    for word in get_jieba().cut_for_search(query.lower()):
+        word = word.strip()
+        if word and any(ch.isalnum() for ch in word) and word not in terms:
+            terms.append(word)
+    return terms
+
+
+def make_snippet(text: str, terms: List[str], length: int = SNIPPET_LENGTH) -> str:
+    """
+    截取第一个检索词附近的正文，并用 <mark> 标出检索词（其余内容已做 HTML 转义）
+
+    Args:
+        text: 正文
+        terms: 检索词
+        length: 摘要长度
+
+    Returns:
+        摘要 HTML 片段
+    """
+    lowered = text.lower()
+    positions = [pos for pos in (lowered.find(term) for term in terms) if pos >= 0]
+    start = max(0, min(positions) - length // 3) if positions else 0
+    end = min(len(text), start + length)
+    segment = text[start:end]
+
+    pattern = re.compile(
+        '|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True)),
+        re.IGNORECASE
+    )
+    parts = []
+    last = 0
+    for match in pattern.finditer(segment):
+        parts.append(html.escape(segment[last:match.start()]))
+        parts.append(f'<mark>{html.escape(match.group())}</mark>')
+        last = match.end()
+    parts.append(html.escape(segment[last:]))
+
+    return ('…' if start > 0 else '') + ''.join(parts) + ('…' if end < len(text) else '')
+
+
+class SearchIndex:
+    """跨聊天的全文搜索索引，按 (CreateTime, MesLocalID) 高水位增量更新"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 每个 sidecar 文件一把写锁，避免同一进程内重复索引同一张表
+        self._write_locks: Dict[str, threading.Lock] = {}
+        # 进行中的后台索引任务 {(documents_path, user_md5): Future}
+        self._refreshing: Dict[Tuple[str, str], Future] = {}
+
+    def _connect(self, documents_path: str, user_md5: str) -> sqlite3.Connection:
+        """打开（必要时创建）账号的 sidecar 数据库"""
+        return open_sidecar_db(
+            documents_path, user_md5, SEARCH_DB_FILE, SCHEMA_SQL, SCHEMA_VERSION, DROP_SQL
+        )
+
+    def _write_lock(self, documents_path: str, user_md5: str) -> threading.Lock:
+        """获取账号 sidecar 的写锁"""
+        key = f'{documents_path}\0{user_md5}'
+        with self._lock:
+            return self._write_locks.setdefault(key, threading.Lock())
+
+    def _plan(
+        self,
+        store: sqlite3.Connection,
+        documents_path: str,
+        user_md5: str
+    ) -> Tuple[Dict[str, Tuple[int, FileSignature, Optional[sqlite3.Row]]], List[str]]:
+        """
+        比较源数据库文件签名和已索引的状态，找出需要刷新的表
+
+        Returns:
+            ({需要刷新的表名: (数据库索引, 文件签名, 已索引状态)}, [源数据库中已不存在的表名])
+        """
+        locations = table_locator.locations(documents_path, user_md5)
+        signatures = {
+            db_index: get_file_signature(get_db_path(documents_path, user_md5, f'message_{db_index}.sqlite'))
+            for db_index in set(locations.values())
+        }
+        states = {row['table_name']: row for row in store.execute('SELECT * FROM table_state')}
+
+        pending = {}
+        for table_name, db_index in locations.items():
+            signature = signatures[db_index]
+            state = states.get(table_name)
+            if signature is None or (
+                state and state['db_index'] == db_index
+                and (state['mtime_ns'], state['size']) == signature
+            ):
+                continue
+            pending[table_name] = (db_index, signature, state)
+
+        return pending, list(states.keys() - locations.keys())
+
+    def refresh(self, documents_path: str, user_md5: str) -> int:
+        """
+        增量索引账号下所有聊天表（源数据库文件未变化的表直接跳过）
+
+        会用 jieba 分词，Web 服务中请通过 refresh_in_background 在后台索引进程池中执行
+
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+
+        Returns:
+            本次新索引的消息数
+        """
+        indexed = 0
+        with self._write_lock(documents_path, user_md5):
+            store = self._connect(documents_path, user_md5)
+            try:
+                pending, removed = self._plan(store, documents_path, user_md5)
+                for table_name, (db_index, signature, state) in pending.items():
+                    indexed += self._refresh_table(
+                        store, documents_path, user_md5, table_name, db_index, signature, state
+                    )
+
+                if removed:
+                    store.execute('BEGIN IMMEDIATE')
+                    for table_name in removed:
+                        self._clear_table(store, table_name)
+                        store.execute('DELETE FROM table_state WHERE table_name = ?', (table_name,))
+                    store.commit()
+            finally:
+                store.close()
+
+        return indexed
+
+    def refresh_in_background(self, documents_path: str, user_md5: str) -> Future:
+        """
+        在后台索引进程池中增量索引账号（同一账号同时只有一个后台索引任务）
+
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+
+        Returns:
+            索引任务的 Future（已有进行中的任务时返回该任务），结果为新索引的消息数
+        """
+        key = (str(documents_path), user_md5)
+        with self._lock:
+            future = self._refreshing.get(key)
+            if future is not None:
+                return future
+            future = index_pool.submit('search_index', documents_path, user_md5)
+            self._refreshing[key] = future
+        # 在锁外注册（任务已完成时回调会立即在当前线程执行）
+        future.add_done_callback(lambda done: self._on_refreshed(key, done))
+        return future
+
+    def _on_refreshed(self, key: Tuple[str, str], future: Future):
+        """后台索引任务结束：移除记录，失败时输出日志（下次搜索时重新提交）"""
+        with self._lock:
+            if self._refreshing.get(key) is future:
+                del self._refreshing[key]
+        if not future.cancelled() and future.exception() is not None:
+            print(f'搜索索引更新失败: {future.exception()}')
+
+    def is_refreshing(self, documents_path: str, user_md5: str) -> bool:
+        """账号是否有进行中的后台索引任务"""
+        with self._lock:
+            return (str(documents_path), user_md5) in self._refreshing
+
+    def _refresh_table(
+        self,
+        store: sqlite3.Connection,
+        documents_path: str,
+        user_md5: str,
+        table_name: str,
+        db_index: int,
+        signature: FileSignature,
+        state: Optional[sqlite3.Row]
+    ) -> int:
+        """
+        索引一张表在高水位之后的文本消息
+
+        每批写入后连同高水位一起提交，中断后下次从已提交的高水位继续；
+        表换了数据库、最新消息早于高水位或源表行数与已索引的行数加新增行数不符
+        （消息被删除或备份被替换）时整表重建
+
+        Returns:
+            新索引的消息数
+        """
+        # 已提交的高水位（用于发现其他进程同时在索引同一张表）
+        committed = (state['max_create_time'], state['max_local_id']) if state else None
+        if state and state['db_index'] == db_index:
+            high_water, row_count = committed, state['row_count']
+        else:
+            high_water, row_count = (0, 0), 0
+
+        db_name = f'message_{db_index}.sqlite'
+        with connection_pool.connection(documents_path, user_md5, db_name) as conn:
+            if not conn:
+                return 0
+
+            last = conn.execute(SOURCE_LAST_SQL.format(table_name=table_name)).fetchone()
+            source_max = (last['CreateTime'], last['MesLocalID']) if last else (0, 0)
+            source = conn.execute(SOURCE_COUNT_SQL.format(table_name=table_name), high_water).fetchone()
+
+            rebuild = state is not None and (
+                high_water == (0, 0) or source_max < high_water
+                or row_count + (source['newRows'] or 0) != source['rowCount']
+            )
+            if rebuild:
+                high_water, row_count = (0, 0), 0
+            start_time = high_water[0]
+
+            cursor = conn.execute(
+                SOURCE_TEXT_SQL.format(table_name=table_name, text_type=TEXT_MESSAGE_TYPE),
+                high_water + source_max
+            )
+            batches = self._iter_text_batches(cursor)
+
+            # 首次建索引且消息较多时在进程池中并行分词，按顺序写入
+            if (segment_pool.enabled and high_water == (0, 0)
+                    and self._count_text(conn, table_name) >= PARALLEL_MIN_MESSAGES):
+                results = segment_pool.map_ordered(tokenize_for_search, batches)
+            else:
+                results = ((context, tokenize_for_search(texts)) for context, texts in batches)
+
+            indexed = 0
+            for rows, token_lists in results:
+                if not rows:
+                    continue
+                batch_end = (rows[-1][1], rows[-1][0])
+                # 本批覆盖的源表行数（所有类型）
+                row_count += conn.execute(
+                    SOURCE_RANGE_COUNT_SQL.format(table_name=table_name), high_water + batch_end
+                ).fetchone()[0]
+
+                if not self._begin_write(store, table_name, committed):
+                    return indexed
+                if rebuild:
+                    self._clear_table(store, table_name)
+                    rebuild = False
+
+                store.executemany("""
+                    INSERT INTO message_fts
+                        (tokens, text, table_name, mes_local_id, create_time, sender_id)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, [
+                    (tokens, text, table_name, mes_local_id, create_time, sender_id)
+                    for (mes_local_id, create_time, sender_id, text), tokens in zip(rows, token_lists)
+                ])
+                high_water = batch_end
+                self._save_state(store, table_name, db_index, high_water, row_count, None)
+                store.commit()
+                committed = high_water
+                indexed += len(rows)
+
+        if not self._begin_write(store, table_name, committed):
+            return indexed
+        if rebuild:
+            # 源表已没有文本消息
+            self._clear_table(store, table_name)
+        # 最新一条消息之前的消息都已读取，高水位移到最新一条消息
+        self._save_state(store, table_name, db_index, source_max, source['rowCount'], signature)
+        store.commit()
+
+        if indexed:
+            print(f'搜索索引已更新: {table_name}（CreateTime >= {start_time}，{indexed} 条文本消息）')
+        return indexed
+
+    @staticmethod
+    def _count_text(conn: sqlite3.Connection, table_name: str) -> int:
+        """表中文本消息数"""
+        return conn.execute(
+            f'SELECT COUNT(*) FROM "{table_name}" WHERE Type = {TEXT_MESSAGE_TYPE}'
+        ).fetchone()[0]
+
+    def _begin_write(
+        self,
+        store: sqlite3.Connection,
+        table_name: str,
+        committed: Optional[Tuple[int, int]]
+    ) -> bool:
+        """
+        开始写事务，并确认高水位仍是本进程上次提交的值
+
+        其他进程同时在索引同一张表时放弃写入，避免重复索引
+
+        Returns:
+            是否可以继续写入（False 时事务已回滚）
+        """
+        store.execute('BEGIN IMMEDIATE')
+        row = store.execute(
+            'SELECT max_create_time, max_local_id FROM table_state WHERE table_name = ?', (table_name,)
+        ).fetchone()
+        if (tuple(row) if row else None) != committed:
+            store.rollback()
+            print(f'搜索索引 {table_name} 正由其他进程更新，跳过')
+            return False
+        return True
+
+    def _save_state(
+        self,
+        store: sqlite3.Connection,
+        table_name: str,
+        db_index: int,
+        high_water: Tuple[int, int],
+        row_count: int,
+        signature: Optional[FileSignature]
+    ):
+        """写入表的索引进度（signature 为 None 表示尚未完成，下次访问会继续索引）"""
+        mtime_ns, size = signature if signature else (None, None)
+        store.execute("""
+            INSERT OR REPLACE INTO table_state
+                (table_name, db_index, max_create_time, max_local_id, row_count, mtime_ns, size)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (table_name, db_index, high_water[0], high_water[1], row_count, mtime_ns, size))
+
+    def _iter_text_batches(
+        self,
+        cursor: sqlite3.Cursor
+    ) -> Iterator[Tuple[List[Tuple[int, int, Optional[str], str]], List[str]]]:
+        """按 fetchmany 分批产出 ([(MesLocalID, CreateTime, 发送者, 正文), ...], [正文, ...])"""
+        while True:
+            rows = cursor.fetchmany(settings.message_chunk_size)
+            if not rows:
+                break
+
+            messages = []
+            for row in rows:
+                message = decode_message(row['Message'])
+                if not message:
+                    continue
+                sender_id, text = split_sender(message)
+                messages.append((row['MesLocalID'], row['CreateTime'] or 0, sender_id, text))
+
+            yield messages, [message[3] for message in messages]
+
+    def _clear_table(self, store: sqlite3.Connection, table_name: str):
+        """删除表的全部索引数据"""
+        store.execute('DELETE FROM message_fts WHERE table_name = ?', (table_name,))
+
+    def search(
+        self,
+        documents_path: str,
+        user_md5: str,
+        query: str,
+        limit: int = 20,
+        offset: int = 0,
+        table_name: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        搜索所有聊天的文本消息
+
+        索引不是最新时在后台索引进程池中更新，本次只搜索已索引的消息（indexing 为 True）
+
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+            query: 搜索语句
+            limit: 返回条数
+            offset: 跳过条数
+            table_name: 只搜索指定聊天表
+
+        Returns:
+            {'query', 'terms', 'total', 'indexing', 'pendingTables', 'hits': [{tableName, chat,
+            mesLocalId, createTime, sender, snippet, score}, ...]}，按相关度排序；
+            indexing 表示索引正在后台更新，pendingTables 为尚未索引到最新的表数
+        """
+        terms = parse_query(query)
+        result: Dict[str, Any] = {
+            'query': query, 'terms': terms, 'total': 0, 'indexing': False, 'pendingTables': 0, 'hits': [],
+        }
+        if not terms:
+            return result
+
+        match = ' '.join('"{}"'.format(term.replace('"', '""')) for term in terms)
+        condition = 'AND table_name = ?' if table_name else ''
+        params: list = [match] + ([table_name] if table_name else [])
+
+        store = self._connect(documents_path, user_md5)
+        try:
+            pending, removed = self._plan(store, documents_path, user_md5)
+            if pending or removed:
+                self.refresh_in_background(documents_path, user_md5)
+            result['pendingTables'] = len(pending)
+            result['indexing'] = self.is_refreshing(documents_path, user_md5)
+
+            result['total'] = store.execute(
+                f'SELECT COUNT(*) FROM message_fts WHERE message_fts MATCH ? {condition}', params
+            ).fetchone()[0]
+            rows = store.execute(f"""
+                SELECT table_name, mes_local_id, create_time, sender_id, text,
+                       bm25(message_fts) AS score
+                FROM message_fts
+                WHERE message_fts MATCH ? {condition}
+                ORDER BY score
+                LIMIT ? OFFSET ?
+            """, params + [limit, offset]).fetchall()
+        finally:
+            store.close()
+
+        contacts = contact_directory.get(documents_path, user_md5)
+        for row in rows:
+            chatter_md5 = row['table_name'].split('_', 1)[-1]
+            sender_id = row['sender_id']
+            result['hits'].append({
+                'tableName': row['table_name'],
+                'chat': contacts.chat_contact(chatter_md5).model_dump(by_alias=True),
+                'mesLocalId': row['mes_local_id'],
+                'createTime': row['create_time'],
+                'sender': sender_resolver.resolve(contacts, sender_id) if sender_id else None,
+                'snippet': make_snippet(row['text'], terms),
+                # bm25 越小越相关，取负数使分数越大越相关
+                'score': round(-row['score'], 4),
+            })
+
+        return result
+
+
+# 全局搜索索引实例
+search_index = SearchIndex()
@@ -0,0 +1,74 @@
+"""群聊发送者解析（拆分 "wxid:\\n内容" 前缀，按发送者 ID 缓存显示名称）"""
+from typing import Any, Dict, Optional, Tuple
+
+from app.config import settings
+from app.services.contact_directory import ContactDirectory
+from app.utils.lru_cache import LRUCache
+
+
+def split_sender(message_text: str) -> Tuple[Optional[str], str]:
+    """
+    拆分群聊消息的发送者前缀（"wxid_xxx:\\n内容"）
+
+    Args:
+        message_text: 消息内容
+
+    Returns:
+        (发送者 ID, 正文)，没有发送者前缀时发送者为 None
+    """
+    if ':\n' in message_text:
+        sender_id, content = message_text.split(':\n', 1)
+        return sender_id.strip(), content
+    return None, message_text
+
+
+class SenderResolver:
+    """发送者 ID → 显示名称的解析器（有界 LRU，键包含联系人目录版本，联系人更新后自动失效）"""
+
+    def __init__(self, max_size: Optional[int] = None):
+        self._cache = LRUCache(settings.sender_cache_size if max_size is None else max_size)
+
+    def resolve(self, contacts: ContactDirectory, sender_id: str) -> str:
+        """
+        解析发送者显示名称
+
+        Args:
+            contacts: 联系人目录
+            sender_id: 发送者微信号
+
+        Returns:
+            显示名称（备注 > 昵称 > 微信号，都没有时为友好名称）
+        """
+        if contacts.version is None:
+            return contacts.sender_name(sender_id)
+
+        key = (contacts.version, sender_id)
+        sender_name = self._cache.get(key)
+        if sender_name is None:
+            sender_name = contacts.sender_name(sender_id)
+            self._cache.put(key, sender_name)
+        return sender_name
+
+    def parse(self, contacts: ContactDirectory, message_text: str) -> Tuple[Optional[str], str]:
+        """
+        拆分群聊消息并解析发送者
+
+        Args:
+            contacts: 联系人目录
+            message_text: 消息内容
+
+        Returns:
+            (发送者显示名称, 正文)，没有发送者前缀时发送者为 None
+        """
+        sender_id, content = split_sender(message_text)
+        if sender_id is None:
+            return None, content
+        return self.resolve(contacts, sender_id), content
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计数据（见 LRUCache.stats）"""
+        return self._cache.stats()
+
+
+# 全局发送者解析实例
+sender_resolver = SenderResolver()
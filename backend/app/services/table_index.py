@@ -0,0 +1,124 @@
+"""聊天表位置索引：记录每个 Chat_ 表位于哪个 message_N.sqlite"""
+import threading
+from typing import Dict, Optional, Tuple
+
+from app.services.db_pool import FileSignature, connection_pool, get_db_path, get_file_signature
+
+# 消息数据库数量（message_1.sqlite ~ message_4.sqlite）
+MESSAGE_DB_COUNT = 4
+
+# 查询所有聊天表
+CHAT_TABLES_SQL = """
+    SELECT name FROM SQLITE_MASTER
+    WHERE type = 'table'
+    AND (name LIKE 'Chat/_%' ESCAPE '/' OR name LIKE 'ChatExt2/_%' ESCAPE '/')
+"""
+
+# 四个消息数据库的文件签名，任一变化即视为索引过期
+DataVersion = Tuple[Optional[FileSignature], ...]
+
+
+def get_message_db_version(documents_path: str, user_md5: str) -> DataVersion:
+    """
+    获取消息数据库的数据版本（各 message_N.sqlite 的 mtime/size）
+
+    Args:
+        documents_path: 微信数据目录路径
+        user_md5: 用户 MD5
+
+    Returns:
+        文件签名元组，不存在的文件为 None
+    """
+    return tuple(
+        get_file_signature(get_db_path(documents_path, user_md5, f'message_{i}.sqlite'))
+        for i in range(1, MESSAGE_DB_COUNT + 1)
+    )
+
+
+class TableLocator:
+    """表名 → 数据库索引的缓存（按账号，数据库文件变化后自动失效）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # {(documents_path, user_md5): (数据版本, {表名: 数据库索引})}
+        self._entries: Dict[Tuple[str, str], Tuple[DataVersion, Dict[str, int]]] = {}
+
+    def update(
+        self,
+        documents_path: str,
+        user_md5: str,
+        version: DataVersion,
+        locations: Dict[str, int]
+    ):
+        """
+        写入完整的位置索引（通常来自 get_chat_tables 的全量扫描）
+
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+            version: 扫描开始前的数据版本
+            locations: {表名: 数据库索引}
+        """
+        with self._lock:
+            self._entries[(str(documents_path), user_md5)] = (version, dict(locations))
+
+    def locate(self, documents_path: str, user_md5: str, table_name: str) -> Optional[int]:
+        """
+        查找聊天表所在的数据库
+
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+            table_name: 表名
+
+        Returns:
+            数据库索引（1-4），表不存在返回 None
+        """
+        return self.locations(documents_path, user_md5).get(table_name)
+
+    def locations(self, documents_path: str, user_md5: str) -> Dict[str, int]:
+        """
+        获取账号所有聊天表的位置（数据库文件变化后重新扫描）
+
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+
+        Returns:
+            {表名: 数据库索引}（调用方不应修改）
+        """
+        key = (str(documents_path), user_md5)
+        version = get_message_db_version(documents_path, user_md5)
+
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or entry[0] != version:
+            locations = self._scan(documents_path, user_md5)
+            self.update(documents_path, user_md5, version, locations)
+            return locations
+        return entry[1]
+
+    def _scan(self, documents_path: str, user_md5: str) -> Dict[str, int]:
+        """扫描所有消息数据库的表名（每个数据库一次查询）"""
+        locations: Dict[str, int] = {}
+
+        for i in range(1, MESSAGE_DB_COUNT + 1):
+            with connection_pool.connection(documents_path, user_md5, f'message_{i}.sqlite') as conn:
+                if not conn:
+                    continue
+                try:
+                    for row in conn.execute(CHAT_TABLES_SQL):
+                        locations.setdefault(row['name'], i)
+                except Exception as e:
+                    print(f'扫描 message_{i}.sqlite 表名失败: {e}')
+
+        return locations
+
+    def invalidate(self, documents_path: str, user_md5: str):
+        """清除某个账号的位置索引"""
+        with self._lock:
+            self._entries.pop((str(documents_path), user_md5), None)
+
+
+# 全局位置索引实例
+table_locator = TableLocator()
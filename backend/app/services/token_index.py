@@ -0,0 +1,403 @@
+"""预分词索引（每个账号一个 SQLite sidecar 文件）
+
+文本消息只在首次入库时用 jieba 分词一次，之后任意日期范围的词频都由按天汇总的词频合并得到。
+"""
+import sqlite3
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.config import settings
+from app.services.analyzers import TEXT_MESSAGE_TYPE, segment_texts
+from app.services.database import DAY_BUCKET_SQL, decode_message
+from app.services.db_pool import FileSignature, connection_pool, get_db_path, get_file_signature
+from app.services.segment_pool import PARALLEL_MIN_MESSAGES, segment_pool
+from app.services.sender_resolver import split_sender
+from app.services.table_index import table_locator
+from app.utils.storage import open_sidecar_db
+
+TOKEN_DB_FILE = 'tokens.sqlite'
+# sidecar 结构版本，结构或分词规则（停用词、过滤条件）变化时递增以重建
+SCHEMA_VERSION = 2
+
+SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS message_tokens (
+        table_name TEXT NOT NULL,
+        message_id INTEGER NOT NULL,  -- MesLocalID
+        day TEXT NOT NULL,            -- 本地日期 YYYY-MM-DD，CreateTime 为空时为 ''
+        tokens TEXT NOT NULL,         -- 过滤后的词，空格分隔
+        PRIMARY KEY (table_name, message_id)
+    );
+    CREATE TABLE IF NOT EXISTS day_token_counts (
+        table_name TEXT NOT NULL,
+        day TEXT NOT NULL,
+        token TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (table_name, day, token)
+    );
+    CREATE TABLE IF NOT EXISTS table_state (
+        table_name TEXT PRIMARY KEY,
+        db_index INTEGER NOT NULL,
+        max_row_id INTEGER NOT NULL,  -- 已分词的最大 rowid（高水位）
+        row_count INTEGER NOT NULL,   -- 源表中 rowid 不超过高水位的行数（所有类型，与源表不符时整表重建）
+        latest_day TEXT,              -- 源表最新一条消息的日期（所有类型）
+        mtime_ns INTEGER,             -- 上次刷新时源数据库文件的签名
+        size INTEGER
+    );
+"""
+
+DROP_SQL = """
+    DROP TABLE IF EXISTS message_tokens;
+    DROP TABLE IF EXISTS day_token_counts;
+    DROP TABLE IF EXISTS table_state;
+"""
+
+# _index_messages 与其他进程冲突时返回的高水位标记
+_CONFLICT = object()
+
+# 源表的最大 rowid、最新时间、总行数和高水位之后的行数
+SOURCE_STATE_SQL = """
+    SELECT MAX(rowid) AS maxRowId, MAX(CreateTime) AS maxTime, COUNT(*) AS rowCount, SUM(rowid > ?) AS newRows
+    FROM "{table_name}"
+"""
+
+# 读取 rowid 大于高水位的文本消息
+SOURCE_TEXT_SQL = """
+    SELECT rowid AS row_id, MesLocalID, {day_bucket} AS day, Message
+    FROM "{table_name}"
+    WHERE rowid > ? AND Type = {text_type}
+    ORDER BY rowid
+"""
+
+
+class TokenIndex:
+    """按 (表, 日期, 词) 汇总的预分词词频，按 rowid 高水位增量更新"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 每个 sidecar 文件一把写锁，避免同一进程内重复分词同一张表
+        self._write_locks: Dict[str, threading.Lock] = {}
+
+    def _connect(self, documents_path: str, user_md5: str) -> sqlite3.Connection:
+        """打开（必要时创建）账号的 sidecar 数据库"""
+        return open_sidecar_db(
+            documents_path, user_md5, TOKEN_DB_FILE, SCHEMA_SQL, SCHEMA_VERSION, DROP_SQL
+        )
+
+    def _write_lock(self, documents_path: str, user_md5: str) -> threading.Lock:
+        """获取账号 sidecar 的写锁"""
+        key = f'{documents_path}\0{user_md5}'
+        with self._lock:
+            return self._write_locks.setdefault(key, threading.Lock())
+
+    def refresh_table(self, documents_path: str, user_md5: str, table_name: str) -> bool:
+        """
+        对源表中新增的文本消息分词并写入索引
+
+        源数据库文件未变化时直接返回；rowid 高水位回退或源表行数与已索引的行数加新增行数不符
+        （消息被删除或备份被替换）时整表重建
+
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+            table_name: 表名
+
+        Returns:
+            表是否存在
+        """
+        db_index = table_locator.locate(documents_path, user_md5, table_name)
+        if db_index is None:
+            return False
+
+        db_name = f'message_{db_index}.sqlite'
+        signature = get_file_signature(get_db_path(documents_path, user_md5, db_name))
+        if signature is None:
+            return False
+
+        with self._write_lock(documents_path, user_md5):
+            store = self._connect(documents_path, user_md5)
+            try:
+                state = store.execute(
+                    'SELECT * FROM table_state WHERE table_name = ?', (table_name,)
+                ).fetchone()
+
+                if (state and state['db_index'] == db_index
+                        and (state['mtime_ns'], state['size']) == signature):
+                    return True
+
+                # 已提交的高水位（用于发现其他进程同时在索引同一张表）
+                committed = state['max_row_id'] if state else None
+                if state and state['db_index'] == db_index:
+                    high_water, row_count = committed, state['row_count']
+                else:
+                    high_water, row_count = 0, 0
+
+                with connection_pool.connection(documents_path, user_md5, db_name) as conn:
+                    if not conn:
+                        return False
+
+                    row = conn.execute(
+                        SOURCE_STATE_SQL.format(table_name=table_name), (high_water,)
+                    ).fetchone()
+                    source_max = row['maxRowId'] or 0
+                    source_count = row['rowCount']
+                    latest_day = (
+                        datetime.fromtimestamp(row['maxTime']).strftime('%Y-%m-%d')
+                        if row['maxTime'] else None
+                    )
+
+                    # 首次构建、数据回退或有消息被删除：整表重建
+                    rebuild = (source_max < high_water or high_water == 0
+                               or row_count + (row['newRows'] or 0) != source_count)
+                    if rebuild:
+                        high_water = row_count = 0
+
+                    indexed = 0
+                    if source_max > high_water:
+                        indexed, committed = self._index_messages(
+                            store, conn, table_name, db_index, latest_day,
+                            high_water, row_count, source_max - high_water, committed, rebuild
+                        )
+                        if committed is _CONFLICT:
+                            return True
+
+                if not self._begin_write(store, table_name, committed):
+                    return True
+                if rebuild and not indexed:
+                    # 源表已清空或不再有文本消息
+                    self._clear_table(store, table_name)
+                self._save_state(store, table_name, db_index, source_max, source_count, latest_day, signature)
+                store.commit()
+
+                if indexed:
+                    print(f'分词索引已更新: {table_name}（rowid > {high_water}，{indexed} 条文本消息）')
+                return True
+            finally:
+                store.close()
+
+    def _begin_write(
+        self,
+        store: sqlite3.Connection,
+        table_name: str,
+        committed: Optional[int]
+    ) -> bool:
+        """
+        开始写事务，并确认高水位仍是本进程上次提交的值
+
+        其他进程（如批量词云任务）同时在索引同一张表时放弃写入，避免重复计数
+
+        Returns:
+            是否可以继续写入（False 时事务已回滚）
+        """
+        store.execute('BEGIN IMMEDIATE')
+        row = store.execute(
+            'SELECT max_row_id FROM table_state WHERE table_name = ?', (table_name,)
+        ).fetchone()
+        if (row['max_row_id'] if row else None) != committed:
+            store.rollback()
+            print(f'分词索引 {table_name} 正由其他进程更新，跳过')
+            return False
+        return True
+
+    def _clear_table(self, store: sqlite3.Connection, table_name: str):
+        """删除表的全部索引数据"""
+        store.execute('DELETE FROM message_tokens WHERE table_name = ?', (table_name,))
+        store.execute('DELETE FROM day_token_counts WHERE table_name = ?', (table_name,))
+
+    def _save_state(
+        self,
+        store: sqlite3.Connection,
+        table_name: str,
+        db_index: int,
+        max_row_id: int,
+        row_count: int,
+        latest_day: Optional[str],
+        signature: Optional[FileSignature]
+    ):
+        """写入表的索引进度（signature 为 None 表示尚未完成，下次访问会继续索引）"""
+        mtime_ns, size = signature if signature else (None, None)
+        store.execute("""
+            INSERT OR REPLACE INTO table_state
+                (table_name, db_index, max_row_id, row_count, latest_day, mtime_ns, size)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (table_name, db_index, max_row_id, row_count, latest_day, mtime_ns, size))
+
+    def _index_messages(
+        self,
+        store: sqlite3.Connection,
+        conn: sqlite3.Connection,
+        table_name: str,
+        db_index: int,
+        latest_day: Optional[str],
+        high_water: int,
+        row_count: int,
+        expected: int,
+        committed: Optional[int],
+        rebuild: bool
+    ) -> Tuple[int, Any]:
+        """
+        分批读取新增文本消息、分词并写入索引
+
+        待分词消息较多且启用多进程时，各批次在进程池中并行分词，按顺序写入。
+        每批写入后连同高水位一起提交：写锁只在写入时短暂持有（多个进程可同时建索引），
+        中断后下次从已提交的高水位继续（同时提交源表中 rowid 不超过该高水位的行数 row_count）
+
+        Returns:
+            (写入的消息数, 最后提交的高水位)，与其他进程冲突时高水位为 _CONFLICT
+        """
+        cursor = conn.execute(
+            SOURCE_TEXT_SQL.format(
+                table_name=table_name,
+                day_bucket=DAY_BUCKET_SQL,
+                text_type=TEXT_MESSAGE_TYPE
+            ),
+            (high_water,)
+        )
+        batches = self._iter_text_batches(cursor)
+
+        if segment_pool.enabled and expected >= PARALLEL_MIN_MESSAGES:
+            results = segment_pool.map_ordered(segment_texts, batches)
+        else:
+            results = ((context, segment_texts(texts)) for context, texts in batches)
+
+        indexed = 0
+        batch_start = high_water
+        for (last_row_id, keys), token_lists in results:
+            # 本批覆盖的源表行数（所有类型）
+            row_count += conn.execute(
+                f'SELECT COUNT(*) FROM "{table_name}" WHERE rowid > ? AND rowid <= ?',
+                (batch_start, last_row_id)
+            ).fetchone()[0]
+            batch_start = last_row_id
+
+            message_rows = []
+            day_counts: Dict[str, Counter] = defaultdict(Counter)
+            for (message_id, day), tokens in zip(keys, token_lists):
+                message_rows.append((table_name, message_id, day, ' '.join(tokens)))
+                day_counts[day].update(tokens)
+
+            if not self._begin_write(store, table_name, committed):
+                return indexed, _CONFLICT
+            if rebuild:
+                self._clear_table(store, table_name)
+                rebuild = False
+
+            store.executemany("""
+                INSERT OR REPLACE INTO message_tokens (table_name, message_id, day, tokens)
+                VALUES (?, ?, ?, ?)
+            """, message_rows)
+            store.executemany("""
+                INSERT INTO day_token_counts (table_name, day, token, count)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (table_name, day, token)
+                DO UPDATE SET count = count + excluded.count
+            """, [
+                (table_name, day, token, count)
+                for day, counter in day_counts.items()
+                for token, count in counter.items()
+            ])
+            self._save_state(store, table_name, db_index, last_row_id, row_count, latest_day, None)
+            store.commit()
+            committed = last_row_id
+            indexed += len(message_rows)
+
+        return indexed, committed
+
+    def _iter_text_batches(
+        self,
+        cursor: sqlite3.Cursor
+    ) -> Iterator[Tuple[Tuple[int, List[Tuple[int, str]]], List[str]]]:
+        """按 fetchmany 分批产出 ((本批最大 rowid, [(MesLocalID, 日期), ...]), [去掉发送者前缀的正文, ...])"""
+        while True:
+            rows = cursor.fetchmany(settings.message_chunk_size)
+            if not rows:
+                break
+
+            keys = []
+            texts = []
+            for row in rows:
+                message = decode_message(row['Message'])
+                if not message:
+                    continue
+
+                # 如果是群聊消息，去掉发送者部分
+                _, text = split_sender(message)
+                keys.append((row['MesLocalID'], row['day']))
+                texts.append(text)
+
+            yield (rows[-1]['row_id'], keys), texts
+
+    def get_word_counts(
+        self,
+        documents_path: str,
+        user_md5: str,
+        table_name: str,
+        top_n: int = 100,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> List[Tuple[str, int]]:
+        """
+        合并日期范围内的词频（先增量刷新）
+
+        未指定日期时与 get_messages 一致，只统计最新一天
+
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+            table_name: 表名
+            top_n: 返回前 N 个高频词
+            start_date: 开始日期（YYYY-MM-DD）
+            end_date: 结束日期（YYYY-MM-DD）
+
+        Returns:
+            [(词, 次数), ...]，按次数降序
+        """
+        if not self.refresh_table(documents_path, user_md5, table_name):
+            return []
+
+        store = self._connect(documents_path, user_md5)
+        try:
+            condition, params = self._day_condition(store, table_name, start_date, end_date)
+            rows = store.execute(f"""
+                SELECT token, SUM(count) AS count FROM day_token_counts
+                WHERE table_name = ? {condition}
+                GROUP BY token
+                ORDER BY count DESC, token
+                LIMIT ?
+            """, [table_name] + params + [top_n]).fetchall()
+        finally:
+            store.close()
+
+        return [(row['token'], row['count']) for row in rows]
+
+    def _day_condition(
+        self,
+        store: sqlite3.Connection,
+        table_name: str,
+        start_date: Optional[str],
+        end_date: Optional[str]
+    ) -> Tuple[str, list]:
+        """构建按本地日期筛选的条件"""
+        if start_date or end_date:
+            condition = "AND day <> ''"
+            params: list = []
+            if start_date:
+                condition += ' AND day >= ?'
+                params.append(start_date)
+            if end_date:
+                condition += ' AND day <= ?'
+                params.append(end_date)
+            return condition, params
+
+        # 默认只统计最新一天（以所有类型消息中的最新日期为准）
+        row = store.execute(
+            'SELECT latest_day FROM table_state WHERE table_name = ?', (table_name,)
+        ).fetchone()
+        if row is None or row['latest_day'] is None:
+            return '', []
+        return 'AND day >= ?', [row['latest_day']]
+
+
+# 全局预分词索引实例
+token_index = TokenIndex()
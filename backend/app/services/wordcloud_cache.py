@@ -0,0 +1,105 @@
+"""词云图片缓存（内存 LRU + 每个账号的磁盘缓存目录）"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.config import settings
+from app.utils.lru_cache import LRUCache
+from app.utils.storage import get_account_cache_dir
+
+# 磁盘缓存子目录
+WORDCLOUD_CACHE_DIR = 'wordclouds'
+
+
+def make_cache_key(params: Dict[str, Any]) -> str:
+    """
+    由渲染参数和数据版本计算内容寻址的缓存键（同时用作 ETag）
+
+    Args:
+        params: 可 JSON 序列化的参数字典
+
+    Returns:
+        sha256 十六进制字符串
+    """
+    payload = json.dumps(params, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class WordCloudCache:
+    """按 (缓存键, 图片规格) 保存渲染好的图片字节"""
+
+    def __init__(self, max_size: Optional[int] = None):
+        self._memory = LRUCache(settings.wordcloud_cache_size if max_size is None else max_size)
+
+    def _disk_path(self, documents_path: str, user_md5: str, key: str, variant: str) -> Path:
+        return get_account_cache_dir(documents_path, user_md5) / WORDCLOUD_CACHE_DIR / f'{key}.{variant}'
+
+    def get(self, documents_path: str, user_md5: str, key: str, variant: str = '1x.png') -> Optional[bytes]:
+        """
+        读取缓存：先查内存，再查磁盘（命中后放回内存）
+
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+            key: 缓存键
+            variant: 图片规格（倍率和格式，如 1x.png、2x.webp）
+
+        Returns:
+            图片字节，未命中返回 None
+        """
+        data = self._memory.get((key, variant))
+        if data is not None:
+            return data
+
+        path = self._disk_path(documents_path, user_md5, key, variant)
+        try:
+            data = path.read_bytes()
+        except OSError:
+            return None
+
+        self._memory.put((key, variant), data)
+        return data
+
+    def put(self, documents_path: str, user_md5: str, key: str, data: bytes, variant: str = '1x.png'):
+        """
+        写入内存和磁盘缓存，磁盘文件超出上限时删除最旧的
+
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+            key: 缓存键
+            data: 图片字节
+            variant: 图片规格（倍率和格式，如 1x.png、2x.webp）
+        """
+        self._memory.put((key, variant), data)
+
+        path = self._disk_path(documents_path, user_md5, key, variant)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+            self._prune(path.parent)
+        except OSError as e:
+            print(f'写入词云缓存失败: {e}')
+
+    def _prune(self, cache_dir: Path):
+        """磁盘缓存超过 settings.wordcloud_disk_cache_size 时按修改时间删除最旧的文件"""
+        files = [f for f in cache_dir.iterdir() if not f.name.endswith('.tmp')]
+        excess = len(files) - settings.wordcloud_disk_cache_size
+        if excess <= 0:
+            return
+
+        files.sort(key=lambda f: f.stat().st_mtime_ns)
+        for f in files[:excess]:
+            f.unlink(missing_ok=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """内存缓存统计数据（见 LRUCache.stats）"""
+        return self._memory.stats()
+
+
+# 全局词云缓存实例
+wordcloud_cache = WordCloudCache()
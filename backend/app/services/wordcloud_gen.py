@@ -1,15 +1,46 @@
 """词云生成服务"""
 import io
 import base64
-from typing import Optional
-from PIL import Image
-from wordcloud import WordCloud
-import matplotlib
-matplotlib.use('Agg')  # 使用非交互式后端
+from typing import Any, Dict, List, Optional, Tuple
 
 from app.services.analytics import WeChatAnalytics
+from app.services.db_pool import get_db_path, get_file_signature
+from app.services.table_index import table_locator
+from app.services.wordcloud_cache import make_cache_key, wordcloud_cache
 from app.config import settings
 
+# 缓存键版本，渲染逻辑变化时递增以废弃旧缓存
+WORDCLOUD_CACHE_VERSION = 1
+
+# 支持的图片格式：{格式: (媒体类型, PIL 格式名)}
+IMAGE_FORMATS = {
+    'png': ('image/png', 'PNG'),
+    'webp': ('image/webp', 'WEBP'),
+}
+
+
+def get_render_scales() -> List[int]:
+    """解析 settings.wordcloud_render_scales（如 "1,2"）"""
+    scales = []
+    for item in settings.wordcloud_render_scales.split(','):
+        item = item.strip()
+        if item.isdigit() and int(item) > 0:
+            scales.append(int(item))
+    return scales or [1]
+
+
+def _load_wordcloud():
+    """
+    延迟导入 wordcloud（连带 matplotlib、numpy、PIL），避免拖慢应用启动
+
+    Returns:
+        WordCloud 类
+    """
+    import matplotlib
+    matplotlib.use('Agg')  # 使用非交互式后端
+    from wordcloud import WordCloud
+    return WordCloud
+
 
 class WeChatWordCloud:
     """微信聊天记录词云生成器"""
@@ -48,17 +79,235 @@ class WeChatWordCloud:
         Returns:
             base64 编码的 PNG 图片
         """
-        # 获取词频数据
-        word_freq = self.analytics.get_word_frequency(
+        png, _ = self.get_wordcloud_image(
             documents_path, user_md5, table_name,
-            top_n=max_words,
-            start_date=start_date,
-            end_date=end_date
+            width, height, background_color, colormap, max_words,
+            start_date, end_date
         )
+        return base64.b64encode(png).decode('utf-8')
+    
+    def generate_report(
+        self,
+        documents_path: str,
+        user_md5: str,
+        table_name: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        top_n: int = 100,
+        include_wordcloud: bool = True,
+        width: int = 800,
+        height: int = 600,
+        background_color: str = 'white',
+        colormap: str = 'viridis',
+        max_words: int = 200
+    ) -> Dict[str, Any]:
+        """
+        生成聊天报告：统计数据、活跃度、词频和词云（见 WeChatAnalytics.get_report）
+        
+        词云直接使用报告中的词频渲染，与单独请求词云使用相同的缓存
+        
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+            table_name: 表名
+            start_date: 开始日期
+            end_date: 结束日期
+            top_n: 返回前 N 个高频词
+            include_wordcloud: 是否生成词云
+            width: 词云宽度
+            height: 词云高度
+            background_color: 词云背景颜色
+            colormap: 词云颜色方案
+            max_words: 词云最大词数
+            
+        Returns:
+            {'statistics', 'activity', 'wordFrequency', 'processedMessages', 'wordcloud'}，
+            wordcloud 为 {'image': base64 编码的 PNG, 'etag': 缓存键}，不生成词云时为 None
+        """
+        report = self.analytics.get_report(
+            documents_path, user_md5, table_name, start_date, end_date,
+            top_n=max(top_n, max_words) if include_wordcloud else top_n
+        )
+        word_freq = report['wordFrequency']
+        report['wordFrequency'] = word_freq[:top_n]
+        report['wordcloud'] = None
+        
+        if include_wordcloud:
+            png, key = self.get_wordcloud_image(
+                documents_path, user_md5, table_name,
+                width, height, background_color, colormap, max_words,
+                start_date, end_date, word_freq=word_freq
+            )
+            report['wordcloud'] = {'image': base64.b64encode(png).decode('utf-8'), 'etag': key}
+        
+        return report
+    
+    def get_cache_key(
+        self,
+        documents_path: str,
+        user_md5: str,
+        table_name: str,
+        width: int = 800,
+        height: int = 600,
+        background_color: str = 'white',
+        colormap: str = 'viridis',
+        max_words: int = 200,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> str:
+        """
+        计算词云的缓存键（同时用作 ETag）
+        
+        由渲染参数和聊天表所在数据库文件的签名（数据版本）决定，数据库更新后自动失效；
+        只需查找表位置和读取文件状态，不读取消息
+        
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+            table_name: 表名
+            width: 图片宽度
+            height: 图片高度
+            background_color: 背景颜色
+            colormap: 颜色方案
+            max_words: 最大词数
+            start_date: 开始日期
+            end_date: 结束日期
+            
+        Returns:
+            缓存键
+        """
+        db_index = table_locator.locate(documents_path, user_md5, table_name)
+        data_version = None
+        if db_index is not None:
+            data_version = get_file_signature(
+                get_db_path(documents_path, user_md5, f'message_{db_index}.sqlite')
+            )
+        
+        return make_cache_key({
+            'version': WORDCLOUD_CACHE_VERSION,
+            'path': str(documents_path),
+            'userMd5': user_md5,
+            'tableName': table_name,
+            'startDate': start_date,
+            'endDate': end_date,
+            'width': width,
+            'height': height,
+            'backgroundColor': background_color,
+            'colormap': colormap,
+            'maxWords': max_words,
+            'dataVersion': data_version,
+            'fontPath': settings.wordcloud_font_path,
+            'wordFrequencyEngine': settings.word_frequency_engine,
+        })
+    
+    def get_wordcloud_image(
+        self,
+        documents_path: str,
+        user_md5: str,
+        table_name: str,
+        width: int = 800,
+        height: int = 600,
+        background_color: str = 'white',
+        colormap: str = 'viridis',
+        max_words: int = 200,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        scale: int = 1,
+        image_format: str = 'png',
+        word_freq: Optional[List[Dict[str, Any]]] = None
+    ) -> Tuple[bytes, str]:
+        """
+        获取词云图片（优先读取缓存）
+        
+        未命中缓存时只做一次布局，同时渲染 settings.wordcloud_render_scales 中的各个倍率并全部写入缓存，
+        之后请求其他倍率（如高分屏 2x）直接命中缓存
+        
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+            table_name: 表名
+            width: 图片宽度（1 倍）
+            height: 图片高度（1 倍）
+            background_color: 背景颜色
+            colormap: 颜色方案
+            max_words: 最大词数
+            start_date: 开始日期
+            end_date: 结束日期
+            scale: 输出倍率，实际尺寸为 width * scale × height * scale
+            image_format: 图片格式（png / webp）
+            word_freq: 已算好的词频（未命中缓存时直接用于渲染，不再读取词频）
+            
+        Returns:
+            (图片字节, 缓存键)
+            
+        Raises:
+            ValueError: 不支持的图片格式
+        """
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f'不支持的图片格式: {image_format}')
+        
+        key = self.get_cache_key(
+            documents_path, user_md5, table_name,
+            width, height, background_color, colormap, max_words,
+            start_date, end_date
+        )
+        
+        data = wordcloud_cache.get(documents_path, user_md5, key, f'{scale}x.{image_format}')
+        if data is not None:
+            return data, key
+        
+        scales = sorted({scale, *get_render_scales()})
+        images, cacheable = self._render_images(
+            documents_path, user_md5, table_name,
+            width, height, background_color, colormap, max_words,
+            start_date, end_date, scales, word_freq
+        )
+        
+        for image_scale, image in images.items():
+            encoded = self._encode_image(image, image_format)
+            if image_scale == scale:
+                data = encoded
+            if cacheable:
+                wordcloud_cache.put(
+                    documents_path, user_md5, key, encoded, f'{image_scale}x.{image_format}'
+                )
+        return data, key
+    
+    def _render_images(
+        self,
+        documents_path: str,
+        user_md5: str,
+        table_name: str,
+        width: int,
+        height: int,
+        background_color: str,
+        colormap: str,
+        max_words: int,
+        start_date: Optional[str],
+        end_date: Optional[str],
+        scales: List[int],
+        word_freq: Optional[List[Dict[str, Any]]] = None
+    ) -> Tuple[Dict[int, Any], bool]:
+        """
+        读取词频（已提供时直接使用）、布局一次并按各倍率渲染
+        
+        Returns:
+            ({倍率: PIL Image}, 是否可以缓存)，渲染失败时返回错误提示图片且不缓存
+        """
+        # 获取词频数据
+        if word_freq is None:
+            word_freq = self.analytics.get_word_frequency(
+                documents_path, user_md5, table_name,
+                top_n=max_words,
+                start_date=start_date,
+                end_date=end_date
+            )
+        else:
+            word_freq = word_freq[:max_words]
         
         if not word_freq:
             # 如果没有数据，返回空白图片
-            return self._generate_empty_image(width, height)
+            return {s: self._generate_empty_image(width * s, height * s) for s in scales}, True
         
         # 转换为 {word: count} 字典
         word_dict = {item['word']: item['count'] for item in word_freq}
@@ -85,6 +334,7 @@ class WeChatWordCloud:
                             print(f'使用字体: {f}')
                         break
             
+            WordCloud = _load_wordcloud()
             wc = WordCloud(
                 font_path=font_path,
                 width=width,
@@ -93,34 +343,36 @@ class WeChatWordCloud:
                 colormap=colormap,
                 max_words=max_words,
                 relative_scaling=0.5,
-                min_font_size=10
+                min_font_size=10,
+                # 固定随机种子：相同词频得到相同布局，不同格式、倍率的缓存图片保持一致
+                random_state=0
             )
             
-            # 生成词云
+            # 生成词云（布局只计算一次）
             wc.generate_from_frequencies(word_dict)
             
-            # 转换为图片
-            image = wc.to_image()
-            
-            # 转换为 base64
-            return self._image_to_base64(image)
+            # 按各倍率转换为图片（字号和坐标按倍率放大）
+            images = {}
+            for s in scales:
+                wc.scale = s
+                images[s] = wc.to_image()
+            return images, True
         except Exception as e:
             print(f'生成词云失败: {e}')
             import traceback
             traceback.print_exc()
-            # 返回错误提示图片
-            return self._generate_error_image(width, height, str(e))
+            # 返回错误提示图片（不缓存）
+            return {s: self._generate_error_image(width * s, height * s, str(e)) for s in scales}, False
     
-    def _image_to_base64(self, image: Image.Image) -> str:
-        """将 PIL Image 转换为 base64 字符串"""
+    def _encode_image(self, image, image_format: str = 'png') -> bytes:
+        """将 PIL Image 编码为 PNG / WebP 字节"""
         buffer = io.BytesIO()
-        image.save(buffer, format='PNG')
-        image_bytes = buffer.getvalue()
-        return base64.b64encode(image_bytes).decode('utf-8')
+        image.save(buffer, format=IMAGE_FORMATS[image_format][1])
+        return buffer.getvalue()
     
-    def _generate_empty_image(self, width: int, height: int) -> str:
+    def _generate_empty_image(self, width: int, height: int):
         """生成空白提示图片"""
-        from PIL import ImageDraw, ImageFont
+        from PIL import Image, ImageDraw, ImageFont
         import os
         
         image = Image.new('RGB', (width, height), color='white')
@@ -153,11 +405,11 @@ class WeChatWordCloud:
         y = (height - text_height) / 2
         draw.text((x, y), text, fill='gray', font=font)
         
-        return self._image_to_base64(image)
+        return image
     
-    def _generate_error_image(self, width: int, height: int, error: str) -> str:
+    def _generate_error_image(self, width: int, height: int, error: str):
         """生成错误提示图片"""
-        from PIL import ImageDraw, ImageFont
+        from PIL import Image, ImageDraw, ImageFont
         import os
         
         image = Image.new('RGB', (width, height), color='white')
@@ -186,5 +438,5 @@ class WeChatWordCloud:
         y = (height - text_height) / 2
         draw.text((x, y), text, fill='red', font=font)
         
-        return self._image_to_base64(image)
+        return image
 
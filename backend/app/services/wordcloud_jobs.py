@@ -0,0 +1,315 @@
+"""批量词云任务（在进程池中并行分词和渲染，图片写入输出目录）"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.services.database import WeChatDatabase
+from app.services.table_index import table_locator
+from app.utils.jieba_loader import get_jieba
+from app.utils.storage import get_account_cache_dir, resolve_cache_path, write_json_atomic
+
+# 默认输出目录（位于账号缓存目录下）
+BATCH_OUTPUT_DIR = 'wordcloud_batches'
+# 任务结束后写入输出目录的清单文件
+MANIFEST_FILE = 'manifest.json'
+# 内存中最多保留的已结束任务数
+MAX_FINISHED_JOBS = 20
+
+# 子进程中的词云生成器（每个进程一个）
+_worker_wordcloud = None
+
+
+class WordCloudJobLimitError(Exception):
+    """进行中的批量词云任务数已达上限"""
+
+
+def _init_worker():
+    """子进程初始化：禁用嵌套的分词进程池并预加载 jieba 词典"""
+    settings.segment_workers = 1
+    get_jieba()
+
+
+def render_chat_wordcloud(
+    documents_path: str,
+    user_md5: str,
+    table_name: str,
+    options: Dict[str, Any],
+    output_path: str
+) -> Dict[str, Any]:
+    """
+    生成单个聊天的词云并写入文件（在子进程中执行）
+
+    分词索引和词云缓存与 Web 服务共用，已生成过的图片直接复用
+
+    Args:
+        documents_path: 微信数据目录路径
+        user_md5: 用户 MD5
+        table_name: 表名
+        options: WeChatWordCloud.get_wordcloud_image 的其余参数
+        output_path: 输出文件路径
+
+    Returns:
+        {'tableName', 'file', 'bytes', 'seconds'}
+    """
+    global _worker_wordcloud
+    if _worker_wordcloud is None:
+        from app.services.wordcloud_gen import WeChatWordCloud
+        _worker_wordcloud = WeChatWordCloud()
+
+    start = time.perf_counter()
+    data, _ = _worker_wordcloud.get_wordcloud_image(documents_path, user_md5, table_name, **options)
+    Path(output_path).write_bytes(data)
+
+    return {
+        'tableName': table_name,
+        'file': output_path,
+        'bytes': len(data),
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+
+
+class WordCloudJob:
+    """一个批量词云任务的状态"""
+
+    def __init__(
+        self,
+        job_id: str,
+        documents_path: str,
+        user_md5: str,
+        table_names: List[str],
+        options: Dict[str, Any],
+        output_dir: Path
+    ):
+        self.job_id = job_id
+        self.documents_path = documents_path
+        self.user_md5 = user_md5
+        self.table_names = table_names
+        self.options = options
+        self.output_dir = output_dir
+
+        self.status = 'pending'  # pending / running / completed / cancelled / failed
+        self.completed = 0
+        self.failed = 0
+        self.bytes_written = 0
+        self.errors: List[Dict[str, str]] = []
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+        self.cancel_event = threading.Event()
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ('completed', 'cancelled', 'failed')
+
+    def to_dict(self) -> Dict[str, Any]:
+        """任务进度（含吞吐量和预计剩余时间）"""
+        total = len(self.table_names)
+        done = self.completed + self.failed
+
+        elapsed = 0.0
+        if self.started_at:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        throughput = done / elapsed if elapsed > 0 else 0.0
+        eta = (total - done) / throughput if throughput > 0 and not self.finished else None
+
+        return {
+            'jobId': self.job_id,
+            'status': self.status,
+            'total': total,
+            'completed': self.completed,
+            'failed': self.failed,
+            'progress': round(done / total, 4) if total else 1.0,
+            'elapsedSeconds': round(elapsed, 2),
+            'chatsPerSecond': round(throughput, 3),
+            'etaSeconds': round(eta, 1) if eta is not None else None,
+            'bytesWritten': self.bytes_written,
+            'outputDir': str(self.output_dir),
+            'errors': self.errors[-20:],
+            'error': self.error,
+        }
+
+
+class WordCloudJobManager:
+    """批量词云任务管理（后台线程调度，进程池执行）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, WordCloudJob] = {}
+        self.db = WeChatDatabase()
+
+    @property
+    def workers(self) -> int:
+        """进程数（settings.wordcloud_batch_workers，0 表示 CPU 核数）"""
+        return settings.wordcloud_batch_workers or os.cpu_count() or 1
+
+    def start(
+        self,
+        documents_path: str,
+        user_md5: str,
+        table_names: Optional[List[str]] = None,
+        min_messages: int = 0,
+        options: Optional[Dict[str, Any]] = None,
+        output_dir: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        创建并启动批量词云任务
+
+        Args:
+            documents_path: 微信数据目录路径
+            user_md5: 用户 MD5
+            table_names: 要生成的聊天表，不指定时取消息数超过 min_messages 的全部聊天
+            min_messages: 自动选择聊天时的最少消息数
+            options: 词云参数（width、height、background_color、colormap、max_words、
+                start_date、end_date、scale、image_format）
+            output_dir: 输出目录（必须位于 cache_dir 下，相对路径相对于 cache_dir；
+                默认为账号缓存目录下的 wordcloud_batches/<任务 ID>）
+
+        Returns:
+            任务进度
+
+        Raises:
+            ValueError: 输出目录不在 cache_dir 下、聊天表不存在或没有符合条件的聊天
+            WordCloudJobLimitError: 进行中的任务数已达 settings.wordcloud_batch_max_jobs
+        """
+        # 每个任务都会启动自己的进程池，先检查上限再做耗时的准备工作
+        with self._lock:
+            self._check_capacity()
+        output_path = resolve_cache_path(output_dir) if output_dir else None
+
+        if table_names:
+            # 只接受真实存在的表名（表名同时用作输出文件名）
+            missing = [
+                table_name for table_name in table_names
+                if table_locator.locate(documents_path, user_md5, table_name) is None
+            ]
+            if missing:
+                raise ValueError(f'聊天表不存在: {", ".join(missing[:5])}')
+        else:
+            table_names = [
+                chat.table_name
+                for chat in self.db.get_chat_tables(documents_path, user_md5)
+                if chat.message_count > min_messages
+            ]
+        if not table_names:
+            raise ValueError('没有符合条件的聊天')
+
+        job_id = uuid.uuid4().hex[:12]
+        if output_path is None:
+            output_path = get_account_cache_dir(documents_path, user_md5) / BATCH_OUTPUT_DIR / job_id
+        output_path.mkdir(parents=True, exist_ok=True)
+        job = WordCloudJob(job_id, documents_path, user_md5, table_names, options or {}, output_path)
+
+        with self._lock:
+            # 准备期间可能有其他任务启动，加锁后再确认一次
+            self._check_capacity()
+            self._prune_finished()
+            self._jobs[job.job_id] = job
+
+        threading.Thread(
+            target=self._run, args=(job,), name=f'wordcloud-job-{job.job_id}', daemon=True
+        ).start()
+        print(f'✅ 批量词云任务 {job.job_id} 已创建: {len(table_names)} 个聊天 → {job.output_dir}')
+        return job.to_dict()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        查询任务进度
+
+        Args:
+            job_id: 任务 ID
+
+        Returns:
+            任务进度，任务不存在返回 None
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job.to_dict() if job else None
+
+    def _run(self, job: WordCloudJob):
+        """在后台线程中调度任务"""
+        image_format = job.options.get('image_format', 'png')
+        job.status = 'running'
+        job.started_at = time.time()
+
+        try:
+            job.executor = ProcessPoolExecutor(
+                max_workers=min(self.workers, len(job.table_names)),
+                mp_context=get_context('spawn'),
+                initializer=_init_worker
+            )
+            futures = {
+                job.executor.submit(
+                    render_chat_wordcloud,
+                    job.documents_path, job.user_md5, table_name, job.options,
+                    str(job.output_dir / f'{table_name}.{image_format}')
+                ): table_name
+                for table_name in job.table_names
+            }
+
+            for future in as_completed(futures):
+                if job.cancel_event.is_set():
+                    break
+                try:
+                    result = future.result()
+                    job.completed += 1
+                    job.bytes_written += result['bytes']
+                except Exception as e:
+                    job.failed += 1
+                    job.errors.append({'tableName': futures[future], 'error': str(e)})
+
+            job.status = 'cancelled' if job.cancel_event.is_set() else 'completed'
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+            print(f'批量词云任务 {job.job_id} 失败: {e}')
+        finally:
+            if job.executor is not None:
+                job.executor.shutdown(wait=False, cancel_futures=True)
+                job.executor = None
+            job.finished_at = time.time()
+
+        progress = job.to_dict()
+        try:
+            write_json_atomic(job.output_dir / MANIFEST_FILE, progress)
+        except OSError as e:
+            print(f'写入任务清单失败: {e}')
+        print(f'✅ 批量词云任务 {job.job_id} {job.status}: {job.completed} 成功, {job.failed} 失败, '
+              f'耗时 {progress["elapsedSeconds"]}s, {progress["chatsPerSecond"]} 个/秒')
+
+    def _check_capacity(self):
+        """进行中的任务数已达上限时抛出 WordCloudJobLimitError（调用方需持有锁）"""
+        active = sum(1 for job in self._jobs.values() if not job.finished)
+        if active >= settings.wordcloud_batch_max_jobs:
+            raise WordCloudJobLimitError(
+                f'已有 {active} 个批量词云任务在进行，请等待完成后再创建（上限 {settings.wordcloud_batch_max_jobs}）'
+            )
+
+    def _prune_finished(self):
+        """只保留最近的已结束任务（调用方需持有锁）"""
+        finished = [job for job in self._jobs.values() if job.finished]
+        finished.sort(key=lambda job: job.created_at)
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS + 1)]:
+            self._jobs.pop(job.job_id, None)
+
+    def shutdown(self):
+        """取消所有进行中的任务（应用关闭时调用）"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            if not job.finished:
+                job.cancel_event.set()
+                if job.executor is not None:
+                    job.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# 全局批量词云任务管理实例
+wordcloud_jobs = WordCloudJobManager()
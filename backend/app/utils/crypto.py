@@ -1,6 +1,6 @@
 """加密和编码工具函数"""
 import hashlib
-from typing import Optional
+from typing import Optional, Tuple
 
 
 def md5(text: str) -> str:
@@ -102,6 +102,104 @@ def decode_user_name_info(quoted_hex_string: Optional[str]) -> str:
         return ''
 
 
+# dbContactRemark 中的字段编号（protobuf 格式）：1 昵称、2 微信号、3 备注
+CONTACT_FIELD_NICKNAME = 1
+CONTACT_FIELD_WECHAT_ID = 2
+CONTACT_FIELD_REMARK = 3
+
+
+def decode_contact_remark(data: Optional[bytes]) -> str:
+    """
+    直接从 dbContactRemark 原始字节解析用户名称（protobuf 格式）
+
+    与 decode_user_name_info 的结果相同，但不需要先转成 hex 字符串，
+    且按 varint 读取标记和长度，超过 127 字节的字段也能正确解析
+
+    Args:
+        data: dbContactRemark 字段的原始字节
+
+    Returns:
+        解析出的用户名称（优先级：备注 > 昵称 > 微信号）
+    """
+    if not data:
+        return ''
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+
+    fields = {}
+    pos = 0
+    end = len(data)
+
+    try:
+        while pos < end:
+            # 读取标记（varint：字段编号 << 3 | 类型）
+            key = data[pos]
+            pos += 1
+            if key & 0x80:
+                key, pos = _read_varint(data, pos - 1)
+            wire_type = key & 0x07
+
+            if wire_type == 2:
+                # 长度前缀字段
+                length = data[pos]
+                pos += 1
+                if length & 0x80:
+                    length, pos = _read_varint(data, pos - 1)
+                if pos + length > end:
+                    break  # 数据长度异常，退出
+                if length:
+                    # 空字段（如未设置的昵称）跳过，继续解析后面的字段
+                    fields[key >> 3] = data[pos:pos + length]
+                pos += length
+            elif wire_type == 0:
+                _, pos = _read_varint(data, pos)
+            elif wire_type == 1:
+                pos += 8
+            elif wire_type == 5:
+                pos += 4
+            else:
+                break  # 未知类型，退出
+    except IndexError:
+        pass  # 数据被截断，使用已解析的字段
+
+    for field in (CONTACT_FIELD_REMARK, CONTACT_FIELD_NICKNAME, CONTACT_FIELD_WECHAT_ID):
+        value = fields.get(field)
+        if value:
+            try:
+                text = value.decode('utf-8').strip()
+            except UnicodeDecodeError:
+                continue
+            if text:
+                return text
+
+    return ''
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    """
+    读取 varint
+
+    Args:
+        data: 字节数据
+        pos: 起始位置
+
+    Returns:
+        (数值, 下一个位置)
+
+    Raises:
+        IndexError: 数据被截断
+    """
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
 def get_friendly_name(wechat_id: str, nickname: str, is_group: bool) -> str:
     """
     生成友好的显示名称
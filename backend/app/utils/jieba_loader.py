@@ -0,0 +1,51 @@
+"""jieba 懒加载与预热（词典缓存文件放在可配置的目录）"""
+import threading
+import time
+from pathlib import Path
+from types import ModuleType
+
+from app.config import settings
+
+_lock = threading.Lock()
+_jieba = None
+
+
+def get_jieba() -> ModuleType:
+    """
+    获取已加载词典的 jieba 模块
+
+    首次调用时才导入 jieba 并加载词典（有缓存文件时约 1 秒，否则需要数秒构建），
+    缓存文件位于 settings.jieba_cache_dir（默认 cache_dir），重启后直接复用
+
+    Returns:
+        jieba 模块
+    """
+    global _jieba
+    if _jieba is not None:
+        return _jieba
+
+    with _lock:
+        if _jieba is None:
+            import jieba
+
+            cache_dir = Path(settings.jieba_cache_dir or settings.cache_dir)
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            jieba.dt.tmp_dir = str(cache_dir)
+            jieba.initialize()
+            _jieba = jieba
+    return _jieba
+
+
+def is_jieba_ready() -> bool:
+    """jieba 词典是否已加载"""
+    return _jieba is not None
+
+
+def warmup_jieba():
+    """预加载 jieba 词典（在后台线程中调用，避免首个分词请求等待）"""
+    start = time.perf_counter()
+    try:
+        get_jieba()
+        print(f'✅ jieba 词典已预加载，耗时 {time.perf_counter() - start:.2f}s')
+    except Exception as e:
+        print(f'预加载 jieba 词典失败: {e}')
@@ -0,0 +1,72 @@
+"""线程安全的有界 LRU 缓存"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class LRUCache:
+    """按最近使用淘汰的有界缓存，带命中率统计"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._data: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        读取缓存，命中时标记为最近使用
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            缓存值，未命中返回 None
+        """
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self._hits += 1
+                return self._data[key]
+            self._misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any):
+        """
+        写入缓存，超出容量时淘汰最久未使用的项
+
+        Args:
+            key: 缓存键
+            value: 缓存值
+        """
+        if self.max_size <= 0:
+            return
+
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """清空缓存（保留统计数据）"""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计数据
+
+        Returns:
+            {'hits', 'misses', 'hitRate', 'size', 'maxSize'}
+        """
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hitRate': round(self._hits / total, 4) if total else 0.0,
+                'size': len(self._data),
+                'maxSize': self.max_size,
+            }
@@ -0,0 +1,100 @@
+"""本地缓存目录工具函数"""
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Any
+
+from app.config import settings
+from app.utils.crypto import md5
+
+
+def get_account_cache_dir(documents_path: str, user_md5: str) -> Path:
+    """
+    获取账号的本地缓存目录（不存在时自动创建）
+
+    同一账号可能来自不同的备份目录，因此目录名同时包含 documents_path 的哈希
+
+    Args:
+        documents_path: 微信数据目录路径
+        user_md5: 用户 MD5
+
+    Returns:
+        缓存目录路径，如 .cache/1a2b3c4d5e6f/<user_md5>
+    """
+    path_hash = md5(str(Path(documents_path).resolve()))[:12]
+    cache_dir = Path(settings.cache_dir) / path_hash / user_md5
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
+def write_json_atomic(path: Path, data: Any):
+    """
+    原子写入 JSON 文件（先写临时文件再替换，避免读到写了一半的文件）
+
+    Args:
+        path: 目标文件路径
+        data: 可 JSON 序列化的数据
+    """
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def resolve_cache_path(path: str) -> Path:
+    """
+    将用户指定的路径解析到本地缓存目录下（相对路径相对于 cache_dir）
+
+    Args:
+        path: 目录或文件路径
+
+    Returns:
+        解析后的绝对路径
+
+    Raises:
+        ValueError: 路径不在 cache_dir 下
+    """
+    cache_root = Path(settings.cache_dir).resolve()
+    resolved = (cache_root / path).resolve()
+    if resolved != cache_root and cache_root not in resolved.parents:
+        raise ValueError(f'路径必须位于缓存目录 {cache_root} 下: {path}')
+    return resolved
+
+
+def open_sidecar_db(
+    documents_path: str,
+    user_md5: str,
+    file_name: str,
+    schema_sql: str,
+    schema_version: int,
+    drop_sql: str
+) -> sqlite3.Connection:
+    """
+    打开（必要时创建）账号的 sidecar SQLite 数据库
+
+    PRAGMA user_version 与 schema_version 不一致时删除旧表并按新结构重建
+    （在一个事务中完成，其他进程同时打开时不会看到缺表的中间状态）
+
+    Args:
+        documents_path: 微信数据目录路径
+        user_md5: 用户 MD5
+        file_name: sidecar 文件名
+        schema_sql: 建表语句
+        schema_version: 结构版本
+        drop_sql: 删除旧表的语句
+
+    Returns:
+        数据库连接对象（row_factory 为 sqlite3.Row，WAL 模式）
+    """
+    path = get_account_cache_dir(documents_path, user_md5) / file_name
+    conn = sqlite3.connect(str(path), timeout=30)
+    conn.row_factory = sqlite3.Row
+
+    if conn.execute('PRAGMA user_version').fetchone()[0] != schema_version:
+        conn.executescript(
+            f'BEGIN IMMEDIATE; {drop_sql} {schema_sql} PRAGMA user_version = {schema_version}; COMMIT;'
+        )
+
+    conn.execute('PRAGMA journal_mode = WAL')
+    return conn
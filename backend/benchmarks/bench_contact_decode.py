@@ -0,0 +1,163 @@
+"""
+联系人名称解码性能对比
+
+在内存数据库中生成 N 个联系人的 Friend 表，对比两种解码方式：
+    hex：SELECT lower(quote(dbContactRemark)) + decode_user_name_info（旧实现）
+    bytes：SELECT dbContactRemark 原始字节 + decode_contact_remark
+并检查两者结果一致（另外统计含超过 127 字节字段或空字段的联系人，旧实现无法解析这些字段），
+最后检查 decode_contact_remark 在几个边界用例上的结果。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.bench_contact_decode
+    python -m benchmarks.bench_contact_decode --contacts 200000 --repeat 5
+"""
+import argparse
+import random
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.utils.crypto import decode_contact_remark, decode_user_name_info  # noqa: E402
+
+NAME_CHARS = '张王李赵刘陈杨黄周吴小明华丽强军芳静伟敏abcdefghijklmnopqrstuvwxyz0123456789'
+
+
+def encode_varint(value: int) -> bytes:
+    """编码 varint"""
+    out = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def encode_field(field: int, text: str) -> bytes:
+    """编码一个长度前缀的字符串字段"""
+    data = text.encode('utf-8')
+    return encode_varint(field << 3 | 2) + encode_varint(len(data)) + data
+
+
+# decode_contact_remark 的边界用例：(说明, dbContactRemark, 期望结果)
+EDGE_CASES = [
+    ('昵称为空、有备注', encode_field(1, '') + encode_field(2, 'wxid_a') + encode_field(3, '备注'), '备注'),
+    ('昵称为空、无备注', encode_field(1, '') + encode_field(2, 'wxid_b'), 'wxid_b'),
+    ('备注为空', encode_field(1, '昵称') + encode_field(2, 'wxid_c') + encode_field(3, ''), '昵称'),
+    ('超过 127 字节的备注', encode_field(1, '昵称') + encode_field(3, '长' * 60), '长' * 60),
+    ('数据被截断', encode_field(1, '昵称') + encode_field(3, '备注')[:-2], '昵称'),
+]
+
+
+def build_friend_table(contact_count: int, long_ratio: float, empty_ratio: float) -> sqlite3.Connection:
+    """生成内存中的 Friend 表"""
+    rng = random.Random(42)
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE Friend (userName TEXT PRIMARY KEY, dbContactRemark BLOB)')
+
+    rows = []
+    for i in range(contact_count):
+        user_name = f'wxid_{i:012d}'
+        nickname = ''.join(rng.choices(NAME_CHARS, k=rng.randint(2, 12)))
+        remark = ''
+        if rng.random() < 0.3:
+            remark = ''.join(rng.choices(NAME_CHARS, k=rng.randint(2, 10)))
+        if rng.random() < long_ratio:
+            # 超过 127 字节的备注（长度需要两个字节的 varint）
+            remark = ''.join(rng.choices(NAME_CHARS, k=rng.randint(60, 120)))
+
+        if rng.random() < empty_ratio:
+            # 未设置昵称（长度为 0 的字段）
+            nickname = ''
+
+        blob = encode_field(1, nickname) + encode_field(2, user_name)
+        if remark:
+            blob += encode_field(3, remark)
+        rows.append((user_name, blob))
+
+    conn.executemany('INSERT INTO Friend VALUES (?, ?)', rows)
+    conn.commit()
+    return conn
+
+
+# 两种方式：(查询语句, 解码函数)
+METHODS = {
+    'hex': ('SELECT userName, lower(quote(dbContactRemark)) FROM Friend', decode_user_name_info),
+    'bytes': ('SELECT userName, dbContactRemark FROM Friend', decode_contact_remark),
+}
+
+
+def run_method(conn: sqlite3.Connection, sql: str, decode, repeat: int):
+    """执行多次，返回 ({微信号: 名称}, 最短查询耗时秒, 最短解码耗时秒)"""
+    best_query = best_decode = float('inf')
+    names = {}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = conn.execute(sql).fetchall()
+        fetched = time.perf_counter()
+        names = {user_name: decode(remark) for user_name, remark in rows}
+        best_query = min(best_query, fetched - start)
+        best_decode = min(best_decode, time.perf_counter() - fetched)
+    return names, best_query, best_decode
+
+
+def main():
+    parser = argparse.ArgumentParser(description='联系人名称解码性能对比')
+    parser.add_argument('--contacts', type=int, default=50_000, help='联系人数量')
+    parser.add_argument('--long-ratio', type=float, default=0.01, help='含超长备注的联系人比例')
+    parser.add_argument('--empty-ratio', type=float, default=0.01, help='昵称为空的联系人比例')
+    parser.add_argument('--repeat', type=int, default=3, help='每种方式的执行次数（取最短耗时）')
+    args = parser.parse_args()
+
+    conn = build_friend_table(args.contacts, args.long_ratio, args.empty_ratio)
+    print(f'生成 {args.contacts} 个联系人\n')
+
+    results = {}
+    print(f'{"方式":<8} {"查询":>10} {"解码":>10} {"合计":>10}')
+    for label, (sql, decode) in METHODS.items():
+        names, query_elapsed, decode_elapsed = run_method(conn, sql, decode, args.repeat)
+        results[label] = (names, query_elapsed + decode_elapsed, decode_elapsed)
+        print(f'{label:<8} {query_elapsed * 1000:>8.1f}ms {decode_elapsed * 1000:>8.1f}ms '
+              f'{(query_elapsed + decode_elapsed) * 1000:>8.1f}ms')
+
+    hex_names, hex_total, hex_decode = results['hex']
+    bytes_names, bytes_total, bytes_decode = results['bytes']
+    print(f'加速比: 解码 {hex_decode / bytes_decode:.1f}x，合计 {hex_total / bytes_total:.1f}x\n')
+
+    # 比较结果：对含超长字段或空字段的联系人，旧实现会解析失败
+    long_names = {
+        user_name for user_name, name in bytes_names.items()
+        if len(name.encode('utf-8')) > 127
+    }
+    empty_names = {
+        row[0] for row in conn.execute("SELECT userName FROM Friend WHERE substr(dbContactRemark, 1, 2) = x'0a00'")
+    }
+    mismatched = [
+        user_name for user_name, name in bytes_names.items()
+        if user_name not in long_names | empty_names and hex_names[user_name] != name
+    ]
+    print(f'普通联系人结果一致: {not mismatched}')
+    for label, user_names in (('含超长字段', long_names), ('昵称为空', empty_names)):
+        print(f'{label}的联系人: {len(user_names)} 个，'
+              f'旧实现解析正确 {sum(1 for u in user_names if hex_names[u] == bytes_names[u])} 个')
+
+    conn.close()
+
+    print()
+    failed = 0
+    for label, data, expected in EDGE_CASES:
+        actual = decode_contact_remark(data)
+        failed += actual != expected
+        print(f'{"✅" if actual == expected else "❌"} {label}: {actual!r}')
+    print(f'边界用例: {len(EDGE_CASES) - failed}/{len(EDGE_CASES)} 通过')
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+聊天报告与分别请求的对比
+
+在临时目录生成一个包含 N 条文本消息的合成群聊，分别用两种方式获取统计数据、活跃度和词频：
+逐个调用 get_chat_statistics / get_user_activity / get_word_frequency，以及一次 get_report，
+对比耗时、逐条读取的消息数和结果。默认使用 python 统计引擎和 stream 词频引擎（都需要逐条读取消息），
+--indexed 时使用 aggregate / index 引擎。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.bench_report
+    python -m benchmarks.bench_report --messages 300000 --indexed
+"""
+import argparse
+import json
+
+# 需要在导入 app 之前导入（设置临时 CACHE_DIR）
+from benchmarks.common import USER_WXID, build_synthetic_group, cleanup, documents_dir, timed
+
+from app.config import settings
+from app.services.analytics import WeChatAnalytics
+from app.services.database import WeChatDatabase
+from app.services.segment_pool import segment_pool
+from app.utils.crypto import md5
+
+
+class CountingDatabase(WeChatDatabase):
+    """记录 iter_messages 读取的消息条数"""
+
+    def __init__(self):
+        super().__init__()
+        self.rows_read = 0
+
+    def iter_messages(self, *args, **kwargs):
+        for message in super().iter_messages(*args, **kwargs):
+            self.rows_read += 1
+            yield message
+
+
+def main():
+    parser = argparse.ArgumentParser(description='聊天报告与分别请求的对比')
+    parser.add_argument('--messages', type=int, default=100_000, help='合成群聊的消息数量')
+    parser.add_argument('--indexed', action='store_true', help='使用 aggregate / index 引擎')
+    args = parser.parse_args()
+
+    documents_path = documents_dir()
+    print(f'生成 {args.messages} 条消息的合成群聊: {documents_path}')
+    table_name, elapsed = timed(build_synthetic_group, documents_path, args.messages, image_ratio=0.1)
+    print(f'生成耗时 {elapsed:.1f}s\n')
+
+    settings.segment_workers = 1
+    settings.statistics_engine = 'aggregate' if args.indexed else 'python'
+    settings.word_frequency_engine = 'index' if args.indexed else 'stream'
+    print(f'统计引擎 {settings.statistics_engine}，词频引擎 {settings.word_frequency_engine}\n')
+
+    analytics = WeChatAnalytics()
+    analytics.db = CountingDatabase()
+    path, user_md5 = str(documents_path), md5(USER_WXID)
+    params = (path, user_md5, table_name, '2000-01-01', '2100-01-01')
+
+    if args.indexed:
+        # 先建好索引，只比较读取索引后的耗时
+        analytics.get_report(*params)
+
+    def separate():
+        return {
+            'statistics': analytics.get_chat_statistics(*params),
+            'activity': analytics.get_user_activity(*params),
+            'wordFrequency': analytics.get_word_frequency(*params[:3], 100, *params[3:]),
+        }
+
+    results = {}
+    for label, func in [('分别请求', separate), ('get_report', lambda: analytics.get_report(*params))]:
+        analytics.db.rows_read = 0
+        result, elapsed = timed(func)
+        results[label] = {key: result[key] for key in ('statistics', 'activity', 'wordFrequency')}
+        print(f'{label:<12} {elapsed * 1000:>10.1f} ms  逐条读取 {analytics.db.rows_read} 条消息')
+
+    print()
+    print(f'结果一致: {json.dumps(results["分别请求"], sort_keys=True) == json.dumps(results["get_report"], sort_keys=True)}')
+
+    segment_pool.shutdown()
+    cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+多进程分词性能对比
+
+在临时目录生成一个包含 N 条文本消息的合成群聊，分别以不同的分词进程数计算
+get_word_frequency（stream 引擎，以及 index 引擎的首次建索引）并对比耗时和结果。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.bench_segmentation
+    python -m benchmarks.bench_segmentation --messages 500000 --workers 1 4 8
+"""
+import argparse
+import os
+
+# 需要在导入 app 之前导入（设置临时 CACHE_DIR）
+from benchmarks.common import USER_WXID, build_synthetic_group, cleanup, documents_dir, timed
+
+from app.config import settings
+from app.services.analytics import WeChatAnalytics
+from app.services.segment_pool import segment_pool
+from app.services.token_index import TOKEN_DB_FILE
+from app.utils.crypto import md5
+from app.utils.storage import get_account_cache_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description='多进程分词性能对比')
+    parser.add_argument('--messages', type=int, default=200_000, help='合成群聊的消息数量')
+    parser.add_argument(
+        '--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1], help='要对比的分词进程数'
+    )
+    args = parser.parse_args()
+
+    documents_path = documents_dir()
+    print(f'生成 {args.messages} 条消息的合成群聊: {documents_path}')
+    table_name, elapsed = timed(build_synthetic_group, documents_path, args.messages)
+    print(f'生成耗时 {elapsed:.1f}s\n')
+
+    analytics = WeChatAnalytics()
+    path, user_md5 = str(documents_path), md5(USER_WXID)
+    start_date, end_date = '2000-01-01', '2100-01-01'
+    token_db = get_account_cache_dir(path, user_md5) / TOKEN_DB_FILE
+
+    results = {}
+    for workers in dict.fromkeys(args.workers):
+        settings.segment_workers = workers
+        segment_pool.shutdown()
+
+        for engine in ('stream', 'index'):
+            if engine == 'index':
+                token_db.unlink(missing_ok=True)
+            word_freq, elapsed = timed(
+                analytics.get_word_frequency,
+                path, user_md5, table_name, 50, start_date, end_date, engine
+            )
+            label = f'{engine} workers={workers}'
+            results[label] = {item['word']: item['count'] for item in word_freq}
+            print(f'{label:<20} {elapsed * 1000:>10.1f} ms')
+
+    segment_pool.shutdown()
+
+    print()
+    baseline = next(iter(results.values()))
+    for label, counts in results.items():
+        print(f'{label:<20} 结果一致: {counts == baseline}')
+
+    cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+统计引擎性能对比
+
+在临时目录生成一个包含 N 条消息的合成聊天，分别用 python / sql / numpy / aggregate
+引擎计算 get_chat_statistics 并对比耗时和结果，并测量 get_time_patterns（热力图、回复间隔）的耗时。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.bench_statistics
+    python -m benchmarks.bench_statistics --messages 200000
+"""
+import argparse
+import json
+
+# 需要在导入 app 之前导入（设置临时 CACHE_DIR）
+from benchmarks.common import USER_WXID, build_synthetic_chat, cleanup, documents_dir, timed
+
+from app.services.analytics import WeChatAnalytics
+from app.utils.crypto import md5
+
+
+def main():
+    parser = argparse.ArgumentParser(description='统计引擎性能对比')
+    parser.add_argument('--messages', type=int, default=1_000_000, help='合成聊天的消息数量')
+    args = parser.parse_args()
+
+    documents_path = documents_dir()
+    print(f'生成 {args.messages} 条消息的合成聊天: {documents_path}')
+    table_name, elapsed = timed(build_synthetic_chat, documents_path, args.messages)
+    print(f'生成耗时 {elapsed:.1f}s\n')
+
+    analytics = WeChatAnalytics()
+    path, user_md5 = str(documents_path), md5(USER_WXID)
+    # 覆盖整个聊天的日期范围
+    start_date, end_date = '2000-01-01', '2100-01-01'
+
+    results = {}
+    for label, engine in [
+        ('python', 'python'),
+        ('sql', 'sql'),
+        ('numpy', 'numpy'),
+        ('aggregate (cold)', 'aggregate'),
+        ('aggregate (warm)', 'aggregate'),
+    ]:
+        stats, elapsed = timed(
+            analytics.get_chat_statistics, path, user_md5, table_name, start_date, end_date, engine
+        )
+        results[label] = stats
+        print(f'{label:<18} {elapsed * 1000:>10.1f} ms  totalMessages={stats["totalMessages"]}')
+
+    patterns, elapsed = timed(analytics.get_time_patterns, path, user_md5, table_name, start_date, end_date)
+    print(f'{"patterns (numpy)":<18} {elapsed * 1000:>10.1f} ms  '
+          f'回复间隔中位数 {patterns["responseTimes"]["mine"]["median"]}s')
+
+    print()
+    sql_json = json.dumps(results['sql'], sort_keys=True)
+    for label, stats in results.items():
+        same = json.dumps(stats, sort_keys=True) == sql_json
+        print(f'{label:<18} 与 sql 引擎结果一致: {same}')
+
+    cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+基准测试公共部分：临时工作目录、合成聊天数据和计时
+
+导入本模块时创建临时工作目录并把 CACHE_DIR 指向其中（需要在导入 app.config 之前设置），
+因此各脚本需要先导入本模块，再导入 app 下的模块。
+"""
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Iterable, Tuple
+
+# 分词、分析进程池以 spawn 方式启动时会重新导入脚本，子进程沿用主进程的工作目录
+WORK_DIR = os.environ.get('WECHAT_BENCH_DIR') or tempfile.mkdtemp(prefix='wechat_bench_')
+os.environ['WECHAT_BENCH_DIR'] = WORK_DIR
+os.environ.setdefault('CACHE_DIR', str(Path(WORK_DIR) / 'cache'))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.utils.crypto import md5  # noqa: E402
+
+USER_WXID = 'wxid_benchmarkuser'
+GROUP_ID = '20000000000@chatroom'
+CHATTER_WXID = 'wxid_benchmarkpeer'
+START_TIME = 1500000000
+
+PHRASES = [
+    '今天天气不错', '我们一起去吃饭吧', '周末有什么安排', '这个项目下周上线',
+    '晚上看电影怎么样', '明天早上开会', '记得带上电脑', '新开的餐厅味道很好',
+    '工作太忙了', '学习机器学习', '下班一起打球', '这本书非常有意思',
+]
+
+# 每次 executemany 写入的行数
+INSERT_BATCH_SIZE = 50000
+
+
+def documents_dir() -> Path:
+    """临时工作目录中的微信数据目录"""
+    return Path(WORK_DIR) / 'Documents'
+
+
+def cleanup():
+    """删除临时工作目录"""
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+def timed(func, *args, **kwargs):
+    """执行并返回 (结果, 耗时秒)"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def _write_chat_table(documents_path: Path, chat_id: str, rows: Iterable[Tuple]) -> str:
+    """在 message_1.sqlite 中创建聊天表并分批写入 (MesSvrID, CreateTime, Message, Type, Des)，返回表名"""
+    db_dir = documents_path / md5(USER_WXID) / 'DB'
+    db_dir.mkdir(parents=True, exist_ok=True)
+    table_name = f'Chat_{md5(chat_id)}'
+
+    conn = sqlite3.connect(str(db_dir / 'message_1.sqlite'))
+    conn.execute(f'''
+        CREATE TABLE "{table_name}" (
+            TableVer INTEGER DEFAULT 1, MesLocalID INTEGER PRIMARY KEY AUTOINCREMENT,
+            MesSvrID INTEGER DEFAULT 0, CreateTime INTEGER DEFAULT 0, Message TEXT,
+            Status INTEGER DEFAULT 0, ImgStatus INTEGER DEFAULT 0, Type INTEGER, Des INTEGER
+        )
+    ''')
+    conn.execute(f'CREATE INDEX "{table_name}_index" ON "{table_name}" (CreateTime)')
+
+    insert_sql = f'INSERT INTO "{table_name}" (MesSvrID, CreateTime, Message, Type, Des) VALUES (?, ?, ?, ?, ?)'
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= INSERT_BATCH_SIZE:
+            conn.executemany(insert_sql, batch)
+            batch = []
+    if batch:
+        conn.executemany(insert_sql, batch)
+    conn.commit()
+    conn.close()
+    return table_name
+
+
+def build_synthetic_group(documents_path: Path, message_count: int, image_ratio: float = 0.0) -> str:
+    """
+    生成合成群聊（带发送者前缀的文本消息，按 image_ratio 混入图片消息）
+
+    Returns:
+        表名
+    """
+    rng = random.Random(42)
+
+    def rows():
+        create_time = START_TIME
+        for i in range(message_count):
+            create_time += rng.randint(1, 120)
+            sender = f'wxid_member{rng.randint(1, 200)}'
+            if image_ratio and rng.random() < image_ratio:
+                yield i, create_time, f'{sender}:\n<img />', 3, 1
+            else:
+                text = '，'.join(rng.sample(PHRASES, rng.randint(1, 4)))
+                yield i, create_time, f'{sender}:\n{text}', 1, 1
+
+    return _write_chat_table(documents_path, GROUP_ID, rows())
+
+
+def build_synthetic_chat(documents_path: Path, message_count: int) -> str:
+    """
+    生成合成单聊（混合各种消息类型，收发方向随机）
+
+    Returns:
+        表名
+    """
+    rng = random.Random(42)
+    types = [1, 1, 1, 1, 3, 34, 43, 47, 49, 10000]
+    text = '今天天气不错，我们一起去吃饭吧' * 4
+
+    def rows():
+        create_time = START_TIME
+        for i in range(message_count):
+            create_time += rng.randint(1, 120)
+            yield i, create_time, text, rng.choice(types), rng.randint(0, 1)
+
+    return _write_chat_table(documents_path, CHATTER_WXID, rows())
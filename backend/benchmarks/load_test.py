@@ -0,0 +1,154 @@
+"""
+并发负载测试：耗时的分析请求是否会拖慢消息浏览
+
+在临时目录生成一个合成群聊，启动本地 uvicorn 服务，先单独测量消息分页请求
+（/api/chats/messages）的延迟，再在若干个词频请求（stream 引擎，每次重新分词）
+同时进行时持续发送分页请求，统计延迟和完成数。词频请求默认在分析进程池中执行；
+加 --inline 时不使用进程池，并把线程池替换为在事件循环中直接执行，用于对比改造前所有请求串行排队的情况。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.load_test
+    python -m benchmarks.load_test --inline
+    python -m benchmarks.load_test --messages 300000 --heavy 4 --light 200
+"""
+import argparse
+import io
+import json
+import socket
+import statistics
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import redirect_stdout
+
+# 需要在导入 app 之前导入（设置临时 CACHE_DIR）
+from benchmarks.common import USER_WXID, build_synthetic_group, cleanup, documents_dir
+
+import uvicorn
+
+from app.config import settings
+from app.main import app
+from app.services.analysis_pool import analysis_pool
+from app.services.executors import executors
+from app.utils.crypto import md5
+
+
+def get_free_port() -> int:
+    """获取一个空闲端口"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def fetch(url: str) -> float:
+    """发送 GET 请求，返回耗时秒"""
+    start = time.perf_counter()
+    with urllib.request.urlopen(url, timeout=600) as response:
+        json.loads(response.read())
+    return time.perf_counter() - start
+
+
+def light_url(base_url: str, params: dict, i: int) -> str:
+    """第 i 个消息分页请求的 URL"""
+    return f'{base_url}/api/chats/messages?' + urllib.parse.urlencode({**params, 'offset': i % 50 * 20})
+
+
+def measure_light(base_url: str, params: dict, count: int, clients: int):
+    """并发发送 count 个消息分页请求，返回各请求耗时"""
+    urls = [light_url(base_url, params, i) for i in range(count)]
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        return list(pool.map(fetch, urls))
+
+
+def measure_light_until(base_url: str, params: dict, clients: int, done: threading.Event):
+    """每个客户端连续发送消息分页请求直到 done，返回各请求耗时"""
+    def client(client_id: int):
+        latencies = []
+        i = client_id
+        while not done.is_set():
+            latencies.append(fetch(light_url(base_url, params, i)))
+            i += clients
+        return latencies
+
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        results = list(pool.map(client, range(clients)))
+    return [latency for latencies in results for latency in latencies]
+
+
+def describe(latencies) -> str:
+    """延迟统计（毫秒）"""
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return (f'p50 {statistics.median(ordered) * 1000:>8.1f} ms   '
+            f'p95 {p95 * 1000:>8.1f} ms   max {ordered[-1] * 1000:>8.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='并发负载测试')
+    parser.add_argument('--messages', type=int, default=100_000, help='合成群聊的消息数量')
+    parser.add_argument('--heavy', type=int, default=2, help='同时进行的词频请求数')
+    parser.add_argument('--light', type=int, default=100, help='空闲时测量的消息分页请求数')
+    parser.add_argument('--clients', type=int, default=4, help='消息分页请求的并发数')
+    parser.add_argument('--inline', action='store_true', help='在事件循环中直接执行（对比改造前）')
+    args = parser.parse_args()
+
+    documents_path = documents_dir()
+    print(f'生成 {args.messages} 条消息的合成群聊: {documents_path}')
+    table_name = build_synthetic_group(documents_path, args.messages)
+
+    # 只测事件循环的阻塞情况，不启用分词进程池
+    settings.segment_workers = 1
+    settings.jieba_warmup = False
+    if args.inline:
+        async def run_inline(workload, fn, *fn_args, **fn_kwargs):
+            return fn(*fn_args, **fn_kwargs)
+        executors.run = run_inline
+        settings.analysis_workers = 0
+
+    port = get_free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning'))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    base_url = f'http://127.0.0.1:{port}'
+    common = {'path': str(documents_path), 'userMd5': md5(USER_WXID)}
+    light_params = {**common, 'table': table_name, 'limit': 20}
+    heavy_url = f'{base_url}/api/analytics/wordfreq?' + urllib.parse.urlencode({
+        **common, 'tableName': table_name, 'engine': 'stream',
+        'startDate': '2000-01-01', 'endDate': '2100-01-01',
+    })
+
+    log = io.StringIO()
+    with redirect_stdout(log):
+        # 预热：加载 jieba 词典、建立连接和表位置索引
+        fetch(heavy_url)
+        baseline = measure_light(base_url, light_params, args.light, args.clients)
+
+        # 词频请求进行期间持续发送消息分页请求
+        done = threading.Event()
+        with ThreadPoolExecutor(max_workers=args.heavy) as heavy_pool:
+            heavy_futures = [heavy_pool.submit(fetch, heavy_url) for _ in range(args.heavy)]
+            time.sleep(0.2)
+            threading.Thread(target=lambda: (wait(heavy_futures), done.set()), daemon=True).start()
+            loaded_start = time.perf_counter()
+            loaded = measure_light_until(base_url, light_params, args.clients, done)
+            loaded_elapsed = time.perf_counter() - loaded_start
+            heavy = [future.result() for future in heavy_futures]
+
+    mode = '事件循环内直接执行' if args.inline else f'线程池 + {settings.analysis_workers} 个分析进程'
+    print(f'\n模式: {mode}')
+    print(f'消息分页（空闲）        {describe(baseline)}')
+    print(f'消息分页（{args.heavy} 个词频请求） {describe(loaded)}   '
+          f'完成 {len(loaded)} 个（{len(loaded) / loaded_elapsed:.1f} 个/秒）')
+    print(f'词频请求                {describe(heavy)}')
+
+    server.should_exit = True
+    analysis_pool.shutdown()
+    cleanup()
+
+
+if __name__ == '__main__':
+    main()